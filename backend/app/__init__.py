@@ -3,51 +3,115 @@ import os
 from datetime import datetime
 from flask import Flask, jsonify
 from flask_cors import CORS
-from .models import Database, Session, Answer
+from .config import Config
+from .models import Database, Analytics, ReadPoolExhausted
+from .storage import create_storage
 from .services.session_service import SessionService
 from .services.validation_service import ValidationService
+from .services.analytics_service import AnalyticsService
+from .services.scale_analytics import ScaleAnalytics
+from .services.columnar_snapshot import ColumnarSnapshot
+from .services.maintenance import DatabaseMaintenance
+from .services.backup import BackupService
+from .services.idempotency import IdempotencyCache
+from .services.rate_limiter import TokenBucketLimiter, SlidingWindowLimiter
 
-def create_app():
+def create_app(config=None):
+    config = config or Config()
     app = Flask(__name__)
+    app.config.from_object(config)
     
     # Enable CORS
     CORS(app, resources={
         r"/*": {
             "origins": ["http://localhost:5173", "http://localhost:3000"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "Idempotency-Key"]
         }
     })
     
     # Load flow configuration
-    flow_config_path = os.path.join(os.path.dirname(__file__), 'flow_config.json')
-    with open(flow_config_path, 'r') as f:
+    with open(config.FLOW_CONFIG_PATH, 'r') as f:
         flow_config = json.load(f)
     
     # Initialize database and models
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'lola.db')
-    db = Database(db_path)
-    session_model = Session(db)
-    answer_model = Answer(db)
+    db_path = config.DATABASE_PATH
+    db = Database(db_path, hot_storage=config.HOT_STORAGE, hot_recovery=config.HOT_RECOVERY,
+                  shard_count=config.SHARD_COUNT)
+    flow_version = f"{flow_config.get('flow_id')}@{flow_config.get('version')}"
+    session_model, answer_model = create_storage(config.STORAGE_BACKEND, db, flow_version=flow_version)
+    answer_model.register_questions({
+        node['id']: node.get('text', '') for node in flow_config['nodes'] if node['type'] == 'question'
+    })
+    session_model.register_input_types({
+        node['id']: node.get('input_type') for node in flow_config['nodes'] if node['type'] == 'question'
+    })
+    analytics_model = Analytics(db)
+    if config.GROUP_COMMIT:
+        db.start_group_commit(max_batch=config.GROUP_COMMIT_MAX_BATCH,
+                              window_ms=config.GROUP_COMMIT_WINDOW_MS)
+    
+    # Admin and summary reads use their own pool of read-only connections
+    read_db = db
+    read_session_model, read_answer_model = session_model, answer_model
+    if config.STORAGE_BACKEND == 'sqlite' and config.READ_POOL_SIZE:
+        read_db = db.read_only(pool_size=config.READ_POOL_SIZE,
+                               statement_timeout_ms=config.READ_STATEMENT_TIMEOUT_MS,
+                               acquire_timeout=config.READ_POOL_ACQUIRE_TIMEOUT)
+        read_session_model, read_answer_model = create_storage('sqlite', read_db, flow_version=flow_version)
     
     # Initialize services
-    session_service = SessionService(flow_config, session_model, answer_model)
+    session_service = SessionService(flow_config, session_model, answer_model,
+                                     read_session_model, read_answer_model)
     validation_service = ValidationService()
+    read_analytics_model = Analytics(read_db)
+    analytics_service = AnalyticsService(flow_config, analytics_model, read_analytics_model)
+    snapshot_dir = config.ANALYTICS_SNAPSHOT_DIR or f"{db_path}-columnar"
+    columnar_snapshot = ColumnarSnapshot(snapshot_dir, flow_config, analytics_model)
+    scale_analytics = ScaleAnalytics(flow_config, read_analytics_model, snapshot=columnar_snapshot)
+    maintenance = DatabaseMaintenance(db, wal_threshold_bytes=config.WAL_CHECKPOINT_THRESHOLD_BYTES,
+                                      vacuum_pages=config.VACUUM_BATCH_PAGES,
+                                      vacuum_max_batches=config.VACUUM_MAX_BATCHES,
+                                      quiet_minutes=config.VACUUM_QUIET_MINUTES)
+    backup_service = BackupService(db, config.BACKUP_DIR or f"{db_path}-backups", keep=config.BACKUP_KEEP,
+                                   pages_per_step=config.BACKUP_PAGES_PER_STEP,
+                                   step_sleep_ms=config.BACKUP_STEP_SLEEP_MS)
+    idempotency_cache = IdempotencyCache(db, max_entries=config.IDEMPOTENCY_MAX_ENTRIES,
+                                         ttl_seconds=config.IDEMPOTENCY_TTL_SECONDS)
+    start_limiter = SlidingWindowLimiter(config.MAX_SESSIONS_PER_IP, config.SESSION_START_WINDOW_SECONDS,
+                                         max_keys=config.RATE_LIMIT_MAX_KEYS)
+    answer_limiter = TokenBucketLimiter(config.ANSWER_RATE_PER_SECOND, config.ANSWER_BURST,
+                                        max_keys=config.RATE_LIMIT_MAX_KEYS)
     
     # Store in app config
     app.config['SESSION_SERVICE'] = session_service
     app.config['VALIDATION_SERVICE'] = validation_service
     app.config['SESSION_MODEL'] = session_model
     app.config['ANSWER_MODEL'] = answer_model
+    app.config['ANALYTICS_SERVICE'] = analytics_service
+    app.config['SCALE_ANALYTICS'] = scale_analytics
+    app.config['COLUMNAR_SNAPSHOT'] = columnar_snapshot
+    app.config['MAINTENANCE'] = maintenance
+    app.config['BACKUP_SERVICE'] = backup_service
+    app.config['IDEMPOTENCY_CACHE'] = idempotency_cache
+    # None when RATE_LIMIT_ENABLED is off; the session routes then admit everything
+    app.config['SESSION_START_LIMITER'] = start_limiter if config.RATE_LIMIT_ENABLED else None
+    app.config['ANSWER_LIMITER'] = answer_limiter if config.RATE_LIMIT_ENABLED else None
     
     # Register blueprints
-    from .routes import session, admin
+    from .routes import session, admin, analytics
     
     session.init_service(session_service)
-    admin.init_models(session_model, answer_model)
+    admin.init_models(session_model, answer_model, read_session_model, read_answer_model)
+    analytics.init_service(analytics_service, scale_analytics, columnar_snapshot)
     
     app.register_blueprint(session.bp)
     app.register_blueprint(admin.bp)
+    app.register_blueprint(analytics.bp)
+    
+    # CLI maintenance commands
+    from .cli import register_commands
+    register_commands(app, session_service, columnar_snapshot)
     
     # Root route
     @app.route('/')
@@ -70,13 +134,28 @@ def create_app():
                 },
                 'admin': {
                     'list_responses': 'GET /admin/responses',
+                    'search': 'GET /admin/search?q=<terms>',
                     'delete_response': 'DELETE /admin/response/<id>',
                     'export_csv': 'GET /admin/export',
                     'cleanup': 'POST /admin/cleanup?minutes=5'
+                },
+                'analytics': {
+                    'questions': 'GET /admin/analytics/questions',
+                    'funnel': 'GET /admin/analytics/funnel',
+                    'scale': 'GET /admin/analytics/scale',
+                    'snapshot': 'GET|POST /admin/analytics/snapshot',
+                    'timeseries': 'GET /admin/analytics/timeseries?granularity=hour'
                 }
             }
         }), 200
     
+    @app.errorhandler(ReadPoolExhausted)
+    def read_pool_exhausted(e):
+        """Admin reads back off instead of queueing behind each other"""
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
     # Health check
     @app.route('/health')
     def health():
@@ -84,6 +163,14 @@ def create_app():
         return jsonify({
             'status': 'healthy',
             'database': str(db_path),
+            'shards': len(db.shards),
+            'storage': maintenance.stats(),
+            'idempotency': idempotency_cache.stats(),
+            'rate_limits': {
+                'enabled': config.RATE_LIMIT_ENABLED,
+                'session_start': start_limiter.stats(),
+                'answer': answer_limiter.stats()
+            },
             'auto_cleanup': 'enabled (5 minutes)',
             'timezone': 'IST'
         }), 200
@@ -105,7 +192,101 @@ def create_app():
             except Exception as e:
                 print(f"[AUTO-CLEANUP ERROR]: {e}")
     
-    # Only run scheduler in main process
+    def purge_deleted_sessions():
+        """Hard-delete tombstoned sessions (with their answers) and expired idempotency keys"""
+        with app.app_context():
+            try:
+                purged = session_model.purge_deleted(batch_size=config.PURGE_BATCH_SIZE)
+                expired = idempotency_cache.purge_expired()
+                if purged or expired:
+                    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    print(f"[{current_time}] 🪦 PURGE: Removed {purged} deleted session(s), "
+                          f"{expired} expired idempotency key(s)")
+            except Exception as e:
+                print(f"[PURGE ERROR]: {e}")
+    
+    def evict_rate_limit_state():
+        """Forget per-IP limiter state that has been idle long enough to be fully recovered"""
+        try:
+            evicted = start_limiter.evict_idle() + answer_limiter.evict_idle()
+            if evicted:
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{current_time}] 🚦 RATE LIMIT: Evicted {evicted} idle client bucket(s)")
+        except Exception as e:
+            print(f"[RATE LIMIT ERROR]: {e}")
+    
+    def rollup_timeseries():
+        """Aggregate hour/day buckets touched since the last run"""
+        with app.app_context():
+            try:
+                buckets = analytics_service.rollup_timeseries()
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{current_time}] 📈 ROLLUP: Refreshed {buckets} time-series bucket(s)")
+            except Exception as e:
+                print(f"[ROLLUP ERROR]: {e}")
+    
+    def build_analytics_snapshot(full=False):
+        """Rebuild the columnar analytics snapshot (incrementally unless full)"""
+        with app.app_context():
+            try:
+                manifest = columnar_snapshot.build(full=full)
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{current_time}] 🧊 SNAPSHOT: Generation {manifest['generation']} "
+                      f"({manifest['counts']['answers']} answers)")
+            except Exception as e:
+                print(f"[SNAPSHOT ERROR]: {e}")
+    
+    def checkpoint_wal():
+        """Checkpoint WAL files that grew past the threshold"""
+        with app.app_context():
+            try:
+                results = maintenance.checkpoint()
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                for result in results:
+                    print(f"[{current_time}] 📒 CHECKPOINT ({result['mode']}): {result['database']} WAL "
+                          f"{result['wal_bytes_before']} -> {result['wal_bytes_after']} bytes")
+            except Exception as e:
+                print(f"[CHECKPOINT ERROR]: {e}")
+    
+    def vacuum_free_pages():
+        """Release free pages in small batches while nobody is answering"""
+        with app.app_context():
+            try:
+                released = maintenance.incremental_vacuum()
+                if released:
+                    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    print(f"[{current_time}] 🧹 VACUUM: Released {released} free page(s)")
+            except Exception as e:
+                print(f"[VACUUM ERROR]: {e}")
+    
+    def archive_sessions():
+        """Move old completed sessions into the monthly archive files"""
+        with app.app_context():
+            try:
+                archived = db.archive_completed(config.ARCHIVE_AFTER_DAYS, batch_size=config.ARCHIVE_BATCH_SIZE)
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{current_time}] 🗄️ ARCHIVE: Moved {archived} completed session(s)")
+            except Exception as e:
+                print(f"[ARCHIVE ERROR]: {e}")
+    
+    def backup_databases():
+        """Write a rotated, compressed online backup of every database"""
+        with app.app_context():
+            try:
+                progress = backup_service.run()
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{current_time}] 💾 BACKUP: Wrote {', '.join(progress['files'])} "
+                      f"in {progress['duration_ms']} ms")
+            except Exception as e:
+                print(f"[BACKUP ERROR]: {e}")
+    
+    # Commit whatever the group-commit writer still holds on shutdown
+    atexit.register(db.stop_group_commit)
+    
+    # Only run scheduler in main process (never under tests)
+    if app.testing:
+        return app
+    
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug:
         scheduler = BackgroundScheduler()
         scheduler.add_job(
@@ -115,8 +296,75 @@ def create_app():
             id='cleanup_stale_sessions',
             replace_existing=True
         )
+        scheduler.add_job(
+            func=purge_deleted_sessions,
+            trigger="interval",
+            minutes=config.PURGE_INTERVAL_MINUTES,
+            id='purge_deleted_sessions',
+            replace_existing=True
+        )
+        if config.RATE_LIMIT_ENABLED:
+            scheduler.add_job(
+                func=evict_rate_limit_state,
+                trigger="interval",
+                minutes=config.RATE_LIMIT_EVICT_INTERVAL_MINUTES,
+                id='evict_rate_limit_state',
+                replace_existing=True
+            )
+        scheduler.add_job(
+            func=rollup_timeseries,
+            trigger="interval",
+            minutes=config.ROLLUP_INTERVAL_MINUTES,
+            id='rollup_timeseries',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=build_analytics_snapshot,
+            trigger="interval",
+            minutes=config.ANALYTICS_SNAPSHOT_INTERVAL_MINUTES,
+            id='build_analytics_snapshot',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=build_analytics_snapshot,
+            trigger="interval",
+            hours=config.ANALYTICS_SNAPSHOT_FULL_INTERVAL_HOURS,
+            kwargs={'full': True},
+            id='rebuild_analytics_snapshot',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=checkpoint_wal,
+            trigger="interval",
+            minutes=config.WAL_CHECKPOINT_INTERVAL_MINUTES,
+            id='checkpoint_wal',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=vacuum_free_pages,
+            trigger="interval",
+            minutes=config.VACUUM_INTERVAL_MINUTES,
+            id='vacuum_free_pages',
+            replace_existing=True
+        )
+        if config.ARCHIVE_AFTER_DAYS:
+            scheduler.add_job(
+                func=archive_sessions,
+                trigger="interval",
+                hours=config.ARCHIVE_INTERVAL_HOURS,
+                id='archive_sessions',
+                replace_existing=True
+            )
+        scheduler.add_job(
+            func=backup_databases,
+            trigger="interval",
+            hours=config.BACKUP_INTERVAL_HOURS,
+            id='backup_databases',
+            replace_existing=True
+        )
         scheduler.start()
         print("✅ Auto-cleanup scheduler started (5-minute intervals)")
+        print(f"✅ Time-series rollups scheduled ({config.ROLLUP_INTERVAL_MINUTES}-minute intervals)")
         atexit.register(lambda: scheduler.shutdown())
     
     return app
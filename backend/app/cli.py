@@ -0,0 +1,73 @@
+"""
+Flask CLI commands (run with `flask --app run <command>`)
+"""
+import click
+
+
+def register_commands(app, session_service, columnar_snapshot):
+    """Register maintenance commands on the app"""
+    
+    @app.cli.command('backfill-snapshots')
+    @click.option('--batch-size', default=500, show_default=True,
+                  help='Sessions materialized per transaction')
+    def backfill_snapshots(batch_size):
+        """Materialize summary snapshots for historical completed sessions"""
+        total = session_service.backfill_snapshots(batch_size=batch_size)
+        click.echo(f"✅ Materialized {total} session snapshot(s)")
+    
+    @app.cli.command('backfill-answer-json')
+    @click.option('--batch-size', default=500, show_default=True, help='Answers per transaction')
+    def backfill_answer_json(batch_size):
+        """Store canonical JSON for answers saved before structured storage"""
+        total = session_service.backfill_answer_json(batch_size=batch_size)
+        click.echo(f"✅ Converted {total} answer(s)")
+    
+    @app.cli.command('dedupe-question-text')
+    @click.option('--batch-size', default=500, show_default=True, help='Answers per transaction')
+    def dedupe_question_text(batch_size):
+        """Move per-answer question text into the questions table"""
+        total = app.config['ANSWER_MODEL'].dedupe_question_text(batch_size=batch_size)
+        click.echo(f"✅ Deduplicated question text of {total} answer(s)")
+    
+    @app.cli.command('compact-session-ids')
+    @click.option('--batch-size', default=500, show_default=True, help='Sessions per transaction')
+    def compact_session_ids(batch_size):
+        """Convert text UUID session ids to 16-byte keys (run VACUUM afterwards to reclaim space)"""
+        total = app.config['SESSION_MODEL'].compact_keys(batch_size=batch_size)
+        click.echo(f"✅ Compacted {total} session id(s)")
+    
+    @app.cli.command('enable-incremental-vacuum')
+    def enable_incremental_vacuum():
+        """Rewrite databases still at auto_vacuum=NONE once so maintenance can release free pages"""
+        converted = app.config['MAINTENANCE'].enable_incremental_vacuum()
+        click.echo(f"✅ Switched {len(converted)} database(s) to incremental vacuum")
+    
+    @app.cli.command('rebalance-shards')
+    @click.option('--batch-size', default=500, show_default=True, help='Sessions scanned per batch')
+    def rebalance_shards(batch_size):
+        """Move sessions to the shard their id hashes to (after changing SHARD_COUNT)"""
+        total = app.config['SESSION_MODEL'].db.rebalance_shards(batch_size=batch_size)
+        click.echo(f"✅ Moved {total} session(s) between shards")
+    
+    @app.cli.command('archive-sessions')
+    @click.option('--days', type=int, default=None, help='Age in days (defaults to ARCHIVE_AFTER_DAYS)')
+    @click.option('--batch-size', default=500, show_default=True, help='Sessions per transaction')
+    def archive_sessions(days, batch_size):
+        """Move old completed sessions into monthly archive files"""
+        days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+        total = app.config['SESSION_MODEL'].db.archive_completed(days, batch_size=batch_size)
+        click.echo(f"✅ Archived {total} completed session(s) older than {days} day(s)")
+    
+    @app.cli.command('backup')
+    def backup():
+        """Write an online, compressed backup of every database now"""
+        progress = app.config['BACKUP_SERVICE'].run()
+        click.echo(f"✅ Backed up {progress['databases_done']} database(s): {', '.join(progress['files'])}")
+    
+    @app.cli.command('build-snapshot')
+    @click.option('--full', is_flag=True, help='Rebuild from scratch instead of from the watermark')
+    def build_snapshot(full):
+        """Write a new columnar analytics snapshot generation"""
+        manifest = columnar_snapshot.build(full=full)
+        click.echo(f"✅ Snapshot generation {manifest['generation']}: "
+                   f"{manifest['counts']['sessions']} session(s), {manifest['counts']['answers']} answer(s)")
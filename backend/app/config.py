@@ -10,3 +10,76 @@ class Config:
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:5173').split(',')
     MAX_SESSIONS_PER_IP = int(os.getenv('MAX_SESSIONS_PER_IP', '10'))
     SESSION_TIMEOUT_HOURS = int(os.getenv('SESSION_TIMEOUT_HOURS', '24'))
+    # Completed sessions only change by being deleted: their summaries may be
+    # cached (browsers, nginx) this long before revalidating
+    COMPLETED_CACHE_MAX_AGE = int(os.getenv('COMPLETED_CACHE_MAX_AGE', '300'))
+    # Interval of the incremental time-series rollup job
+    ROLLUP_INTERVAL_MINUTES = int(os.getenv('ROLLUP_INTERVAL_MINUTES', '5'))
+    # Memory-mapped columnar analytics snapshot (defaults to <DATABASE_PATH>-columnar/)
+    ANALYTICS_SNAPSHOT_DIR = os.getenv('ANALYTICS_SNAPSHOT_DIR')
+    ANALYTICS_SNAPSHOT_INTERVAL_MINUTES = int(os.getenv('ANALYTICS_SNAPSHOT_INTERVAL_MINUTES', '15'))
+    # Full rebuild interval; drops sessions purged before an incremental build saw them
+    ANALYTICS_SNAPSHOT_FULL_INTERVAL_HOURS = int(os.getenv('ANALYTICS_SNAPSHOT_FULL_INTERVAL_HOURS', '24'))
+    # Session/answer storage backend: 'sqlite' or 'memory' (dict indexes, no
+    # persistence - for benchmarks and tests; analytics stay SQLite-only)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+    # Number of SQLite files sessions are hash-sharded over (run
+    # `flask rebalance-shards` after changing it on an existing database)
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', '1'))
+    # Group commit: answer and status writes of concurrent requests are
+    # committed together (up to GROUP_COMMIT_MAX_BATCH, waiting GROUP_COMMIT_WINDOW_MS)
+    GROUP_COMMIT = os.getenv('GROUP_COMMIT', 'false').lower() == 'true'
+    GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', '64'))
+    GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', '2'))
+    # Read-only connection pool for admin routes and summaries (0 disables):
+    # connections per pool, per-checkout statement timeout, wait for a free one
+    READ_POOL_SIZE = int(os.getenv('READ_POOL_SIZE', '4'))
+    READ_STATEMENT_TIMEOUT_MS = int(os.getenv('READ_STATEMENT_TIMEOUT_MS', '30000'))
+    READ_POOL_ACQUIRE_TIMEOUT = float(os.getenv('READ_POOL_ACQUIRE_TIMEOUT', '5'))
+    # Hot/cold storage for in-progress sessions: unset (single file), 'memory',
+    # or a path to a separate unsynced SQLite file. HOT_RECOVERY ('resume' or
+    # 'discard') decides what happens to a file-backed hot store on restart.
+    HOT_STORAGE = os.getenv('HOT_STORAGE') or None
+    HOT_RECOVERY = os.getenv('HOT_RECOVERY', 'resume')
+    # WAL checkpoints: how often to look, and the WAL size that triggers one
+    WAL_CHECKPOINT_INTERVAL_MINUTES = int(os.getenv('WAL_CHECKPOINT_INTERVAL_MINUTES', '1'))
+    WAL_CHECKPOINT_THRESHOLD_BYTES = int(os.getenv('WAL_CHECKPOINT_THRESHOLD_BYTES', str(4 * 1024 * 1024)))
+    # Incremental vacuum: pages released per transaction, transactions per run,
+    # and how long sessions must have been idle before a run starts
+    VACUUM_INTERVAL_MINUTES = int(os.getenv('VACUUM_INTERVAL_MINUTES', '10'))
+    VACUUM_BATCH_PAGES = int(os.getenv('VACUUM_BATCH_PAGES', '256'))
+    VACUUM_MAX_BATCHES = int(os.getenv('VACUUM_MAX_BATCHES', '40'))
+    VACUUM_QUIET_MINUTES = int(os.getenv('VACUUM_QUIET_MINUTES', '2'))
+    # Online backups (defaults to <DATABASE_PATH>-backups/): schedule, gzipped
+    # files kept per database, and pages copied per step / pause between steps
+    BACKUP_DIR = os.getenv('BACKUP_DIR')
+    BACKUP_INTERVAL_HOURS = int(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+    BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', '256'))
+    BACKUP_STEP_SLEEP_MS = float(os.getenv('BACKUP_STEP_SLEEP_MS', '5'))
+    # Archival: completed sessions older than ARCHIVE_AFTER_DAYS (0 disables) move
+    # to monthly <stem>-archive-YYYY-MM files, ARCHIVE_BATCH_SIZE per transaction
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+    ARCHIVE_INTERVAL_HOURS = int(os.getenv('ARCHIVE_INTERVAL_HOURS', '24'))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+    # Deletes only tombstone sessions; the purge job hard-deletes them (with
+    # their answers) every PURGE_INTERVAL_MINUTES, PURGE_BATCH_SIZE per transaction
+    PURGE_INTERVAL_MINUTES = int(os.getenv('PURGE_INTERVAL_MINUTES', '5'))
+    PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '500'))
+    # Idempotency-Key replay cache for answer submissions: entries kept in
+    # memory (LRU) and how long a key is honoured (memory and database)
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '10000'))
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '3600'))
+    # Per-IP admission control (keyed by get_client_ip): at most MAX_SESSIONS_PER_IP
+    # new sessions per sliding window, and a token bucket for answer submissions.
+    # Idle per-IP state is swept every RATE_LIMIT_EVICT_INTERVAL_MINUTES
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    SESSION_START_WINDOW_SECONDS = int(os.getenv('SESSION_START_WINDOW_SECONDS', '3600'))
+    ANSWER_RATE_PER_SECOND = float(os.getenv('ANSWER_RATE_PER_SECOND', '2'))
+    ANSWER_BURST = int(os.getenv('ANSWER_BURST', '30'))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+    RATE_LIMIT_EVICT_INTERVAL_MINUTES = int(os.getenv('RATE_LIMIT_EVICT_INTERVAL_MINUTES', '5'))
+    # Reverse proxies (addresses or CIDR networks, comma-separated) whose
+    # X-Real-IP / X-Forwarded-For get_client_ip believes. Empty keys clients on
+    # the connecting address; list only proxies clients cannot go around
+    TRUSTED_PROXIES = [entry.strip() for entry in os.getenv('TRUSTED_PROXIES', '').split(',') if entry.strip()]
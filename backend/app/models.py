@@ -1,10 +1,21 @@
+import re
+import copy
+import time
+import uuid
+import queue
 import sqlite3
+import threading
 import json
+import zlib
+import hashlib
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple
 from contextlib import contextmanager
 
+MIGRATIONS_DIR = Path(__file__).parent.parent / 'migrations'
+
 # ==========================================
 # SHARED HELPER: TIMESTAMP FORMATTER
 # ==========================================
@@ -36,18 +47,465 @@ def format_timestamp_iso(timestamp_str):
         return timestamp_str
 
 
+# ==========================================
+# SESSION KEYS: 16-byte BLOBs for UUIDs
+# ==========================================
+UUID_TEXT_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+
+
+def session_key(session_id: str):
+    """
+    Storage form of a session ID: UUIDs become their 16 raw bytes; anything
+    else (ids created before binary keys, test fixtures) is stored as text
+    """
+    if isinstance(session_id, str) and UUID_TEXT_PATTERN.match(session_id):
+        return uuid.UUID(session_id).bytes
+    return session_id
+
+
+def session_id_from_key(key) -> str:
+    """API (string) form of a stored session key"""
+    if isinstance(key, bytes):
+        return str(uuid.UUID(bytes=key))
+    return key
+
+
+# Storage-only session columns that are never part of the API representation
+INTERNAL_SESSION_COLUMNS = ('summary_blob', 'deleted_at')
+
+
+def format_session_row(row) -> Dict[str, Any]:
+    """Convert a sessions row to an API dict with formatted timestamps"""
+    data = dict(row)
+    for column in INTERNAL_SESSION_COLUMNS:
+        data.pop(column, None)
+    if 'id' in data:
+        data['id'] = session_id_from_key(data['id'])
+    # Apply shared formatting logic
+    for column in ('created_at', 'last_updated', 'last_activity', 'completed_at'):
+        if column in data:
+            data[column] = format_timestamp_iso(data[column])
+    return data
+
+
+# Admin listing/export filters: name -> predicate on sessions (aliased s).
+# Each combination is covered by an index from migration 008. Activity bounds
+# are marked unlikely() so a one-sided range still searches idx_sessions_last_activity
+# instead of walking the whole created_at index to satisfy ORDER BY ... LIMIT.
+SESSION_FILTERS = {
+    'status': 's.status = ?',
+    'ip_address': 's.ip_address = ?',
+    'created_after': 's.created_at >= ?',
+    'created_before': 's.created_at < ?',
+    'active_after': 'unlikely(s.last_activity >= ?)',
+    'active_before': 'unlikely(s.last_activity < ?)',
+}
+
+
+def session_filter_clause(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """Build a WHERE clause and its parameters from admin filters (tombstoned sessions never match)"""
+    predicates, params = ['s.deleted_at IS NULL'], []
+    for name, value in (filters or {}).items():
+        if value is None:
+            continue
+        if name not in SESSION_FILTERS:
+            raise ValueError(f"Unknown filter: {name}")
+        if isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        predicates.append(SESSION_FILTERS[name])
+        params.append(value)
+    return f"WHERE {' AND '.join(predicates)}", params
+
+
+def encode_snapshot(snapshot: Dict[str, Any]) -> bytes:
+    """Serialize a snapshot dict to a compact zlib-compressed JSON blob"""
+    return zlib.compress(json.dumps(snapshot, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_snapshot(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_snapshot"""
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+# ==========================================
+# ANSWER DISTRIBUTION KEYS
+# ==========================================
+DISTRIBUTION_INPUT_TYPES = ('single_choice', 'multi_choice', 'ranking')
+RESPONSES_KEY = ('', 0)
+
+
+def encode_answer_value(value: Any) -> str:
+    """Canonical JSON of a typed answer (sorted keys, compact, UTF-8)"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def parse_answer_text(input_type: Optional[str], answer_text: Optional[str]) -> Any:
+    """
+    Recover the typed value of a display string, for rows stored before
+    answer_json existed: lists for multi_choice/ranking, dicts for JSON
+    answers (multi_field/scale, or any JSON object when the type is unknown)
+    """
+    if answer_text is None:
+        return None
+    if input_type == 'multi_choice':
+        return answer_text.split(', ') if answer_text else []
+    if input_type == 'ranking':
+        items = []
+        for item in (answer_text.split(', ') if answer_text else []):
+            rank, _, option = item.partition('. ')
+            items.append(option if rank.isdigit() and option else item)
+        return items
+    if input_type in ('multi_field', 'scale', None):
+        try:
+            value = json.loads(answer_text)
+        except (json.JSONDecodeError, TypeError):
+            return answer_text
+        return value if isinstance(value, dict) else answer_text
+    return answer_text
+
+
+def decode_answer_value(answer_json: Optional[str], input_type: Optional[str],
+                        answer_text: Optional[str]) -> Any:
+    """Typed value of a stored answer, parsing the display text only for legacy rows"""
+    if answer_json is not None:
+        return json.loads(answer_json)
+    return parse_answer_text(input_type, answer_text)
+
+
+def distribution_keys(input_type: Optional[str], value: Any) -> List[Tuple[str, int]]:
+    """
+    Typed answer value -> (option, rank) keys for answer_distribution (a
+    display string is parsed first). Free-text "Other: ..." selections are
+    counted under "Other".
+    """
+    if isinstance(value, str):
+        value = parse_answer_text(input_type, value)
+    if input_type not in DISTRIBUTION_INPUT_TYPES or not value:
+        return []
+    
+    keys = [RESPONSES_KEY]
+    if input_type == 'single_choice':
+        keys.append((value, 0))
+    elif input_type == 'multi_choice':
+        for item in value:
+            keys.append(('Other', 0) if item.startswith('Other:') else (item, 0))
+    elif input_type == 'ranking':
+        for position, item in enumerate(value, 1):
+            keys.append((item, position))
+    return keys
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text from the search box into a safe FTS5 MATCH expression:
+    every term is quoted (so FTS5 operators and punctuation are literal) and
+    all terms must match. A trailing '*' on a term keeps prefix matching.
+    """
+    terms = []
+    for term in query.split():
+        prefix = term.endswith('*')
+        term = term.rstrip('*').replace('"', '""')
+        if term:
+            terms.append(f'"{term}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def bump_funnel(conn, node_id: Optional[str], column: str, amount: int = 1):
+    """Increment one funnel_stats counter (reached / answered / abandoned)"""
+    if not node_id or not amount:
+        return
+    conn.execute(
+        f"""INSERT INTO funnel_stats (node_id, {column}) VALUES (?, ?)
+            ON CONFLICT(node_id) DO UPDATE SET {column} = {column} + excluded.{column}""",
+        (node_id, amount)
+    )
+
+
+def record_reaps(conn, where_clause: str, params: tuple):
+    """
+    Before deleting in-progress sessions, count them per creation hour in
+    session_reaps so time-series "sessions started" still includes them
+    """
+    conn.execute(
+        f"""INSERT INTO session_reaps (bucket_start, reaped_started, updated_at)
+            SELECT strftime('%Y-%m-%d %H:00:00', created_at), COUNT(*), CURRENT_TIMESTAMP
+            FROM sessions WHERE {where_clause}
+            GROUP BY 1
+            ON CONFLICT(bucket_start) DO UPDATE SET
+                reaped_started = reaped_started + excluded.reaped_started,
+                updated_at = excluded.updated_at""",
+        params
+    )
+
+
+def retract_sessions(conn, keys: List[Any], input_types: Dict[str, str], schema: str = 'main'):
+    """
+    Before tombstoning sessions (their rows in schema), subtract them from
+    the counters in main: their answers from answer_distribution and funnel
+    "answered", and the nodes they are known to have reached (every
+    answered question plus the current node) from funnel "reached"
+    """
+    if not keys:
+        return
+    placeholders = ', '.join('?' for _ in keys)
+    nodes = {row['id']: {row['current_node']} for row in conn.execute(
+        f"SELECT id, current_node FROM {schema}.sessions WHERE id IN ({placeholders})", keys
+    )}
+    answered, distribution = Counter(), Counter()
+    for row in conn.execute(
+        f"""SELECT session_id, question_id, answer_text, answer_json FROM {schema}.answers
+            WHERE session_id IN ({placeholders})""",
+        keys
+    ):
+        nodes[row['session_id']].add(row['question_id'])
+        answered[row['question_id']] += 1
+        input_type = input_types.get(row['question_id'])
+        if input_type in DISTRIBUTION_INPUT_TYPES:
+            value = decode_answer_value(row['answer_json'], input_type, row['answer_text'])
+            for option, rank in distribution_keys(input_type, value):
+                distribution[(row['question_id'], option, rank)] += 1
+    
+    reached = Counter(node_id for session_nodes in nodes.values() for node_id in session_nodes)
+    for node_id, count in reached.items():
+        bump_funnel(conn, node_id, 'reached', -count)
+    for node_id, count in answered.items():
+        bump_funnel(conn, node_id, 'answered', -count)
+    conn.executemany(
+        """INSERT INTO answer_distribution (question_id, option, rank, count)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT(question_id, option, rank)
+           DO UPDATE SET count = count + excluded.count""",
+        [(question_id, option, rank, -count) for (question_id, option, rank), count in distribution.items()]
+    )
+
+
+# Answers of sessions that are not tombstoned (aliasless; probes idx_sessions_deleted)
+LIVE_ANSWERS = "session_id NOT IN (SELECT id FROM sessions WHERE deleted_at IS NOT NULL)"
+
+
+# Aggregate tables the answer path writes to: in hot mode they accumulate
+# deltas in the hot store that flush_hot() adds into the durable file.
+# table -> (key columns, additive columns)
+HOT_AGGREGATES = {
+    'funnel_stats': (('node_id',), ('reached', 'answered', 'abandoned')),
+    'answer_distribution': (('question_id', 'option', 'rank'), ('count',)),
+    'session_reaps': (('bucket_start',), ('cleaned_up', 'reaped_started')),
+}
+
+
+class _PendingWrite:
+    """One queued write: the operation, its target store and its outcome"""
+    __slots__ = ('db', 'operation', 'result', 'error', 'done')
+    
+    def __init__(self, db: 'Database', operation):
+        self.db = db
+        self.operation = operation
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class GroupCommitWriter:
+    """
+    Group commit: a single writer thread drains queued write operations
+    and commits up to max_batch of them (per target file) in one
+    transaction, so concurrent requests share one writer lock acquisition
+    and one fsync instead of queueing for their own. The thread takes the
+    first waiting item, then whatever else arrives within window_ms.
+    Callers block until their batch is committed; each operation runs in
+    its own savepoint, so one failing operation does not fail the batch.
+    """
+    
+    def __init__(self, max_batch: int = 64, window_ms: float = 2.0):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.queue: 'queue.Queue[Optional[_PendingWrite]]' = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+        self._thread.start()
+    
+    def submit(self, db: 'Database', operation):
+        """Run operation(conn) in the next batch on db; returns its result once committed"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Writes cannot be submitted from inside a group-commit operation")
+        pending = _PendingWrite(db, operation)
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+    
+    def close(self):
+        """Commit what is queued and stop the writer thread"""
+        self.queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+    
+    def _commit(self, batch: List[_PendingWrite]):
+        by_db: Dict['Database', List[_PendingWrite]] = {}
+        for pending in batch:
+            by_db.setdefault(pending.db, []).append(pending)
+        for db, items in by_db.items():
+            try:
+                with db.get_connection() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for pending in items:
+                        conn.execute("SAVEPOINT pending_write")
+                        try:
+                            pending.result = pending.operation(conn)
+                        except Exception as e:
+                            conn.execute("ROLLBACK TO pending_write")
+                            pending.error = e
+                        conn.execute("RELEASE pending_write")
+            except Exception as e:
+                for pending in items:
+                    if pending.error is None:
+                        pending.error = e
+            finally:
+                self.batches += 1
+                self.items += len(items)
+                for pending in items:
+                    pending.done.set()
+
+
+class ReadPoolExhausted(RuntimeError):
+    """No read-only connection became free within the acquire timeout"""
+
+
+class ReadPool:
+    """
+    Bounded pool of read-only connections (mode=ro URI, query_only) for
+    admin and summary reads. A checkout waits at most acquire_timeout
+    seconds for a free connection and SQLite interrupts it once it has run
+    for statement_timeout_ms, so heavy admin reads can neither pile up nor
+    pin an old WAL snapshot indefinitely. Participant writes never wait on
+    this pool.
+    """
+    
+    def __init__(self, uri: str, size: int = 4, statement_timeout_ms: int = 30000,
+                 acquire_timeout: float = 5.0):
+        self.uri = uri
+        self.size = size
+        self.statement_timeout = statement_timeout_ms / 1000
+        self.acquire_timeout = acquire_timeout
+        self._idle: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Check out a read-only connection"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise ReadPoolExhausted(f"All {self.size} read-only connections are busy")
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            deadline = time.monotonic() + self.statement_timeout
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+            yield conn
+            conn.rollback()
+            self._idle.put(conn)
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            raise
+        finally:
+            self._slots.release()
+    
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
 class Database:
-    """Database connection and query manager"""
+    """
+    Database connection and query manager
     
-    def __init__(self, db_path: str):
-        self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+    With shard_count > 1, sessions and their answers are spread over that
+    many files by a hash of the session id (shard 0 is db_path itself,
+    shard i is <stem>-shard<i><suffix> next to it), so answer writes of
+    different sessions no longer queue behind one writer lock. Every shard
+    has the full schema; the aggregate tables (funnel, distributions,
+    reaps) accumulate per shard and readers sum them. Rollups, job state
+    and the questions catalogue live in shard 0 (questions are mirrored to
+    the other stores). After changing shard_count run rebalance_shards().
+    
+    With hot_storage set ('memory' or a file path, ideally on tmpfs),
+    in-progress sessions and their answers live in a separate hot store with
+    the same schema, so the answer path never writes to the durable file.
+    A session is promoted to the durable file in one transaction when it
+    completes. Crash semantics: a 'memory' store loses every in-progress
+    session (and aggregate deltas not yet flushed) when the process exits;
+    completed sessions are never lost. A file store survives process
+    restarts but not reboots of a tmpfs; hot_recovery='resume' keeps its
+    sessions on startup, 'discard' drops them. Admin listings fan out over
+    both stores; analytics only see a session once it is promoted or reaped.
+    
+    archive_completed() moves old completed sessions into monthly archive
+    files (<stem>-archive-YYYY-MM<suffix>, by completion month) with the
+    same schema. Aggregate tables stay in the shards, so analytics totals
+    do not change; admin reads include archives() only when asked to.
+    """
+    
+    def __init__(self, db_path: str, hot_storage: Optional[str] = None, hot_recovery: str = 'resume',
+                 shard_count: int = 1, _uri: bool = False):
+        self.uri = _uri
+        self.db_path = db_path if _uri else Path(db_path)
+        if not _uri:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # An in-memory (memdb) store only lives while a connection is open
+        self._keeper = sqlite3.connect(self.db_path, uri=True) if _uri else None
+        self.writer: Optional[GroupCommitWriter] = None
+        self.read_pool: Optional[ReadPool] = None
+        self._read_options: Optional[Tuple[int, int, float]] = None
+        self._archives: Dict[str, 'Database'] = {}
         self._initialize_db()
+        if shard_count < 1:
+            raise ValueError(f"shard_count must be at least 1, got {shard_count}")
+        self.shards = [self] + [Database(self.shard_path(index)) for index in range(1, shard_count)]
+        self.hot = self._open_hot(hot_storage, hot_recovery) if hot_storage else None
+        self.sync_questions()
     
     @contextmanager
     def get_connection(self):
         """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
+        if self.read_pool:
+            with self.read_pool.connection() as conn:
+                yield conn
+            return
+        conn = sqlite3.connect(self.db_path, uri=self.uri)
         conn.row_factory = sqlite3.Row
         try:
             yield conn
@@ -58,19 +516,331 @@ class Database:
         finally:
             conn.close()
     
+    def read_only(self, pool_size: int = 4, statement_timeout_ms: int = 30000,
+                  acquire_timeout: float = 5.0) -> 'Database':
+        """
+        A view of this database (with its shards and hot store) whose
+        connections come from read-only pools; hand it to models that
+        serve admin and summary reads
+        """
+        view = copy.copy(self)
+        uri = self.db_path if self.uri else Path(self.db_path).resolve().as_uri()
+        view.read_pool = ReadPool(f"{uri}{'&' if '?' in uri else '?'}mode=ro", pool_size,
+                                  statement_timeout_ms, acquire_timeout)
+        view.writer = None
+        view._read_options = (pool_size, statement_timeout_ms, acquire_timeout)
+        view._archives = {}
+        view.shards = [view] + [shard.read_only(pool_size, statement_timeout_ms, acquire_timeout)
+                                for shard in self.shards[1:]]
+        if self.hot:
+            view.hot = self.hot.read_only(pool_size, statement_timeout_ms, acquire_timeout)
+        return view
+    
+    def archive_connection(self, archive: 'Database'):
+        """
+        Connection to shard 0 with an archive attached as 'archive': archived
+        rows change in the same transaction as the shard's analytics counters
+        """
+        return self._with_attached(archive, 'archive')
+    
+    @contextmanager
+    def _with_attached(self, other: 'Database', alias: str):
+        """Connection to this database with another one attached under alias"""
+        # URI filenames so a memdb store can be attached; this file is opened
+        # as a URI too, otherwise an attached file would inherit the memdb VFS
+        conn = sqlite3.connect(Path(self.db_path).resolve().as_uri(), uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("ATTACH DATABASE ? AS " + alias, (str(other.db_path),))
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    # ------------------------------------------
+    # Sharding
+    # ------------------------------------------
+    def shard_path(self, index: int) -> Path:
+        """File of shard index (shard 0 is db_path)"""
+        if index == 0:
+            return self.db_path
+        return self.db_path.with_name(f"{self.db_path.stem}-shard{index}{self.db_path.suffix}")
+    
+    def shard_for(self, session_id: str) -> 'Database':
+        """The shard a session lives in (crc32 of its stored key, stable across processes)"""
+        if len(self.shards) == 1:
+            return self
+        key = session_key(session_id)
+        digest = zlib.crc32(key if isinstance(key, bytes) else key.encode('utf-8'))
+        return self.shards[digest % len(self.shards)]
+    
+    def partitions(self) -> List['Database']:
+        """Every store holding sessions (shards, then the hot store), for fan-out reads"""
+        return self.shards + [self.hot] if self.hot else self.shards
+    
+    def session_store(self, session_id: str) -> 'Database':
+        """The store holding a session (the hot store when it is there, else its shard)"""
+        if self.hot:
+            with self.hot.get_connection() as conn:
+                if conn.execute("SELECT 1 FROM sessions WHERE id = ?",
+                                (session_key(session_id),)).fetchone():
+                    return self.hot
+        return self.shard_for(session_id)
+    
+    def session_connection(self, session_id: str):
+        """Connection to the store holding a session"""
+        return self.session_store(session_id).get_connection()
+    
+    # ------------------------------------------
+    # Archives
+    # ------------------------------------------
+    def archive_path(self, month: str) -> Path:
+        """Archive file of the sessions completed in a month (YYYY-MM)"""
+        return self.db_path.with_name(f"{self.db_path.stem}-archive-{month}{self.db_path.suffix}")
+    
+    def archives(self, since_month: Optional[str] = None) -> List['Database']:
+        """Archive stores on disk, oldest month first (from since_month on, when given)"""
+        pattern = re.compile(rf'^{re.escape(self.db_path.stem)}-archive-(\d{{4}}-\d{{2}}){re.escape(self.db_path.suffix)}$')
+        months = []
+        for path in self.db_path.parent.iterdir():
+            match = pattern.match(path.name)
+            if match and (not since_month or match.group(1) >= since_month):
+                months.append(match.group(1))
+        return [self._archive(month) for month in sorted(months)]
+    
+    def _archive(self, month: str) -> 'Database':
+        """Open (creating if needed) one month's archive; read-only views open it through a pool"""
+        if month not in self._archives:
+            store = Database(self.archive_path(month))
+            self._archives[month] = store.read_only(*self._read_options) if self._read_options else store
+        return self._archives[month]
+    
+    def archive_completed(self, older_than_days: int, batch_size: int = 500) -> int:
+        """
+        Move sessions (with their answers) completed more than older_than_days
+        ago from every shard into the archive of their completion month, one
+        transaction per batch and month
+        
+        Returns:
+            Number of sessions archived
+        """
+        archived = 0
+        for shard in self.shards:
+            while True:
+                with shard.get_connection() as conn:
+                    rows = conn.execute(
+                        """SELECT id, strftime('%Y-%m', completed_at) AS month FROM sessions
+                           WHERE status = 'completed' AND deleted_at IS NULL
+                             AND completed_at < datetime('now', '-' || ? || ' days')
+                           ORDER BY completed_at LIMIT ?""",
+                        (older_than_days, batch_size)
+                    ).fetchall()
+                by_month: Dict[str, List[Any]] = {}
+                for row in rows:
+                    by_month.setdefault(row['month'], []).append(row['id'])
+                for month, keys in by_month.items():
+                    with shard._with_attached(self._archive(month), 'archive') as conn:
+                        conn.execute("INSERT OR REPLACE INTO archive.questions SELECT * FROM main.questions")
+                        # Commits across WAL files are atomic per file: a crash
+                        # after the archive committed leaves a copy to replace
+                        placeholders = ', '.join('?' for _ in keys)
+                        conn.execute(f"DELETE FROM archive.answers WHERE session_id IN ({placeholders})", keys)
+                        conn.execute(f"DELETE FROM archive.sessions WHERE id IN ({placeholders})", keys)
+                        self._move_sessions(conn, 'main', 'archive', keys)
+                    archived += len(keys)
+                if len(rows) < batch_size:
+                    break
+        return archived
+    
+    # ------------------------------------------
+    # Group commit
+    # ------------------------------------------
+    def start_group_commit(self, max_batch: int = 64, window_ms: float = 2.0):
+        """Route write() through a group-commit writer thread"""
+        if not self.writer:
+            self.writer = GroupCommitWriter(max_batch=max_batch, window_ms=window_ms)
+    
+    def stop_group_commit(self):
+        """Flush and stop the group-commit writer (writes go direct again)"""
+        writer, self.writer = self.writer, None
+        if writer:
+            writer.close()
+    
+    def write(self, session_id: str, operation):
+        """
+        Run operation(conn) against the store holding a session and commit
+        it, through the group-commit writer when one is running
+        """
+        store = self.session_store(session_id)
+        if self.writer:
+            return self.writer.submit(store, operation)
+        with store.get_connection() as conn:
+            return operation(conn)
+    
+    def new_session_connection(self, session_id: str):
+        """Connection to the store a new session is created in"""
+        return (self.hot or self.shard_for(session_id)).get_connection()
+    
+    def rebalance_shards(self, batch_size: int = 500) -> int:
+        """
+        Move sessions (with their answers) that live in the wrong shard, e.g.
+        after shard_count changed, one transaction per batch and target shard
+        
+        Returns:
+            Number of sessions moved
+        """
+        moved = 0
+        for source in self.shards:
+            last = ''
+            while True:
+                with source.get_connection() as conn:
+                    ids = [row['id'] for row in conn.execute(
+                        "SELECT id FROM sessions WHERE id > ? ORDER BY id LIMIT ?", (last, batch_size)
+                    )]
+                misplaced = {}
+                for key in ids:
+                    target = self.shard_for(session_id_from_key(key))
+                    if target is not source:
+                        misplaced.setdefault(target, []).append(key)
+                for target, keys in misplaced.items():
+                    with source._with_attached(target, 'target') as conn:
+                        self._move_sessions(conn, 'main', 'target', keys)
+                    moved += len(keys)
+                if len(ids) < batch_size:
+                    break
+                last = ids[-1]
+        return moved
+    
+    @staticmethod
+    def _move_sessions(conn, source: str, target: str, keys: List[Any]):
+        """Copy sessions and their answers from source to target (answer ids are reassigned), then delete them"""
+        placeholders = ', '.join('?' for _ in keys)
+        session_columns = ', '.join(row['name'] for row in conn.execute(f"PRAGMA {source}.table_info(sessions)"))
+        answer_columns = ', '.join(row['name'] for row in conn.execute(f"PRAGMA {source}.table_info(answers)")
+                                   if row['name'] != 'id')
+        conn.execute(
+            f"""INSERT INTO {target}.sessions ({session_columns})
+                SELECT {session_columns} FROM {source}.sessions WHERE id IN ({placeholders})""",
+            keys
+        )
+        conn.execute(
+            f"""INSERT INTO {target}.answers ({answer_columns})
+                SELECT {answer_columns} FROM {source}.answers
+                WHERE session_id IN ({placeholders}) ORDER BY id""",
+            keys
+        )
+        conn.execute(f"DELETE FROM {source}.answers WHERE session_id IN ({placeholders})", keys)
+        conn.execute(f"DELETE FROM {source}.sessions WHERE id IN ({placeholders})", keys)
+    
+    def sync_questions(self):
+        """Mirror shard 0's questions table into the other stores so their answers resolve text"""
+        for store in self.partitions()[1:]:
+            with self._with_attached(store, 'store') as conn:
+                conn.execute("INSERT OR REPLACE INTO store.questions SELECT * FROM main.questions")
+    
+    # ------------------------------------------
+    # Hot/cold session storage
+    # ------------------------------------------
+    def _open_hot(self, hot_storage: str, hot_recovery: str) -> 'Database':
+        """Open (and recover) the hot store"""
+        if hot_recovery not in ('resume', 'discard'):
+            raise ValueError(f"Unknown hot_recovery mode: {hot_recovery}")
+        if hot_storage == 'memory':
+            return Database(f'file:/lola-hot-{uuid.uuid4().hex}?vfs=memdb', _uri=True)
+        
+        hot = Database(hot_storage)
+        for shard in self.shards:
+            with shard._with_attached(hot, 'hot') as conn:
+                if hot_recovery == 'discard':
+                    conn.execute("DELETE FROM hot.answers")
+                    conn.execute("DELETE FROM hot.sessions")
+                else:
+                    # A crash between a promotion's two commits leaves a copy behind
+                    conn.execute("DELETE FROM hot.answers WHERE session_id IN (SELECT id FROM main.sessions)")
+                    conn.execute("DELETE FROM hot.sessions WHERE id IN (SELECT id FROM main.sessions)")
+        with self._with_attached(hot, 'hot') as conn:
+            self._merge_aggregates(conn, 'hot', 'main')
+        return hot
+    
+    def promote(self, session_id: str) -> bool:
+        """
+        Move a session and its answers from the hot store to its durable
+        shard in one transaction, flushing aggregate deltas with it
+        
+        Returns:
+            True if the session was in the hot store
+        """
+        if not self.hot:
+            return False
+        key = session_key(session_id)
+        with self.shard_for(session_id)._with_attached(self.hot, 'hot') as conn:
+            if not conn.execute("SELECT 1 FROM hot.sessions WHERE id = ?", (key,)).fetchone():
+                return False
+            self._move_sessions(conn, 'hot', 'main', [key])
+            self._merge_aggregates(conn, 'hot', 'main')
+        return True
+    
+    def flush_hot(self) -> None:
+        """Add the hot store's aggregate deltas (funnel, distributions, reaps) into the durable file"""
+        if not self.hot:
+            return
+        with self._with_attached(self.hot, 'hot') as conn:
+            self._merge_aggregates(conn, 'hot', 'main')
+    
+    @staticmethod
+    def _merge_aggregates(conn, source: str, target: str):
+        """Add source aggregate rows into target and clear them from source"""
+        for table, (keys, values) in HOT_AGGREGATES.items():
+            columns = ', '.join(keys + values)
+            updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in values)
+            if table == 'session_reaps':
+                # Stamp the flush time so the rollup job sees these buckets as touched
+                updates += ", updated_at = CURRENT_TIMESTAMP"
+            conn.execute(
+                f"""INSERT INTO {target}.{table} ({columns})
+                    SELECT {columns} FROM {source}.{table} WHERE true
+                    ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates}"""
+            )
+            conn.execute(f"DELETE FROM {source}.{table}")
+    
     def _initialize_db(self):
         """Initialize database schema"""
-        schema_path = Path(__file__).parent.parent / 'migrations' / 'init_schema.sql'
+        schema_path = MIGRATIONS_DIR / 'init_schema.sql'
         
         if not schema_path.exists():
             print(f"⚠️ Warning: Schema file not found at {schema_path}")
             return
-            
+        
         with open(schema_path, 'r') as f:
             schema = f.read()
         
         with self.get_connection() as conn:
+            # Only takes effect on a new, still empty file (switching to WAL
+            # already writes its header)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            if not self.uri:
+                # WAL lets the read-only pool read while participants write
+                conn.execute("PRAGMA journal_mode = WAL")
             conn.executescript(schema)
+            self._apply_migrations(conn)
+    
+    def _apply_migrations(self, conn):
+        """
+        Apply numbered migrations (NNN_name.sql) newer than PRAGMA user_version.
+        init_schema.sql is the baseline; every later schema change is a migration
+        so existing databases and fresh ones end up with the same shape.
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for path in sorted(MIGRATIONS_DIR.glob('[0-9][0-9][0-9]_*.sql')):
+            number = int(path.name[:3])
+            if number <= version:
+                continue
+            with open(path, 'r') as f:
+                conn.executescript(f.read())
+            conn.execute(f"PRAGMA user_version = {number}")
 
 
 class Session:
@@ -78,61 +848,191 @@ class Session:
     
     def __init__(self, db: Database):
         self.db = db
+        # question_id -> input_type, to take deleted answers out of answer_distribution
+        self.input_types: Dict[str, str] = {}
     
-    def create(self, session_id: str, ip_address: str, user_agent: str) -> Dict[str, Any]:
-        """Create a new session with initial activity timestamp"""
-        with self.db.get_connection() as conn:
+    def register_input_types(self, input_types: Dict[str, str]):
+        """Input types of the current flow's questions (question_id -> input_type)"""
+        self.input_types = dict(input_types)
+    
+    def create(self, session_id: str, ip_address: str, user_agent: str,
+               current_node: Optional[str] = None) -> Dict[str, Any]:
+        """Create a new session with initial activity timestamp (and first funnel node)"""
+        with self.db.new_session_connection(session_id) as conn:
             # Check if last_activity column exists
             cursor = conn.execute("PRAGMA table_info(sessions)")
             columns = [row[1] for row in cursor.fetchall()]
             
             if 'last_activity' in columns:
                 conn.execute(
-                    """INSERT INTO sessions (id, ip_address, user_agent, status, last_activity)
-                       VALUES (?, ?, ?, 'in_progress', CURRENT_TIMESTAMP)""",
-                    (session_id, ip_address, user_agent)
+                    """INSERT INTO sessions (id, ip_address, user_agent, status, last_activity, current_node)
+                       VALUES (?, ?, ?, 'in_progress', CURRENT_TIMESTAMP, ?)""",
+                    (session_key(session_id), ip_address, user_agent, current_node)
                 )
             else:
                 conn.execute(
-                    """INSERT INTO sessions (id, ip_address, user_agent, status)
-                       VALUES (?, ?, ?, 'in_progress')""",
-                    (session_id, ip_address, user_agent)
+                    """INSERT INTO sessions (id, ip_address, user_agent, status, current_node)
+                       VALUES (?, ?, ?, 'in_progress', ?)""",
+                    (session_key(session_id), ip_address, user_agent, current_node)
                 )
+            bump_funnel(conn, current_node, 'reached')
         return self.get(session_id)
     
     def get(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session by ID with formatted timestamps"""
-        with self.db.get_connection() as conn:
+        with self.db.session_connection(session_id) as conn:
             cursor = conn.execute(
-                "SELECT * FROM sessions WHERE id = ?",
-                (session_id,)
+                "SELECT * FROM sessions WHERE id = ? AND deleted_at IS NULL",
+                (session_key(session_id),)
             )
             row = cursor.fetchone()
             if row:
-                data = dict(row)
-                # Apply shared formatting logic
-                if 'created_at' in data:
-                    data['created_at'] = format_timestamp_iso(data['created_at'])
-                if 'last_updated' in data:
-                    data['last_updated'] = format_timestamp_iso(data['last_updated'])
-                if 'last_activity' in data:
-                    data['last_activity'] = format_timestamp_iso(data['last_activity'])
-                return data
+                return format_session_row(row)
             return None
     
-    def update_status(self, session_id: str, status: str):
-        """Update session status"""
-        with self.db.get_connection() as conn:
+    def get_version(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the fields a session's ETag is derived from in one indexed lookup
+        (status, last_updated, version and answer count) without loading the answers
+        """
+        with self.db.session_connection(session_id) as conn:
+            cursor = conn.execute(
+                """SELECT s.status, s.last_updated, s.version,
+                          (SELECT COUNT(*) FROM answers a WHERE a.session_id = s.id) AS answers_count
+                   FROM sessions s WHERE s.id = ? AND s.deleted_at IS NULL""",
+                (session_key(session_id),)
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def get_many(self, session_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several sessions in one query per store (order not guaranteed)"""
+        if not session_ids:
+            return []
+        placeholders = ', '.join('?' for _ in session_ids)
+        sessions = []
+        for db in self.db.partitions():
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"SELECT * FROM sessions WHERE id IN ({placeholders}) AND deleted_at IS NULL",
+                    [session_key(session_id) for session_id in session_ids]
+                )
+                sessions.extend(format_session_row(row) for row in cursor.fetchall())
+        return sessions
+    
+    def get_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the materialized snapshot of a completed session, if any"""
+        with self.db.session_connection(session_id) as conn:
+            cursor = conn.execute(
+                "SELECT summary_blob FROM sessions WHERE id = ? AND deleted_at IS NULL",
+                (session_key(session_id),)
+            )
+            row = cursor.fetchone()
+            if row and row['summary_blob'] is not None:
+                return decode_snapshot(row['summary_blob'])
+            return None
+    
+    def save_snapshots(self, snapshots: Dict[str, Dict[str, Any]]):
+        """Materialize snapshots for completed sessions in a single transaction per shard"""
+        by_shard = {}
+        for session_id, snapshot in snapshots.items():
+            by_shard.setdefault(self.db.shard_for(session_id), []).append(
+                (encode_snapshot(snapshot), session_key(session_id))
+            )
+        for db, rows in by_shard.items():
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """UPDATE sessions SET summary_blob = ?
+                       WHERE id = ? AND status = 'completed'""",
+                    rows
+                )
+    
+    def save_snapshot(self, session_id: str, snapshot: Dict[str, Any]):
+        """Materialize the snapshot of one completed session"""
+        with self.db.session_connection(session_id) as conn:
             conn.execute(
-                """UPDATE sessions 
-                   SET status = ?, last_updated = CURRENT_TIMESTAMP
-                   WHERE id = ?""",
-                (status, session_id)
+                "UPDATE sessions SET summary_blob = ? WHERE id = ? AND status = 'completed'",
+                (encode_snapshot(snapshot), session_key(session_id))
             )
     
-    def update_activity(self, session_id: str):
-        """Update last_activity timestamp - called on every interaction"""
-        with self.db.get_connection() as conn:
+    def promote(self, session_id: str) -> bool:
+        """Move a completed session out of the hot store (no-op without hot/cold mode)"""
+        return self.db.promote(session_id)
+    
+    def list_pending_snapshots(self, limit: int = 500) -> List[str]:
+        """IDs of completed sessions that have no snapshot yet"""
+        session_ids = []
+        for db in self.db.shards:
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    """SELECT id FROM sessions
+                       WHERE status = 'completed' AND summary_blob IS NULL AND deleted_at IS NULL
+                       LIMIT ?""",
+                    (limit - len(session_ids),)
+                )
+                session_ids.extend(session_id_from_key(row['id']) for row in cursor.fetchall())
+            if len(session_ids) >= limit:
+                break
+        return session_ids
+    
+    def compact_keys(self, batch_size: int = 500) -> int:
+        """
+        Rewrite UUID session ids still stored as 36-character text (and their
+        answers' session_id) to 16-byte keys, one transaction per batch
+        
+        Returns:
+            Number of sessions converted
+        """
+        return sum(self._compact_keys_in(db, batch_size) for db in self.db.partitions())
+    
+    def _compact_keys_in(self, db: Database, batch_size: int) -> int:
+        """compact_keys for one store"""
+        total, last = 0, ''
+        while True:
+            with db.get_connection() as conn:
+                rows = conn.execute(
+                    """SELECT id FROM sessions
+                       WHERE typeof(id) = 'text' AND length(id) = 36 AND id > ?
+                       ORDER BY id LIMIT ?""",
+                    (last, batch_size)
+                ).fetchall()
+                ids = [row['id'] for row in rows]
+                pairs = [(session_key(session_id), session_id) for session_id in ids
+                         if isinstance(session_key(session_id), bytes)]
+                conn.executemany("UPDATE sessions SET id = ? WHERE id = ?", pairs)
+                conn.executemany("UPDATE answers SET session_id = ? WHERE session_id = ?", pairs)
+            total += len(pairs)
+            if len(ids) < batch_size:
+                return total
+            last = ids[-1]
+    
+    def update_status(self, session_id: str, status: str):
+        """Update session status (stamping completed_at on completion)"""
+        self.db.write(session_id, lambda conn: conn.execute(
+            """UPDATE sessions 
+               SET status = ?, last_updated = CURRENT_TIMESTAMP, version = version + 1,
+                   completed_at = CASE WHEN ? = 'completed'
+                                       THEN CURRENT_TIMESTAMP ELSE completed_at END
+               WHERE id = ?""",
+            (status, status, session_key(session_id))
+        ))
+    
+    def update_activity(self, session_id: str, current_node: Optional[str] = None):
+        """
+        Update last_activity timestamp - called on every interaction.
+        When current_node is given and differs from the stored one, the session
+        advances to it and the node's funnel "reached" counter is incremented.
+        """
+        def touch(conn):
+            if current_node:
+                cursor = conn.execute(
+                    """UPDATE sessions SET current_node = ?
+                       WHERE id = ? AND current_node IS NOT ?""",
+                    (current_node, session_key(session_id), current_node)
+                )
+                if cursor.rowcount:
+                    bump_funnel(conn, current_node, 'reached')
+            
             # Check if last_activity column exists
             cursor = conn.execute("PRAGMA table_info(sessions)")
             columns = [row[1] for row in cursor.fetchall()]
@@ -143,149 +1043,489 @@ class Session:
                        SET last_activity = CURRENT_TIMESTAMP, 
                            last_updated = CURRENT_TIMESTAMP 
                        WHERE id = ?""",
-                    (session_id,)
+                    (session_key(session_id),)
                 )
             else:
                 conn.execute(
                     """UPDATE sessions 
                        SET last_updated = CURRENT_TIMESTAMP 
                        WHERE id = ?""",
-                    (session_id,)
+                    (session_key(session_id),)
                 )
+        
+        self.db.write(session_id, touch)
     
     def touch(self, session_id: str):
         """Alias for update_activity"""
         self.update_activity(session_id)
     
-    def delete(self, session_id: str):
-        """Delete a session (cascade deletes answers)"""
-        with self.db.get_connection() as conn:
-            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+    def delete(self, session_id: str) -> bool:
+        """
+        Tombstone a session: it disappears from every read (and from the
+        funnel and distribution counters) at once, and purge_deleted()
+        removes it and its answers later
+        
+        Returns:
+            True if the session existed and was not deleted already
+        """
+        with self.db.session_connection(session_id) as conn:
+            if self._tombstone(conn, [session_key(session_id)]):
+                return True
+        # Archived sessions are tombstoned (and later purged) in their archive
+        for archive in self.db.archives():
+            with self.db.archive_connection(archive) as conn:
+                if self._tombstone(conn, [session_key(session_id)], 'archive'):
+                    return True
+        return False
+    
+    def _tombstone(self, conn, keys: List[Any], schema: str = 'main') -> int:
+        """
+        Tombstone the live sessions among keys (rows in schema) and retract
+        them from the analytics counters, in conn's transaction
+        
+        Returns:
+            Number of sessions tombstoned
+        """
+        placeholders = ', '.join('?' for _ in keys)
+        live = [row['id'] for row in conn.execute(
+            f"SELECT id FROM {schema}.sessions WHERE id IN ({placeholders}) AND deleted_at IS NULL", keys
+        )]
+        if not live:
+            return 0
+        retract_sessions(conn, live, self.input_types, schema)
+        placeholders = ', '.join('?' for _ in live)
+        return conn.execute(
+            f"UPDATE {schema}.sessions SET deleted_at = CURRENT_TIMESTAMP WHERE id IN ({placeholders})", live
+        ).rowcount
+    
+    def abandon(self, session_id: str) -> bool:
+        """
+        Tombstone an in-progress session the participant walked away from,
+        recording the abandonment against its current funnel node
+        """
+        with self.db.session_connection(session_id) as conn:
+            row = conn.execute(
+                "SELECT current_node FROM sessions WHERE id = ? AND status = 'in_progress' AND deleted_at IS NULL",
+                (session_key(session_id),)
+            ).fetchone()
+            if not row:
+                return False
+            bump_funnel(conn, row['current_node'], 'abandoned')
+            record_reaps(conn, "id = ?", (session_key(session_id),))
+            conn.execute("UPDATE sessions SET deleted_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (session_key(session_id),))
+            return True
+    
+    def delete_many(self, session_ids: List[str], chunk_size: int = 500) -> List[int]:
+        """
+        Tombstone several sessions (archived ones included), one transaction
+        per chunk of ids and store
+        
+        Returns:
+            Sessions deleted per chunk (their sum is the exact count)
+        """
+        keys = [session_key(session_id) for session_id in dict.fromkeys(session_ids)]
+        chunks = []
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            deleted = 0
+            for db in self.db.partitions():
+                with db.get_connection() as conn:
+                    deleted += self._tombstone(conn, chunk)
+            for archive in self.db.archives():
+                with self.db.archive_connection(archive) as conn:
+                    deleted += self._tombstone(conn, chunk, 'archive')
+            chunks.append(deleted)
+        return chunks
+    
+    def delete_matching(self, filters: Dict[str, Any], chunk_size: int = 500) -> List[int]:
+        """
+        Tombstone every session matching admin filters, archived ones
+        included, one transaction per chunk in each store (tombstoned rows
+        stop matching, so each chunk picks up where the last one ended)
+        
+        Returns:
+            Sessions deleted per chunk (their sum is the exact count)
+        """
+        where, params = session_filter_clause(filters)
+        archives = set(self.db.archives())
+        chunks = []
+        for db in self._stores(filters, include_archived=True):
+            schema = 'archive' if db in archives else 'main'
+            while True:
+                with (self.db.archive_connection(db) if db in archives else db.get_connection()) as conn:
+                    keys = [row['id'] for row in conn.execute(
+                        f"SELECT s.id FROM {schema}.sessions s {where} LIMIT ?", params + [chunk_size]
+                    )]
+                    deleted = self._tombstone(conn, keys, schema) if keys else 0
+                if deleted:
+                    chunks.append(deleted)
+                if deleted < chunk_size:
+                    break
+        return chunks
+    
+    def purge_deleted(self, batch_size: int = 500) -> int:
+        """
+        Hard-delete tombstoned sessions and their answers from every store
+        and archive, one transaction per batch (their counters were already
+        retracted when they were tombstoned)
+        
+        Returns:
+            Number of sessions purged
+        """
+        purged = 0
+        for db in self.db.partitions() + self.db.archives():
+            while True:
+                with db.get_connection() as conn:
+                    keys = [row['id'] for row in conn.execute(
+                        "SELECT id FROM sessions WHERE deleted_at IS NOT NULL LIMIT ?", (batch_size,)
+                    )]
+                    placeholders = ', '.join('?' for _ in keys)
+                    conn.execute(f"DELETE FROM answers WHERE session_id IN ({placeholders})", keys)
+                    conn.execute(f"DELETE FROM sessions WHERE id IN ({placeholders})", keys)
+                purged += len(keys)
+                if len(keys) < batch_size:
+                    break
+        return purged
     
     def cleanup_stale(self, minutes: int = 5) -> int:
-        """Delete sessions inactive for X minutes (in_progress only)"""
-        with self.db.get_connection() as conn:
+        """
+        Delete sessions inactive for X minutes (in_progress only) from every
+        store. Abandonment is recorded per funnel node before the rows are deleted.
+        """
+        deleted = sum(self._cleanup_stale_in(db, minutes) for db in self.db.partitions())
+        self.db.flush_hot()
+        return deleted
+    
+    def _cleanup_stale_in(self, db: Database, minutes: int) -> int:
+        """cleanup_stale for one store"""
+        with db.get_connection() as conn:
             # Check if last_activity column exists
             cursor = conn.execute("PRAGMA table_info(sessions)")
             columns = [row[1] for row in cursor.fetchall()]
+            activity_column = 'last_activity' if 'last_activity' in columns else 'last_updated'
+            stale_filter = f"""status = 'in_progress' AND deleted_at IS NULL
+                AND datetime({activity_column}) < datetime('now', '-' || ? || ' minutes')"""
             
-            if 'last_activity' in columns:
-                conn.execute(
-                    """DELETE FROM sessions 
-                       WHERE status = 'in_progress' 
-                       AND datetime(last_activity) < datetime('now', '-' || ? || ' minutes')""",
-                    (minutes,)
-                )
-            else:
+            conn.execute(
+                f"""INSERT INTO funnel_stats (node_id, abandoned)
+                    SELECT current_node, COUNT(*) FROM sessions
+                    WHERE {stale_filter} AND current_node IS NOT NULL
+                    GROUP BY current_node
+                    ON CONFLICT(node_id) DO UPDATE SET abandoned = abandoned + excluded.abandoned""",
+                (minutes,)
+            )
+            record_reaps(conn, stale_filter, (minutes,))
+            conn.execute(
+                f"DELETE FROM answers WHERE session_id IN (SELECT id FROM sessions WHERE {stale_filter})",
+                (minutes,)
+            )
+            cursor = conn.execute(
+                f"DELETE FROM sessions WHERE {stale_filter}",
+                (minutes,)
+            )
+            if cursor.rowcount:
                 conn.execute(
-                    """DELETE FROM sessions 
-                       WHERE status = 'in_progress' 
-                       AND datetime(last_updated) < datetime('now', '-' || ? || ' minutes')""",
-                    (minutes,)
+                    """INSERT INTO session_reaps (bucket_start, cleaned_up, updated_at)
+                       VALUES (strftime('%Y-%m-%d %H:00:00', 'now'), ?, CURRENT_TIMESTAMP)
+                       ON CONFLICT(bucket_start) DO UPDATE SET
+                           cleaned_up = cleaned_up + excluded.cleaned_up,
+                           updated_at = excluded.updated_at""",
+                    (cursor.rowcount,)
                 )
-            return conn.total_changes
+            return cursor.rowcount
     
     def cleanup_abandoned(self, minutes: int = 30) -> int:
         """Legacy method - now calls cleanup_stale"""
         return self.cleanup_stale(minutes)
     
-    def list_all(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """List all sessions with formatted timestamps"""
-        with self.db.get_connection() as conn:
-            # Check if session_summary view exists
+    def _stores(self, filters: Optional[Dict[str, Any]], include_archived: bool) -> List[Database]:
+        """Stores an admin read covers: the live ones, plus archives that can match when asked"""
+        stores = self.db.partitions()
+        if include_archived:
+            # Archives are by completion month, which never precedes creation
+            created_after = (filters or {}).get('created_after')
+            if isinstance(created_after, datetime):
+                created_after = created_after.strftime('%Y-%m')
+            stores = stores + self.db.archives(since_month=created_after[:7] if created_after else None)
+        return stores
+    
+    def list_all(self, limit: int = 50, offset: int = 0, filters: Optional[Dict[str, Any]] = None,
+                 include_archived: bool = False) -> List[Dict[str, Any]]:
+        """List sessions newest-first with formatted timestamps, optionally filtered (and with archives)"""
+        partitions = self._stores(filters, include_archived)
+        if len(partitions) == 1:
+            with self.db.get_connection() as conn:
+                cursor = conn.execute(*self.list_query(filters, limit, offset))
+                return [format_session_row(row) for row in cursor.fetchall()]
+        
+        # Fan-out: the first offset + limit rows of every store, merged by created_at
+        rows = []
+        for db in partitions:
+            with db.get_connection() as conn:
+                rows.extend(conn.execute(*self.list_query(filters, offset + limit, 0)).fetchall())
+        rows.sort(key=lambda row: row['created_at'] or '', reverse=True)
+        return [format_session_row(row) for row in rows[offset:offset + limit]]
+    
+    @staticmethod
+    def list_query(filters: Optional[Dict[str, Any]], limit: int, offset: int) -> Tuple[str, List[Any]]:
+        """SQL and parameters of the filtered listing (shared with query-plan tests)"""
+        where, params = session_filter_clause(filters)
+        sql = f"""SELECT s.id, s.status, s.ip_address, s.created_at, s.last_updated, s.last_activity,
+                         (SELECT COUNT(*) FROM answers a WHERE a.session_id = s.id) AS answers_count
+                  FROM sessions s {where}
+                  ORDER BY s.created_at DESC LIMIT ? OFFSET ?"""
+        return sql, params + [limit, offset]
+    
+    @staticmethod
+    def count_query(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """SQL and parameters of the filtered count"""
+        where, params = session_filter_clause(filters)
+        return f"SELECT COUNT(*) as count FROM sessions s {where}", params
+    
+    def count(self, filters: Optional[Dict[str, Any]] = None, include_archived: bool = False) -> int:
+        """Count sessions in every store, optionally filtered (and with archives)"""
+        total = 0
+        for db in self._stores(filters, include_archived):
+            with db.get_connection() as conn:
+                total += conn.execute(*self.count_query(filters)).fetchone()['count']
+        return total
+    
+    def status_counts(self) -> Tuple[Dict[str, int], int]:
+        """({status: session count}, total answers) summed over every store, archives included"""
+        statuses, answers = Counter(), 0
+        for db in self.db.partitions() + self.db.archives():
+            with db.get_connection() as conn:
+                for row in conn.execute(
+                    "SELECT status, COUNT(*) FROM sessions WHERE deleted_at IS NULL GROUP BY status"
+                ):
+                    statuses[row[0]] += row[1]
+                answers += conn.execute(f"SELECT COUNT(*) FROM answers WHERE {LIVE_ANSWERS}").fetchone()[0]
+        return dict(statuses), answers
+    
+    def get_all_with_answers(self, filters: Optional[Dict[str, Any]] = None, batch_size: int = 500,
+                             include_archived: bool = False) -> List[Dict[str, Any]]:
+        """
+        Sessions (newest-first, optionally filtered, optionally with archives)
+        each with its answers. Answers are fetched per batch of sessions
+        through idx_answers_session.
+        """
+        partitions = self._stores(filters, include_archived)
+        sessions = []
+        for db in partitions:
+            sessions.extend(self._with_answers_in(db, filters, batch_size))
+        if len(partitions) > 1:
+            sessions.sort(key=lambda session: session['created_at'] or '', reverse=True)
+        return sessions
+    
+    def _with_answers_in(self, db: Database, filters: Optional[Dict[str, Any]],
+                         batch_size: int) -> List[Dict[str, Any]]:
+        """get_all_with_answers for one store"""
+        where, params = session_filter_clause(filters)
+        sessions = []
+        with db.get_connection() as conn:
             cursor = conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='view' AND name='session_summary'"
+                f"""SELECT s.id, s.status, s.ip_address, s.user_agent, s.created_at,
+                           s.last_updated, s.last_activity, s.completed_at
+                    FROM sessions s {where}
+                    ORDER BY s.created_at DESC""",
+                params
             )
-            view_exists = cursor.fetchone()
-            
-            if view_exists:
-                cursor = conn.execute(
-                    """SELECT * FROM session_summary 
-                       ORDER BY created_at DESC LIMIT ? OFFSET ?""",
-                    (limit, offset)
-                )
-            else:
-                cursor = conn.execute(
-                    """SELECT * FROM sessions 
-                       ORDER BY created_at DESC LIMIT ? OFFSET ?""",
-                    (limit, offset)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch = {row['id']: format_session_row(row) for row in rows}
+                for session in batch.values():
+                    session['answers'] = []
+                placeholders = ', '.join('?' for _ in batch)
+                answers = conn.execute(
+                    f"""SELECT a.session_id, a.question_id, {QUESTION_TEXT_SQL} AS question_text,
+                               a.answer_text, a.created_at
+                        FROM answers a LEFT JOIN questions q ON q.id = a.question_ref
+                        WHERE a.session_id IN ({placeholders})
+                        ORDER BY a.created_at""",
+                    list(batch)
                 )
-            
-            sessions = []
-            for row in cursor.fetchall():
-                data = dict(row)
-                # Apply shared formatting logic
-                if 'created_at' in data:
+                for answer in answers.fetchall():
+                    data = dict(answer)
                     data['created_at'] = format_timestamp_iso(data['created_at'])
-                if 'last_updated' in data:
-                    data['last_updated'] = format_timestamp_iso(data['last_updated'])
-                if 'last_activity' in data:
-                    data['last_activity'] = format_timestamp_iso(data['last_activity'])
-                sessions.append(data)
-            return sessions
-    
-    def count(self) -> int:
-        """Count total sessions"""
-        with self.db.get_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) as count FROM sessions")
-            return cursor.fetchone()['count']
+                    batch[data.pop('session_id')]['answers'].append(data)
+                sessions.extend(batch.values())
+        return sessions
+    
+    def get_archived(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Admin detail ({'session', 'answers'}) of an archived session, newest archive first"""
+        for archive in reversed(self.db.archives()):
+            archived = Session(archive)
+            session = archived.get(session_id)
+            if session:
+                snapshot = archived.get_snapshot(session_id)
+                if snapshot:
+                    return snapshot['detail']
+                return {'session': session, 'answers': Answer(archive).get_by_session(session_id)}
+        return None
+
+
+# Question text of an answer row aliased a: the normalized questions row
+# (joined as q) or, for rows not yet deduplicated, the inline copy
+QUESTION_TEXT_SQL = "COALESCE(q.text, a.question_text)"
+
+
+def legacy_flow_version(question_text: str) -> str:
+    """flow_version for historical question text that matches no current flow"""
+    return 'legacy-' + hashlib.sha1(question_text.encode('utf-8')).hexdigest()[:12]
+
+
+def _resolve_question_refs(conn, flow_version: str, questions) -> Dict[Tuple[str, str], Optional[int]]:
+    """
+    Insert (question_id, text) pairs under flow_version if their slot is free
+    and return {(question_id, text): questions.id, or None if the slot holds other text}
+    """
+    refs = {}
+    for question_id, text in questions:
+        conn.execute(
+            """INSERT INTO questions (flow_version, question_id, text) VALUES (?, ?, ?)
+               ON CONFLICT(flow_version, question_id) DO NOTHING""",
+            (flow_version, question_id, text)
+        )
+        row = conn.execute(
+            "SELECT id, text FROM questions WHERE flow_version = ? AND question_id = ?",
+            (flow_version, question_id)
+        ).fetchone()
+        refs[(question_id, text)] = row['id'] if row['text'] == text else None
+    return refs
 
 
 class Answer:
-    """Answer model with question text storage"""
+    """Answer model; question text is stored once per (flow_version, question_id)"""
     
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, flow_version: Optional[str] = None):
         self.db = db
+        # Without a flow version question text is stored inline in each answer
+        self.flow_version = flow_version
+        self._question_refs: Dict[Tuple[str, str], Optional[int]] = {}
     
-    def save(self, session_id: str, question_id: str, answer_text: str, question_text: str = ""):
-        """Save or update an answer WITH question text"""
+    def register_questions(self, questions: Dict[str, str]):
+        """
+        Store the current flow's question texts (question_id -> text) under
+        self.flow_version and cache their ids. If a slot already holds other
+        text (the flow changed without a version bump) that question's text
+        keeps being stored inline.
+        """
+        if not self.flow_version:
+            return
         with self.db.get_connection() as conn:
+            refs = _resolve_question_refs(conn, self.flow_version, questions.items())
+        for question_id, text in questions.items():
+            self._question_refs[(question_id, text)] = refs[(question_id, text)]
+        self.db.sync_questions()
+    
+    def save(self, session_id: str, question_id: str, answer_text: str, question_text: str = "",
+             input_type: Optional[str] = None, answer_value: Any = None):
+        """
+        Save or update an answer WITH question text.
+        The typed answer_value is stored as canonical JSON next to the display
+        text (derived from the text when not given).
+        A first answer to a question counts towards its funnel "answered" total.
+        For choice/ranking questions (input_type given) the answer_distribution
+        counts are updated in the same transaction: the previous answer's keys
+        are decremented and the new ones incremented.
+        """
+        if answer_value is None:
+            answer_value = parse_answer_text(input_type, answer_text)
+        answer_json = encode_answer_value(answer_value)
+        
+        def upsert(conn):
             # Check if question_text column exists
             cursor = conn.execute("PRAGMA table_info(answers)")
             columns = [row[1] for row in cursor.fetchall()]
             
+            row = conn.execute(
+                """SELECT answer_text, answer_json FROM answers
+                   WHERE session_id = ? AND question_id = ?""",
+                (session_key(session_id), question_id)
+            ).fetchone()
+            
             if 'question_text' in columns:
+                question_ref = self._question_refs.get((question_id, question_text))
                 conn.execute(
-                    """INSERT INTO answers (session_id, question_id, question_text, answer_text)
-                       VALUES (?, ?, ?, ?)
+                    """INSERT INTO answers (session_id, question_id, question_text, question_ref,
+                                            answer_text, answer_json)
+                       VALUES (?, ?, ?, ?, ?, ?)
                        ON CONFLICT(session_id, question_id) 
                        DO UPDATE SET 
                            answer_text = excluded.answer_text,
+                           answer_json = excluded.answer_json,
                            question_text = excluded.question_text,
+                           question_ref = excluded.question_ref,
                            created_at = CURRENT_TIMESTAMP""",
-                    (session_id, question_id, question_text, answer_text)
+                    (session_key(session_id), question_id, '' if question_ref else question_text, question_ref,
+                     answer_text, answer_json)
                 )
             else:
                 conn.execute(
-                    """INSERT INTO answers (session_id, question_id, answer_text)
-                       VALUES (?, ?, ?)
+                    """INSERT INTO answers (session_id, question_id, answer_text, answer_json)
+                       VALUES (?, ?, ?, ?)
                        ON CONFLICT(session_id, question_id) 
                        DO UPDATE SET 
                            answer_text = excluded.answer_text,
+                           answer_json = excluded.answer_json,
                            created_at = CURRENT_TIMESTAMP""",
-                    (session_id, question_id, answer_text)
+                    (session_key(session_id), question_id, answer_text, answer_json)
                 )
+            
+            if row is None:
+                bump_funnel(conn, question_id, 'answered')
+            conn.execute("UPDATE sessions SET version = version + 1 WHERE id = ?", (session_key(session_id),))
+            
+            if input_type in DISTRIBUTION_INPUT_TYPES:
+                previous = decode_answer_value(row['answer_json'], input_type,
+                                               row['answer_text']) if row else None
+                self._update_distribution(conn, question_id,
+                                          distribution_keys(input_type, previous),
+                                          distribution_keys(input_type, answer_value))
+        
+        self.db.write(session_id, upsert)
+    
+    def _update_distribution(self, conn, question_id: str, removed: List[Tuple[str, int]],
+                             added: List[Tuple[str, int]]):
+        """Apply decrement-then-increment deltas, skipping keys that did not change"""
+        delta = Counter(added)
+        delta.subtract(Counter(removed))
+        rows = [(question_id, option, rank, change)
+                for (option, rank), change in delta.items() if change]
+        if rows:
+            conn.executemany(
+                """INSERT INTO answer_distribution (question_id, option, rank, count)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(question_id, option, rank)
+                   DO UPDATE SET count = count + excluded.count""",
+                rows
+            )
     
     def get_by_session(self, session_id: str) -> List[Dict[str, Any]]:
         """Get all answers for a session with question text AND formatted timestamp"""
-        with self.db.get_connection() as conn:
+        with self.db.session_connection(session_id) as conn:
             # Check if question_text column exists
             cursor = conn.execute("PRAGMA table_info(answers)")
             columns = [row[1] for row in cursor.fetchall()]
             
             if 'question_text' in columns:
                 cursor = conn.execute(
-                    """SELECT id, question_id, question_text, answer_text, created_at
-                       FROM answers WHERE session_id = ?
-                       ORDER BY created_at""",
-                    (session_id,)
+                    f"""SELECT a.id, a.question_id, {QUESTION_TEXT_SQL} AS question_text,
+                               a.answer_text, a.created_at
+                        FROM answers a LEFT JOIN questions q ON q.id = a.question_ref
+                        WHERE a.session_id = ?
+                        ORDER BY a.created_at""",
+                    (session_key(session_id),)
                 )
             else:
                 cursor = conn.execute(
                     """SELECT question_id, answer_text, created_at
                        FROM answers WHERE session_id = ?
                        ORDER BY created_at""",
-                    (session_id,)
+                    (session_key(session_id),)
                 )
             
             # FIX: Iterate and format timestamps for answers too!
@@ -297,13 +1537,460 @@ class Answer:
                 answers.append(data)
             return answers
     
+    def get_by_sessions(self, session_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Get answers for several sessions in one query, grouped by session ID"""
+        grouped = {session_id: [] for session_id in session_ids}
+        if not session_ids:
+            return grouped
+        placeholders = ', '.join('?' for _ in session_ids)
+        for db in self.db.partitions():
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"""SELECT a.session_id, a.id, a.question_id, {QUESTION_TEXT_SQL} AS question_text,
+                               a.answer_text, a.created_at
+                        FROM answers a LEFT JOIN questions q ON q.id = a.question_ref
+                        WHERE a.session_id IN ({placeholders})
+                        ORDER BY a.created_at""",
+                    [session_key(session_id) for session_id in session_ids]
+                )
+                for row in cursor.fetchall():
+                    data = dict(row)
+                    session_id = session_id_from_key(data.pop('session_id'))
+                    data['created_at'] = format_timestamp_iso(data['created_at'])
+                    grouped[session_id].append(data)
+        return grouped
+    
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               snippets_per_session: int = 3) -> List[Dict[str, Any]]:
+        """
+        Full-text search over answer and question text, one result per session
+        ranked by its best-matching answer (bm25, lower is better). Snippets are
+        only generated for the sessions on the requested page.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        partitions = self.db.partitions()
+        if len(partitions) == 1:
+            return self._search_in(self.db, match, limit, offset, snippets_per_session)
+        results = []
+        for db in partitions:
+            results.extend(self._search_in(db, match, offset + limit, 0, snippets_per_session))
+        # bm25 scores are per-index statistics, so cross-store ordering is approximate
+        results.sort(key=lambda result: (result['score'], result['session_id']))
+        return results[offset:offset + limit]
+    
+    def _search_in(self, db: Database, match: str, limit: int, offset: int,
+                   snippets_per_session: int) -> List[Dict[str, Any]]:
+        """search for one store"""
+        with db.get_connection() as conn:
+            ranked = conn.execute(
+                """WITH hits AS MATERIALIZED (
+                       SELECT rowid, bm25(answers_fts) AS score
+                       FROM answers_fts WHERE answers_fts MATCH ?
+                   )
+                   SELECT a.session_id, s.status, s.created_at,
+                          MIN(hits.score) AS score, COUNT(*) AS matches
+                   FROM hits
+                   JOIN answers a ON a.id = hits.rowid
+                   JOIN sessions s ON s.id = a.session_id
+                   WHERE s.deleted_at IS NULL
+                   GROUP BY a.session_id
+                   ORDER BY score, a.session_id
+                   LIMIT ? OFFSET ?""",
+                (match, limit, offset)
+            ).fetchall()
+            if not ranked:
+                return []
+            
+            session_ids = [row['session_id'] for row in ranked]
+            placeholders = ', '.join('?' for _ in session_ids)
+            cursor = conn.execute(
+                f"""SELECT a.session_id, a.question_id, {QUESTION_TEXT_SQL} AS question_text,
+                           snippet(answers_fts, 0, '[', ']', '…', 12) AS snippet
+                    FROM answers_fts
+                    JOIN answers a ON a.id = answers_fts.rowid
+                    LEFT JOIN questions q ON q.id = a.question_ref
+                    WHERE answers_fts MATCH ? AND a.session_id IN ({placeholders})
+                    ORDER BY bm25(answers_fts)""",
+                [match] + session_ids
+            )
+            snippets = {session_id: [] for session_id in session_ids}
+            for row in cursor.fetchall():
+                if len(snippets[row['session_id']]) < snippets_per_session:
+                    snippets[row['session_id']].append({
+                        'question_id': row['question_id'],
+                        'question_text': row['question_text'],
+                        'snippet': row['snippet']
+                    })
+        
+        return [{
+            'session_id': session_id_from_key(row['session_id']),
+            'status': row['status'],
+            'created_at': format_timestamp_iso(row['created_at']),
+            'score': round(row['score'], 4),
+            'matches': row['matches'],
+            'snippets': snippets[row['session_id']]
+        } for row in ranked]
+    
     def get(self, session_id: str, question_id: str) -> Optional[str]:
         """Get specific answer"""
-        with self.db.get_connection() as conn:
+        with self.db.session_connection(session_id) as conn:
             cursor = conn.execute(
                 """SELECT answer_text FROM answers
                    WHERE session_id = ? AND question_id = ?""",
-                (session_id, question_id)
+                (session_key(session_id), question_id)
             )
             row = cursor.fetchone()
-            return row['answer_text'] if row else None
\ No newline at end of file
+            return row['answer_text'] if row else None
+    
+    def get_value(self, session_id: str, question_id: str, input_type: Optional[str] = None) -> Any:
+        """Get the typed value of an answer (None when unanswered)"""
+        with self.db.session_connection(session_id) as conn:
+            row = conn.execute(
+                """SELECT answer_json, answer_text FROM answers
+                   WHERE session_id = ? AND question_id = ?""",
+                (session_key(session_id), question_id)
+            ).fetchone()
+        if row is None:
+            return None
+        return decode_answer_value(row['answer_json'], input_type, row['answer_text'])
+    
+    def list_missing_json(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Answers stored before answer_json existed (id, question_id, answer_text);
+        ids are (shard index, row id) pairs to hand back to save_json
+        """
+        rows = []
+        for index, db in enumerate(self.db.shards):
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    """SELECT id, question_id, answer_text FROM answers
+                       WHERE answer_json IS NULL LIMIT ?""",
+                    (limit - len(rows),)
+                )
+                rows.extend(dict(row, id=(index, row['id'])) for row in cursor.fetchall())
+            if len(rows) >= limit:
+                break
+        return rows
+    
+    def dedupe_question_text(self, batch_size: int = 500) -> int:
+        """
+        Move inline question text of historical answers into the questions
+        table, one write transaction per batch. Text matching the current
+        flow joins its row; anything else gets a legacy-<hash> flow version.
+        
+        Returns:
+            Number of answers deduplicated
+        """
+        return sum(self._dedupe_question_text_in(db, batch_size) for db in self.db.partitions())
+    
+    def _dedupe_question_text_in(self, db: Database, batch_size: int) -> int:
+        """dedupe_question_text for one store (new legacy rows go to shard 0 and are mirrored)"""
+        total = 0
+        while True:
+            with db.get_connection() as conn:
+                rows = conn.execute(
+                    """SELECT id, question_id, question_text FROM answers
+                       WHERE question_ref IS NULL AND question_text != '' LIMIT ?""",
+                    (batch_size,)
+                ).fetchall()
+                pairs = {(row['question_id'], row['question_text']) for row in rows}
+                refs = {pair: self._question_refs.get(pair) for pair in pairs}
+                legacy = [pair for pair, ref in refs.items() if ref is None]
+                if legacy and db is not self.db:
+                    with self.db.get_connection() as catalogue:
+                        for pair in legacy:
+                            refs.update(_resolve_question_refs(catalogue, legacy_flow_version(pair[1]), [pair]))
+                    self.db.sync_questions()
+                else:
+                    for pair in legacy:
+                        refs.update(_resolve_question_refs(conn, legacy_flow_version(pair[1]), [pair]))
+                updates = [(refs[(row['question_id'], row['question_text'])], row['id']) for row in rows]
+                conn.executemany(
+                    "UPDATE answers SET question_ref = ?, question_text = '' WHERE id = ?",
+                    updates
+                )
+            total += len(rows)
+            if len(rows) < batch_size:
+                return total
+    
+    def save_json(self, values: Dict[Tuple[int, int], Any]):
+        """Store canonical JSON for several answers (ids from list_missing_json) in one transaction per shard"""
+        by_shard = {}
+        for (index, answer_id), value in values.items():
+            by_shard.setdefault(index, []).append((encode_answer_value(value), answer_id))
+        for index, rows in by_shard.items():
+            with self.db.shards[index].get_connection() as conn:
+                conn.executemany("UPDATE answers SET answer_json = ? WHERE id = ?", rows)
+
+
+class Analytics:
+    """
+    Read model for the incrementally maintained analytics tables.
+    Session data and aggregate counters are summed over every shard;
+    rollups and job state live in shard 0. Raw session and answer rows
+    (rollup inputs, scale values, snapshot exports) are also read from
+    the archives.
+    """
+    
+    def __init__(self, db: Database):
+        self.db = db
+    
+    def _raw_stores(self) -> List[Database]:
+        """Stores with raw session and answer rows: the shards, then the archives"""
+        return self.db.shards + self.db.archives()
+    
+    def get_answer_distribution(self, question_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get (question_id, option, rank, count) rows, optionally for one question"""
+        where, params = ("WHERE question_id = ?", (question_id,)) if question_id else ("", ())
+        counts = Counter()
+        for db in self.db.shards:
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"SELECT question_id, option, rank, count FROM answer_distribution {where}",
+                    params
+                )
+                for row in cursor.fetchall():
+                    counts[(row['question_id'], row['option'], row['rank'])] += row['count']
+        return [{'question_id': key[0], 'option': key[1], 'rank': key[2], 'count': count}
+                for key, count in counts.items() if count > 0]
+    
+    def get_funnel(self) -> Dict[str, Dict[str, int]]:
+        """Get funnel counters keyed by node ID"""
+        funnel = {}
+        for db in self.db.shards:
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    "SELECT node_id, reached, answered, abandoned FROM funnel_stats"
+                )
+                for row in cursor.fetchall():
+                    counters = funnel.setdefault(row['node_id'], {
+                        'node_id': row['node_id'], 'reached': 0, 'answered': 0, 'abandoned': 0
+                    })
+                    for column in ('reached', 'answered', 'abandoned'):
+                        counters[column] += row[column]
+        return funnel
+    
+    # ------------------------------------------
+    # Time-series rollups
+    # ------------------------------------------
+    def get_watermark(self, name: str) -> Optional[str]:
+        """Get the watermark of an incremental job (UTC timestamp string)"""
+        with self.db.get_connection() as conn:
+            row = conn.execute(
+                "SELECT watermark FROM job_state WHERE name = ?", (name,)
+            ).fetchone()
+            return row['watermark'] if row else None
+    
+    def touched_hour_buckets(self, since: str) -> List[str]:
+        """UTC hour buckets with session, answer, reap or delete activity since a timestamp"""
+        hour = "strftime('%Y-%m-%d %H:00:00', {})"
+        buckets = set()
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"""SELECT {hour.format('created_at')} AS bucket FROM sessions WHERE created_at >= ?
+                        UNION SELECT {hour.format('completed_at')} FROM sessions WHERE completed_at >= ?
+                        UNION SELECT {hour.format('created_at')} FROM answers WHERE created_at >= ?
+                        UNION SELECT bucket_start FROM session_reaps WHERE updated_at >= ?
+                        -- sessions promoted from hot storage land after their start/answer hours
+                        UNION SELECT {hour.format('created_at')} FROM sessions WHERE completed_at >= ?
+                        UNION SELECT {hour.format('a.created_at')} FROM answers a
+                            JOIN sessions s ON s.id = a.session_id WHERE s.completed_at >= ?
+                        -- a tombstone takes a session out of every hour it counted in
+                        UNION SELECT {hour.format('created_at')} FROM sessions WHERE deleted_at >= ?
+                        UNION SELECT {hour.format('completed_at')} FROM sessions WHERE deleted_at >= ?
+                        UNION SELECT {hour.format('a.created_at')} FROM answers a
+                            JOIN sessions s ON s.id = a.session_id WHERE s.deleted_at >= ?""",
+                    (since,) * 9
+                )
+                buckets.update(row['bucket'] for row in cursor.fetchall() if row['bucket'])
+        return sorted(buckets)
+    
+    def get_bucket_raw(self, start: str, end: str) -> Dict[str, Any]:
+        """
+        Raw inputs for one rollup bucket [start, end): event counts plus the
+        time-to-complete and per-question dwell samples (seconds)
+        """
+        started, reaped, cleaned_up, ttc, dwell = 0, 0, 0, [], []
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                started += conn.execute(
+                    "SELECT COUNT(*) FROM sessions WHERE created_at >= ? AND created_at < ? AND deleted_at IS NULL",
+                    (start, end)
+                ).fetchone()[0]
+                reaps = conn.execute(
+                    """SELECT COALESCE(SUM(reaped_started), 0), COALESCE(SUM(cleaned_up), 0)
+                       FROM session_reaps WHERE bucket_start >= ? AND bucket_start < ?""",
+                    (start, end)
+                ).fetchone()
+                reaped += reaps[0]
+                cleaned_up += reaps[1]
+                ttc.extend(row[0] for row in conn.execute(
+                    """SELECT (julianday(completed_at) - julianday(created_at)) * 86400
+                       FROM sessions WHERE completed_at >= ? AND completed_at < ? AND deleted_at IS NULL""",
+                    (start, end)
+                ))
+                dwell.extend((row[0], row[1]) for row in conn.execute(
+                    """SELECT a.question_id,
+                              (julianday(a.created_at) - julianday(COALESCE(
+                                  (SELECT MAX(p.created_at) FROM answers p
+                                   WHERE p.session_id = a.session_id AND p.created_at < a.created_at),
+                                  s.created_at))) * 86400
+                       FROM answers a JOIN sessions s ON s.id = a.session_id
+                       WHERE a.created_at >= ? AND a.created_at < ? AND s.deleted_at IS NULL""",
+                    (start, end)
+                ))
+        return {
+            'sessions_started': started + reaped,
+            'sessions_completed': len(ttc),
+            'sessions_cleaned_up': cleaned_up,
+            'ttc': ttc,
+            'dwell': dwell
+        }
+    
+    def save_rollups(self, rollups: List[Dict[str, Any]], job_name: str, watermark: str):
+        """Upsert rollup buckets and advance the job watermark in one transaction"""
+        with self.db.get_connection() as conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO timeseries_rollups
+                   (granularity, bucket_start, sessions_started, sessions_completed,
+                    sessions_cleaned_up, ttc_median_seconds, ttc_p95_seconds, dwell_json)
+                   VALUES (:granularity, :bucket_start, :sessions_started, :sessions_completed,
+                           :sessions_cleaned_up, :ttc_median_seconds, :ttc_p95_seconds, :dwell_json)""",
+                rollups
+            )
+            conn.execute(
+                """INSERT INTO job_state (name, watermark) VALUES (?, ?)
+                   ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark""",
+                (job_name, watermark)
+            )
+    
+    def get_timeseries(self, granularity: str, since: str, until: str) -> List[Dict[str, Any]]:
+        """Read rollup buckets for a granularity within [since, until)"""
+        with self.db.get_connection() as conn:
+            cursor = conn.execute(
+                """SELECT * FROM timeseries_rollups
+                   WHERE granularity = ? AND bucket_start >= ? AND bucket_start < ?
+                   ORDER BY bucket_start""",
+                (granularity, since, until)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def now(self) -> str:
+        """Current UTC time as SQLite formats CURRENT_TIMESTAMP"""
+        with self.db.get_connection() as conn:
+            return conn.execute("SELECT datetime('now')").fetchone()[0]
+    
+    # ------------------------------------------
+    # Scale answers
+    # ------------------------------------------
+    def answer_stamp(self, question_id: str) -> Tuple[int, Optional[str]]:
+        """
+        (count, latest created_at) of a question's answers - an index-only
+        query that changes whenever an answer is added or overwritten
+        """
+        count, latest = 0, None
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                row = conn.execute(
+                    f"SELECT COUNT(*), MAX(created_at) FROM answers WHERE question_id = ? AND {LIVE_ANSWERS}",
+                    (question_id,)
+                ).fetchone()
+            count += row[0]
+            if row[1] and (latest is None or row[1] > latest):
+                latest = row[1]
+        return count, latest
+    
+    def iter_scale_values(self, question_id: str, fields: List[str], batch_size: int = 5000):
+        """
+        Stream numeric scale ratings as tuples (one value per field, None when
+        missing) in a single fetchmany pass. JSON is unpacked by SQLite's
+        json_extract, so no per-row json.loads happens in Python.
+        """
+        # answer_json is canonical; legacy rows still hold the JSON in answer_text
+        columns = ', '.join('json_extract(COALESCE(answer_json, answer_text), ?)' for _ in fields)
+        params = [f'$.{field}' for field in fields] + [question_id]
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"""SELECT {columns} FROM answers
+                        WHERE question_id = ? AND {LIVE_ANSWERS}
+                          AND CASE WHEN json_valid(COALESCE(answer_json, answer_text))
+                              THEN json_type(COALESCE(answer_json, answer_text)) END = 'object'""",
+                    params
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+    
+    # ------------------------------------------
+    # Columnar snapshot export
+    # ------------------------------------------
+    def iter_sessions_since(self, since: Optional[str], batch_size: int = 5000):
+        """
+        Stream (id, status, created_at, completed_at) of sessions updated since
+        a timestamp (all sessions when since is None); timestamps are epoch seconds
+        """
+        where = "WHERE deleted_at IS NULL" + (" AND last_updated >= ?" if since else "")
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"""SELECT id, status,
+                               CAST(strftime('%s', created_at) AS INTEGER),
+                               CAST(strftime('%s', completed_at) AS INTEGER)
+                        FROM sessions {where}""",
+                    (since,) if since else ()
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [(session_id_from_key(row[0]),) + tuple(row[1:]) for row in rows]
+    
+    def iter_answers_since(self, since: Optional[str], batch_size: int = 5000):
+        """
+        Stream (session_id, question_id, answer_text, created_at) of answers
+        written since a timestamp (all answers when since is None)
+        """
+        where = f"WHERE {LIVE_ANSWERS}" + (" AND created_at >= ?" if since else "")
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                cursor = conn.execute(
+                    f"""SELECT session_id, question_id, answer_text,
+                               CAST(strftime('%s', created_at) AS INTEGER)
+                        FROM answers {where}""",
+                    (since,) if since else ()
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [(session_id_from_key(row[0]),) + tuple(row[1:]) for row in rows]
+    
+    def deleted_session_ids_since(self, since: str) -> set:
+        """IDs of sessions tombstoned since a timestamp (not yet purged)"""
+        deleted = set()
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                cursor = conn.execute("SELECT id FROM sessions WHERE deleted_at >= ?", (since,))
+                deleted.update(session_id_from_key(row['id']) for row in cursor.fetchall())
+        return deleted
+    
+    def existing_session_ids(self, session_ids: List[str], batch_size: int = 500) -> set:
+        """Subset of the given session IDs that still exist (live or archived)"""
+        existing = set()
+        for db in self._raw_stores():
+            with db.get_connection() as conn:
+                for start in range(0, len(session_ids), batch_size):
+                    chunk = session_ids[start:start + batch_size]
+                    placeholders = ', '.join('?' for _ in chunk)
+                    cursor = conn.execute(
+                        f"SELECT id FROM sessions WHERE id IN ({placeholders}) AND deleted_at IS NULL",
+                        [session_key(session_id) for session_id in chunk]
+                    )
+                    existing.update(session_id_from_key(row['id']) for row in cursor.fetchall())
+        return existing
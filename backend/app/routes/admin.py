@@ -1,36 +1,82 @@
 import csv
 import io
 import json
-from flask import Blueprint, request, jsonify, Response, send_file
-from datetime import datetime
+from flask import Blueprint, request, jsonify, Response, send_file, current_app
+from datetime import datetime, timedelta
+from ..services.backup import BackupInProgress
+from ..utils.helpers import build_etag, apply_cache_headers, parse_utc, validate_session_id_format
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-# Global variables to store models
+# Global variables to store models (read_* serve listings, search, detail,
+# stats and exports through the read-only connection pool)
 session_model = None
 answer_model = None
+read_session_model = None
+read_answer_model = None
 
-def init_models(sess_model, ans_model):
+def init_models(sess_model, ans_model, read_sess_model=None, read_ans_model=None):
     """Initialize the models for this blueprint"""
-    global session_model, answer_model
+    global session_model, answer_model, read_session_model, read_answer_model
     session_model = sess_model
     answer_model = ans_model
+    read_session_model = read_sess_model or sess_model
+    read_answer_model = read_ans_model or ans_model
+
+# ============================================
+# LISTING / EXPORT FILTERS
+# ============================================
+DATE_FILTERS = ('created_after', 'created_before', 'active_after', 'active_before')
+
+def _session_filters():
+    """
+    Filters from the query string: status, ip_address and ISO 8601 bounds
+    created_after/created_before, active_after/active_before (UTC unless an
+    offset is given; *_after is inclusive, *_before exclusive)
+    """
+    filters = {
+        'status': request.args.get('status') or None,
+        'ip_address': request.args.get('ip_address') or None
+    }
+    for name in DATE_FILTERS:
+        filters[name] = parse_utc(request.args.get(name))
+    return filters
+
+def _include_archived(filters) -> bool:
+    """
+    Whether a read unions the monthly archives: on ?include_archived=1, or
+    when a created_* bound reaches back past the archiving age
+    """
+    if request.args.get('include_archived') in ('1', 'true'):
+        return True
+    days = current_app.config['ARCHIVE_AFTER_DAYS']
+    bounds = [filters[name] for name in ('created_after', 'created_before') if filters[name]]
+    return bool(days and bounds) and min(bounds) < datetime.utcnow() - timedelta(days=days)
 
 # ============================================
 # LIST ALL SESSIONS
 # ============================================
 @bp.route('/responses', methods=['GET'])
 def list_responses():
-    """Get paginated list of all sessions"""
+    """Get paginated list of sessions, optionally filtered"""
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     offset = (page - 1) * per_page
     
-    sessions = session_model.list_all(limit=per_page, offset=offset)
-    total = session_model.count()
+    try:
+        filters = _session_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    
+    archived = _include_archived(filters)
+    sessions = read_session_model.list_all(limit=per_page, offset=offset, filters=filters,
+                                           include_archived=archived)
+    total = read_session_model.count(filters, include_archived=archived)
     
     return jsonify({
         'sessions': sessions,
+        'filters': {name: request.args[name] for name in ('status', 'ip_address') + DATE_FILTERS
+                    if request.args.get(name)},
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -39,36 +85,135 @@ def list_responses():
         }
     }), 200
 
+# ============================================
+# FULL-TEXT SEARCH
+# ============================================
+@bp.route('/search', methods=['GET'])
+def search_responses():
+    """Ranked sessions whose answers (or question text) match ?q=, with snippets"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    
+    page = int(request.args.get('page', 1))
+    per_page = min(int(request.args.get('per_page', 20)), 100)
+    
+    try:
+        results = read_answer_model.search(query, limit=per_page, offset=(page - 1) * per_page)
+        return jsonify({
+            'query': query,
+            'results': results,
+            'pagination': {'page': page, 'per_page': per_page}
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============================================
 # GET SINGLE SESSION DETAIL
 # ============================================
 @bp.route('/response/<session_id>', methods=['GET'])
 def get_response(session_id):
-    """Get full detail for one session"""
-    session = session_model.get(session_id)
+    """Get full detail for one session (supports If-None-Match conditional requests)"""
+    if not validate_session_id_format(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    
+    # Detail carries the participant's IP and user agent: private, revalidated
+    # on every use (ETag only) so an admin delete is never served from a cache
+    version = read_session_model.get_version(session_id)
+    if not version:
+        archived = read_session_model.get_archived(session_id)
+        if not archived:
+            return jsonify({'error': 'Session not found'}), 404
+        etag = build_etag('archived', session_id)
+        if request.if_none_match.contains(etag):
+            return apply_cache_headers(Response(status=304), etag, True, 0, private=True)
+        return apply_cache_headers(jsonify(archived), etag, True, 0, private=True), 200
+    
+    etag = build_etag('detail', session_id, version['status'],
+                      version['last_updated'], version['version'], version['answers_count'])
+    completed = version['status'] == 'completed'
+    
+    if request.if_none_match.contains(etag):
+        return apply_cache_headers(Response(status=304), etag, completed, 0, private=True)
+    
+    # Completed sessions are served straight from their materialized snapshot
+    snapshot = read_session_model.get_snapshot(session_id) if completed else None
+    if snapshot:
+        return apply_cache_headers(jsonify(snapshot['detail']), etag, completed, 0, private=True), 200
+    
+    session = read_session_model.get(session_id)
     if not session:
         return jsonify({'error': 'Session not found'}), 404
     
-    answers = answer_model.get_by_session(session_id)
+    answers = read_answer_model.get_by_session(session_id)
     
-    return jsonify({
+    response = jsonify({
         'session': session,
         'answers': answers
-    }), 200
+    })
+    return apply_cache_headers(response, etag, completed, 0, private=True), 200
 
 # ============================================
 # DELETE SESSION
 # ============================================
 @bp.route('/response/<session_id>', methods=['DELETE'])
 def delete_response(session_id):
-    """Delete a session and all its answers"""
-    session = session_model.get(session_id)
-    if not session:
+    """Delete a session and all its answers, archived or not (tombstoned now, purged in the background)"""
+    if not validate_session_id_format(session_id):
         return jsonify({'error': 'Session not found'}), 404
     
-    session_model.delete(session_id)
+    if not session_model.delete(session_id):
+        return jsonify({'error': 'Session not found'}), 404
     return jsonify({'message': 'Session deleted successfully'}), 200
 
+# ============================================
+# BULK DELETE
+# ============================================
+BULK_DELETE_MAX_CHUNK = 1000
+
+@bp.route('/responses/delete', methods=['POST'])
+def bulk_delete_responses():
+    """
+    Delete many sessions (archived ones included) in chunked transactions: body
+    {"ids": [...]} or {"filters": {status, ip_address, created_after, ...}},
+    optional "chunk_size"
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        chunk_size = min(max(int(data.get('chunk_size', 500)), 1), BULK_DELETE_MAX_CHUNK)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+    
+    ids, filters = data.get('ids'), data.get('filters')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(session_id, str) for session_id in ids):
+            return jsonify({'error': 'ids must be a list of session IDs'}), 400
+        invalid = [session_id for session_id in ids if not validate_session_id_format(session_id)]
+        if invalid:
+            return jsonify({'error': 'Invalid session IDs', 'invalid_ids': invalid}), 400
+        chunks = session_model.delete_many(ids, chunk_size=chunk_size)
+    elif isinstance(filters, dict):
+        try:
+            filters = {name: parse_utc(value) if name in DATE_FILTERS else value
+                       for name, value in filters.items() if value not in (None, '')}
+            if not filters:
+                raise ValueError('at least one filter is required')
+            chunks = session_model.delete_matching(filters, chunk_size=chunk_size)
+        except (ValueError, AttributeError) as e:
+            return jsonify({'error': f'Invalid filter: {e}'}), 400
+    else:
+        return jsonify({'error': 'Provide "ids" or "filters"'}), 400
+    
+    progress, deleted = [], 0
+    for number, count in enumerate(chunks, start=1):
+        deleted += count
+        progress.append({'chunk': number, 'deleted': count, 'deleted_so_far': deleted})
+    return jsonify({
+        'message': f'Deleted {deleted} session(s)',
+        'deleted_count': deleted,
+        'chunks': progress
+    }), 200
+
 # ============================================
 # CLEANUP STALE SESSIONS (5 MINUTES)
 # ============================================
@@ -102,7 +247,12 @@ def auto_cleanup():
 def get_all_database():
     """Get ALL sessions with ALL answers - complete database view"""
     try:
-        all_data = session_model.get_all_with_answers()
+        filters = _session_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    
+    try:
+        all_data = read_session_model.get_all_with_answers(filters, include_archived=_include_archived(filters))
         return jsonify({
             'total_sessions': len(all_data),
             'sessions': all_data
@@ -117,13 +267,10 @@ def get_all_database():
 def get_stats():
     """Get database statistics"""
     try:
-        total_sessions = session_model.count()
-        all_sessions = session_model.list_all(limit=10000)
-        
-        completed = sum(1 for s in all_sessions if s['status'] == 'completed')
-        in_progress = sum(1 for s in all_sessions if s['status'] == 'in_progress')
-        
-        total_answers = sum(s['answers_count'] for s in all_sessions)
+        statuses, total_answers = read_session_model.status_counts()
+        total_sessions = sum(statuses.values())
+        completed = statuses.get('completed', 0)
+        in_progress = statuses.get('in_progress', 0)
         
         return jsonify({
             'total_sessions': total_sessions,
@@ -140,10 +287,15 @@ def get_stats():
 # ============================================
 @bp.route('/export', methods=['GET'])
 def export_csv():
-    """Export responses as CSV with questions and answers"""
+    """Export responses as CSV with questions and answers (same filters as the listing)"""
     try:
-        # Get ALL sessions with answers
-        all_data = session_model.get_all_with_answers()
+        filters = _session_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    
+    try:
+        # Get matching sessions with answers
+        all_data = read_session_model.get_all_with_answers(filters, include_archived=_include_archived(filters))
         
         # Create CSV in memory
         output = io.StringIO()
@@ -221,10 +373,35 @@ def export_csv():
             mimetype='text/csv',
             headers={'Content-Disposition': f'attachment;filename={filename}'}
         )
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ============================================
+# ONLINE BACKUPS
+# ============================================
+@bp.route('/backup', methods=['POST'])
+def start_backup():
+    """Start an online backup of every database (?wait=1 runs it in the request)"""
+    backup_service = current_app.config['BACKUP_SERVICE']
+    if request.args.get('wait') in ('1', 'true'):
+        try:
+            backup_service.run()
+        except BackupInProgress as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            return jsonify({'error': str(e), **backup_service.status()}), 500
+        return jsonify(backup_service.status()), 201
+    
+    if not backup_service.start():
+        return jsonify({'error': 'A backup is already running', **backup_service.status()}), 409
+    return jsonify(backup_service.status()), 202
+
+@bp.route('/backup', methods=['GET'])
+def backup_status():
+    """Progress of the running (or last) backup and the backup files on disk"""
+    return jsonify(current_app.config['BACKUP_SERVICE'].status()), 200
+
 # ============================================
 # LEGACY CLEANUP (backwards compatibility)
 # ============================================
@@ -0,0 +1,107 @@
+from flask import Blueprint, request, jsonify
+from ..models import ReadPoolExhausted
+from ..utils.helpers import parse_utc
+
+bp = Blueprint('analytics', __name__, url_prefix='/admin/analytics')
+
+# Global variables to store services (will be set during app initialization)
+analytics_service = None
+scale_analytics = None
+columnar_snapshot = None
+
+def init_service(service, scale_service, snapshot):
+    """Initialize the services for this blueprint"""
+    global analytics_service, scale_analytics, columnar_snapshot
+    analytics_service = service
+    scale_analytics = scale_service
+    columnar_snapshot = snapshot
+
+# ============================================
+# PER-QUESTION ANSWER DISTRIBUTIONS
+# ============================================
+@bp.route('/questions', methods=['GET'])
+def question_distributions():
+    """Option counts and rank histograms, read from the aggregation table"""
+    try:
+        question_id = request.args.get('question_id')
+        return jsonify({
+            'questions': analytics_service.get_question_distributions(question_id)
+        }), 200
+    except ReadPoolExhausted:
+        raise  # 503 + Retry-After from the app error handler
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ============================================
+# FUNNEL / DROP-OFF
+# ============================================
+@bp.route('/funnel', methods=['GET'])
+def funnel():
+    """Per-node reached / answered / abandoned counts along the flow graph"""
+    try:
+        return jsonify(analytics_service.get_funnel()), 200
+    except ReadPoolExhausted:
+        raise  # 503 + Retry-After from the app error handler
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ============================================
+# SCALE (RATING) STATISTICS
+# ============================================
+@bp.route('/scale', methods=['GET'])
+def scale_statistics():
+    """Vectorized statistics, histograms and correlations for scale questions"""
+    try:
+        question_id = request.args.get('question_id')
+        return jsonify({'questions': scale_analytics.get_statistics(question_id)}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ReadPoolExhausted:
+        raise  # 503 + Retry-After from the app error handler
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ============================================
+# COLUMNAR SNAPSHOT
+# ============================================
+@bp.route('/snapshot', methods=['GET'])
+def snapshot_overview():
+    """Manifest plus per-question and per-status counts, read zero-copy from the snapshot"""
+    try:
+        view = columnar_snapshot.current()
+        if view is None:
+            return jsonify({'error': 'No snapshot has been built yet'}), 404
+        return jsonify({
+            'manifest': view.manifest,
+            'answers_per_question': view.answer_counts(),
+            'sessions_per_status': view.status_counts()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/snapshot', methods=['POST'])
+def rebuild_snapshot():
+    """Build a new snapshot generation now (?full=1 ignores the watermark)"""
+    try:
+        full = request.args.get('full') in ('1', 'true')
+        return jsonify({'manifest': columnar_snapshot.build(full=full)}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ============================================
+# TIME-SERIES TRENDS
+# ============================================
+@bp.route('/timeseries', methods=['GET'])
+def timeseries():
+    """Hourly or daily trend buckets, read only from the rollup table"""
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        since = parse_utc(request.args.get('since'))
+        until = parse_utc(request.args.get('until'))
+        return jsonify(analytics_service.get_timeseries(granularity, since, until)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ReadPoolExhausted:
+        raise  # 503 + Retry-After from the app error handler
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify
+import logging
+import math
+from flask import Blueprint, request, jsonify, Response, current_app
+from ..services.idempotency import IdempotencyConflict, IdempotencyInProgress, MAX_KEY_LENGTH
+from ..utils.helpers import build_etag, apply_cache_headers, validate_session_id_format, get_client_ip
 
 bp = Blueprint('session', __name__, url_prefix='/session')
+logger = logging.getLogger(__name__)
 
 # Global variable to store service (will be set during app initialization)
 session_service = None
@@ -10,9 +15,22 @@ def init_service(service):
     global session_service
     session_service = service
 
+def _admission_denied(limiter_name: str):
+    """429 response when the client IP is over the named limiter's budget, else None"""
+    limiter = current_app.config.get(limiter_name)
+    if limiter is None:
+        return None
+    retry_after = limiter.hit(get_client_ip(request, current_app.config['TRUSTED_PROXIES']))
+    if not retry_after:
+        return None
+    response = jsonify({'error': 'Too many requests, please retry later',
+                        'retry_after': math.ceil(retry_after)})
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response, 429
+
 @bp.route('/start', methods=['POST'])
 def start_session():
-    """Start a new session"""
+    """Start a new session (or resume the in-progress one given as resume_session_id)"""
     try:
         # Get client info
         data = request.get_json() or {}
@@ -20,33 +38,84 @@ def start_session():
             'ip_address': data.get('ip_address') or request.headers.get('X-Forwarded-For', request.remote_addr),
             'user_agent': data.get('user_agent') or request.headers.get('User-Agent', 'unknown')
         }
+        resume_session_id = data.get('resume_session_id')
+        if not isinstance(resume_session_id, str) or not validate_session_id_format(resume_session_id):
+            resume_session_id = None
         
-        # Start session with client_info dict
-        result = session_service.start_session(client_info)
+        # Resuming does not create a session, so only new sessions count
+        # against MAX_SESSIONS_PER_IP
+        result = session_service.resume_session(resume_session_id) if resume_session_id else None
+        if not result:
+            denied = _admission_denied('SESSION_START_LIMITER')
+            if denied:
+                return denied
+            result = session_service.start_session(client_info)
         
         return jsonify(result), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<session_id>/answer', methods=['POST'])
 def submit_answer(session_id):
-    """Submit an answer"""
+    """
+    Submit an answer. With an Idempotency-Key header, a retry of the same
+    request within the TTL gets the first response back without re-running it,
+    and one sent while the first is still running gets 409.
+    """
+    if not validate_session_id_format(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    
     try:
         data = request.get_json()
         
         if not data or 'question_id' not in data or 'answer' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
         
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters'}), 400
+            cache = current_app.config['IDEMPOTENCY_CACHE']
+            cache_key = f"{session_id.lower()}:{idempotency_key}"
+            fingerprint = cache.fingerprint([data['question_id'], data['answer']])
+            try:
+                replay = cache.begin(cache_key, fingerprint)
+            except IdempotencyConflict as e:
+                return jsonify({'error': str(e)}), 422
+            except IdempotencyInProgress as e:
+                response = jsonify({'error': str(e)})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            if replay:
+                status_code, body = replay
+                response = jsonify(body)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response, status_code
+        
+        # Replays above are free; only requests that will run spend a token
+        denied = _admission_denied('ANSWER_LIMITER')
+        if denied:
+            if idempotency_key:
+                cache.release(cache_key)
+            return denied
+        
         # Submit answer - new service returns dict, not tuple
-        result = session_service.submit_answer(
-            session_id,
-            data['question_id'],
-            data['answer']
-        )
+        try:
+            result = session_service.submit_answer(
+                session_id,
+                data['question_id'],
+                data['answer']
+            )
+        except Exception:
+            if idempotency_key:
+                cache.release(cache_key)
+            raise
         
+        if idempotency_key:
+            cache.store(cache_key, fingerprint, 200, result)
         return jsonify(result), 200
-        
+    
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -54,11 +123,26 @@ def submit_answer(session_id):
 
 @bp.route('/summary/<session_id>', methods=['GET'])
 def get_summary(session_id):
-    """Get session summary"""
+    """Get session summary (supports If-None-Match conditional requests)"""
+    if not validate_session_id_format(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    
     try:
-        summary = session_service.get_summary(session_id)
-        return jsonify(summary), 200
+        version = session_service.get_version(session_id)
+        if not version:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        etag = build_etag('summary', session_id, version['status'],
+                          version['last_updated'], version['version'], version['answers_count'])
+        completed = version['status'] == 'completed'
+        max_age = current_app.config['COMPLETED_CACHE_MAX_AGE']
         
+        if request.if_none_match.contains(etag):
+            return apply_cache_headers(Response(status=304), etag, completed, max_age)
+        
+        summary = session_service.get_summary(session_id)
+        return apply_cache_headers(jsonify(summary), etag, completed, max_age), 200
+    
     except ValueError as e:
         return jsonify({'error': str(e)}), 404
     except Exception as e:
@@ -68,6 +152,9 @@ def get_summary(session_id):
 @bp.route('/<session_id>', methods=['DELETE', 'POST'])
 def delete_session(session_id):
     """Delete an in-progress session"""
+    if not validate_session_id_format(session_id):
+        return jsonify({'message': 'Session not found or already deleted'}), 200
+    
     try:
         # Handle sendBeacon POST with _method=DELETE
         if request.method == 'POST':
@@ -76,20 +163,19 @@ def delete_session(session_id):
                 return jsonify({'error': 'Invalid method'}), 400
         
         # Get services from app config
-        from flask import current_app
         session_model = current_app.config['SESSION_MODEL']
         
+        # Only delete if in_progress (preserve completed sessions);
+        # the participant left, so this counts as a funnel abandonment.
+        # abandon() only tombstones the row; the purge job removes it later.
+        if session_model.abandon(session_id):
+            return jsonify({'message': 'Session deleted successfully'}), 200
+        
         session = session_model.get(session_id)
         if not session:
             return jsonify({'message': 'Session not found or already deleted'}), 200
-        
-        # Only delete if in_progress (preserve completed sessions)
-        if session['status'] == 'in_progress':
-            session_model.delete(session_id)
-            return jsonify({'message': 'Session deleted successfully'}), 200
-        else:
-            return jsonify({'message': 'Session already completed'}), 200
-            
+        return jsonify({'message': 'Session already completed'}), 200
+    
     except Exception as e:
-        print(f"[ERROR] Delete session failed: {str(e)}")
+        logger.exception("Delete session failed")
         return jsonify({'error': str(e)}), 500
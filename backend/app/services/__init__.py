@@ -4,5 +4,14 @@ Contains business logic and service layer classes
 """
 from .session_service import SessionService
 from .validation_service import ValidationService
+from .analytics_service import AnalyticsService
+from .scale_analytics import ScaleAnalytics
+from .columnar_snapshot import ColumnarSnapshot
+from .maintenance import DatabaseMaintenance
+from .backup import BackupService, BackupInProgress
+from .idempotency import IdempotencyCache, IdempotencyConflict, IdempotencyInProgress
+from .rate_limiter import TokenBucketLimiter, SlidingWindowLimiter
 
-__all__ = ['SessionService', 'ValidationService']
+__all__ = ['SessionService', 'ValidationService', 'AnalyticsService', 'ScaleAnalytics',
+           'ColumnarSnapshot', 'DatabaseMaintenance', 'BackupService', 'BackupInProgress',
+           'IdempotencyCache', 'IdempotencyConflict', 'IdempotencyInProgress', 'TokenBucketLimiter', 'SlidingWindowLimiter']
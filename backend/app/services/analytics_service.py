@@ -0,0 +1,242 @@
+"""
+Analytics service for admin dashboards
+Formats the incrementally maintained analytics tables against the flow graph
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+SQLITE_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+ROLLUP_JOB = 'timeseries_rollup'
+# Re-scan a little before the watermark so rows committed late are not missed;
+# bucket recomputation is idempotent, so the overlap only costs a few reads
+ROLLUP_OVERLAP = timedelta(minutes=1)
+GRANULARITY_STEPS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linearly interpolated percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class AnalyticsService:
+    def __init__(self, flow_config: dict, analytics_model, read_analytics_model=None):
+        self.flow_config = flow_config
+        self.analytics_model = analytics_model
+        # Admin analytics reads go through the read-only connection pool when one is configured
+        self.read_analytics_model = read_analytics_model or analytics_model
+        self.nodes_dict = {node['id']: node for node in flow_config['nodes']}
+        self.funnel_nodes, self.branches = self._analyze_flow()
+    
+    def _analyze_flow(self):
+        """
+        Walk every start-to-end path of the flow graph once.
+        Returns the funnel nodes (questions plus 'end') in flow order, and for
+        nodes that only some paths visit, the conditional branch leading to them.
+        """
+        paths = []
+        
+        def walk(node_id, path, decision):
+            node = self.nodes_dict.get(node_id)
+            if node is None or node['type'] == 'end':
+                paths.append(path + [(node_id, decision)])
+                return
+            if any(visited == node_id for visited, _ in path):
+                return  # Guard against cycles in a malformed flow
+            if node['type'] == 'conditional':
+                walk(node['if_true'], path, {'conditional': node_id, 'when': True})
+                walk(node['if_false'], path, {'conditional': node_id, 'when': False})
+            else:
+                walk(node.get('next') or 'end', path + [(node_id, decision)], decision)
+        
+        walk(self.flow_config['nodes'][0]['id'], [], None)
+        
+        node_sets = [{node_id for node_id, _ in path} for path in paths]
+        mandatory = set.intersection(*node_sets) if node_sets else set()
+        branches = {}
+        for path in paths:
+            for node_id, decision in path:
+                if node_id not in mandatory and decision:
+                    branches.setdefault(node_id, decision)
+        
+        order = [node['id'] for node in self.flow_config['nodes']
+                 if node['type'] in ('question', 'end')]
+        return order, branches
+    
+    def get_question_distributions(self, question_id: Optional[str] = None) -> List[dict]:
+        """
+        Per-question option distributions (choice questions) and rank
+        histograms (ranking questions), in flow order
+        """
+        rows = self.read_analytics_model.get_answer_distribution(question_id)
+        
+        by_question: Dict[str, List[dict]] = {}
+        for row in rows:
+            by_question.setdefault(row['question_id'], []).append(row)
+        
+        question_ids = [question_id] if question_id else [
+            node['id'] for node in self.flow_config['nodes']
+            if node['type'] == 'question' and node['id'] in by_question
+        ]
+        return [self._format_distribution(qid, by_question.get(qid, [])) for qid in question_ids]
+    
+    def _format_distribution(self, question_id: str, rows: List[dict]) -> dict:
+        """Format one question's distribution rows"""
+        node = self.nodes_dict.get(question_id, {})
+        input_type = node.get('input_type', 'text')
+        
+        responses = 0
+        counts: Dict[str, Dict[int, int]] = {option: {} for option in node.get('options', [])}
+        for row in rows:
+            if row['option'] == '':
+                responses = row['count']
+            else:
+                counts.setdefault(row['option'], {})[row['rank']] = row['count']
+        
+        options = []
+        for option, ranks in counts.items():
+            if input_type == 'ranking':
+                ranked = sum(ranks.values())
+                options.append({
+                    'option': option,
+                    'ranks': {str(rank): count for rank, count in sorted(ranks.items())},
+                    'average_rank': round(sum(r * c for r, c in ranks.items()) / ranked, 2) if ranked else None
+                })
+            else:
+                count = ranks.get(0, 0)
+                options.append({
+                    'option': option,
+                    'count': count,
+                    'percentage': round(count / responses * 100, 2) if responses else 0
+                })
+        
+        return {
+            'question_id': question_id,
+            'question_text': node.get('text', ''),
+            'input_type': input_type,
+            'responses': responses,
+            'options': options
+        }
+    
+    def get_funnel(self) -> dict:
+        """
+        Reached / answered / abandoned counts for every funnel node in flow
+        order, read from funnel_stats (no scan of raw answers)
+        """
+        stats = self.read_analytics_model.get_funnel()
+        first_id = self.funnel_nodes[0] if self.funnel_nodes else None
+        started = stats.get(first_id, {}).get('reached', 0)
+        
+        nodes = []
+        for node_id in self.funnel_nodes:
+            node = self.nodes_dict.get(node_id, {})
+            counts = stats.get(node_id, {})
+            reached = counts.get('reached', 0)
+            answered = counts.get('answered', 0)
+            abandoned = counts.get('abandoned', 0)
+            nodes.append({
+                'node_id': node_id,
+                'text': node.get('text', ''),
+                'branch': self.branches.get(node_id),
+                'reached': reached,
+                'answered': answered,
+                'abandoned': abandoned,
+                'reach_rate': round(reached / started * 100, 2) if started else 0,
+                'drop_off_rate': round(abandoned / reached * 100, 2) if reached else 0
+            })
+        
+        completed = stats.get('end', {}).get('reached', 0)
+        return {
+            'started': started,
+            'completed': completed,
+            'abandoned': sum(counts.get('abandoned', 0) for counts in stats.values()),
+            'completion_rate': round(completed / started * 100, 2) if started else 0,
+            'nodes': nodes
+        }
+    
+    def rollup_timeseries(self) -> int:
+        """
+        Scheduled job: recompute only the hour/day buckets touched since the
+        last run's watermark and store them in timeseries_rollups
+        
+        Returns:
+            Number of buckets written
+        """
+        now = self.analytics_model.now()
+        watermark = self.analytics_model.get_watermark(ROLLUP_JOB)
+        since = '1970-01-01 00:00:00'
+        if watermark:
+            since = (datetime.strptime(watermark, SQLITE_TIMESTAMP_FORMAT) - ROLLUP_OVERLAP) \
+                .strftime(SQLITE_TIMESTAMP_FORMAT)
+        
+        hours = self.analytics_model.touched_hour_buckets(since)
+        days = sorted({hour[:10] + ' 00:00:00' for hour in hours})
+        rollups = [self._rollup_bucket('hour', bucket) for bucket in hours]
+        rollups += [self._rollup_bucket('day', bucket) for bucket in days]
+        
+        self.analytics_model.save_rollups(rollups, ROLLUP_JOB, now)
+        return len(rollups)
+    
+    def _rollup_bucket(self, granularity: str, bucket_start: str) -> dict:
+        """Aggregate one bucket from its raw rows"""
+        start = datetime.strptime(bucket_start, SQLITE_TIMESTAMP_FORMAT)
+        end = (start + GRANULARITY_STEPS[granularity]).strftime(SQLITE_TIMESTAMP_FORMAT)
+        raw = self.analytics_model.get_bucket_raw(bucket_start, end)
+        
+        dwell_samples: Dict[str, List[float]] = {}
+        for question_id, seconds in raw['dwell']:
+            if seconds is not None:
+                dwell_samples.setdefault(question_id, []).append(seconds)
+        dwell = {
+            question_id: {
+                'count': len(samples),
+                'median_seconds': round(percentile(samples, 50), 2),
+                'p95_seconds': round(percentile(samples, 95), 2)
+            }
+            for question_id, samples in dwell_samples.items()
+        }
+        
+        ttc_median = percentile(raw['ttc'], 50)
+        ttc_p95 = percentile(raw['ttc'], 95)
+        return {
+            'granularity': granularity,
+            'bucket_start': bucket_start,
+            'sessions_started': raw['sessions_started'],
+            'sessions_completed': raw['sessions_completed'],
+            'sessions_cleaned_up': raw['sessions_cleaned_up'],
+            'ttc_median_seconds': round(ttc_median, 2) if ttc_median is not None else None,
+            'ttc_p95_seconds': round(ttc_p95, 2) if ttc_p95 is not None else None,
+            'dwell_json': json.dumps(dwell, separators=(',', ':'))
+        }
+    
+    def get_timeseries(self, granularity: str = 'hour', since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> dict:
+        """
+        Read rollup buckets (never the raw tables). Defaults to the last
+        48 hours for hourly buckets and the last 30 days for daily buckets.
+        """
+        if granularity not in GRANULARITY_STEPS:
+            raise ValueError("granularity must be 'hour' or 'day'")
+        until = until or datetime.utcnow()
+        since = since or until - (timedelta(hours=48) if granularity == 'hour' else timedelta(days=30))
+        
+        buckets = []
+        for row in self.read_analytics_model.get_timeseries(
+                granularity, since.strftime(SQLITE_TIMESTAMP_FORMAT), until.strftime(SQLITE_TIMESTAMP_FORMAT)):
+            row.pop('granularity')
+            row['bucket_start'] = row['bucket_start'].replace(' ', 'T') + 'Z'
+            row['dwell'] = json.loads(row.pop('dwell_json') or '{}')
+            buckets.append(row)
+        
+        return {
+            'granularity': granularity,
+            'timezone': 'UTC',
+            'buckets': buckets
+        }
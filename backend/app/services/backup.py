@@ -0,0 +1,163 @@
+"""
+Online database backups
+Copies every durable store with the SQLite backup API a few pages at a time
+from a single read snapshot, sleeping between steps so writers are never
+locked out for long, then gzips the copy into the backup directory and
+rotates old files
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List
+
+BACKUP_SUFFIX = '.db.gz'
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S-%f'
+
+
+class BackupInProgress(RuntimeError):
+    """Raised when a backup is requested while another one is running"""
+
+
+class BackupService:
+    def __init__(self, db, backup_dir, keep: int = 7, pages_per_step: int = 256,
+                 step_sleep_ms: float = 5.0):
+        self.db = db
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep_ms = step_sleep_ms
+        self._lock = threading.Lock()
+        self.progress: Dict[str, Any] = {'state': 'idle'}
+    
+    def stores(self) -> List[Any]:
+        """Durable stores and archives (an in-memory hot store has nothing to back up)"""
+        return [store for store in self.db.partitions() if not store.uri] + self.db.archives()
+    
+    def start(self) -> bool:
+        """Run a backup on a background thread; False if one is already running"""
+        # Taken here and handed to the thread, so two callers cannot both start one
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            threading.Thread(target=self._run_quietly, name='backup', daemon=True).start()
+        except Exception:
+            self._lock.release()
+            raise
+        return True
+    
+    def run(self) -> Dict[str, Any]:
+        """
+        Back up every store, then drop all but the newest `keep` files of each
+        
+        Returns:
+            The final progress record, listing the files written
+        """
+        if not self._lock.acquire(blocking=False):
+            raise BackupInProgress('A backup is already running')
+        return self._run_locked()
+    
+    def _run_locked(self) -> Dict[str, Any]:
+        """Body of run(); the caller holds the lock, which is released here"""
+        try:
+            stores = self.stores()
+            self.progress = {
+                'state': 'running',
+                'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'databases_total': len(stores),
+                'databases_done': 0,
+                'pages_total': 0,
+                'pages_remaining': 0,
+                'files': []
+            }
+            started = time.perf_counter()
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
+            for store in stores:
+                self.progress['database'] = str(store.db_path)
+                path = self._backup_store(store)
+                self.progress['files'].append(path.name)
+                self.progress['databases_done'] += 1
+                self._rotate(Path(store.db_path).stem)
+            self.progress.update({
+                'state': 'done',
+                'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            })
+            self.progress.pop('database', None)
+            return self.progress
+        except Exception as e:
+            self.progress.update({'state': 'failed', 'error': str(e)})
+            raise
+        finally:
+            self._lock.release()
+    
+    def status(self) -> Dict[str, Any]:
+        """Progress of the current (or last) backup plus the files on disk"""
+        return {'progress': dict(self.progress), 'backups': self.list_backups()}
+    
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """Backup files, newest first"""
+        if not self.backup_dir.is_dir():
+            return []
+        files = sorted(self.backup_dir.glob(f'*{BACKUP_SUFFIX}'), key=lambda path: path.name, reverse=True)
+        return [{'name': path.name, 'bytes': path.stat().st_size} for path in files]
+    
+    def _run_quietly(self):
+        try:
+            self._run_locked()
+        except Exception as e:
+            print(f"[BACKUP ERROR]: {e}")
+    
+    def _backup_store(self, store) -> Path:
+        """Copy one store page-step by page-step into a temp file, then gzip it"""
+        stem = Path(store.db_path).stem
+        name = f"{stem}-{datetime.now().strftime(TIMESTAMP_FORMAT)}{BACKUP_SUFFIX}"
+        target = self.backup_dir / name
+        copy_path = self.backup_dir / f".{name}.copy"
+        partial_path = self.backup_dir / f".{name}.partial"
+        
+        def on_step(status, remaining, total):
+            self.progress['pages_total'] = total
+            self.progress['pages_remaining'] = remaining
+            # Give writers the database between steps
+            if remaining and self.step_sleep_ms:
+                time.sleep(self.step_sleep_ms / 1000)
+        
+        try:
+            copy = sqlite3.connect(copy_path)
+            try:
+                with store.get_connection() as conn:
+                    # SQLite restarts a backup whenever another connection
+                    # commits to the source; copying from one read snapshot
+                    # (WAL lets writers carry on) keeps steady writes from
+                    # restarting it forever
+                    conn.isolation_level = None
+                    conn.execute("BEGIN")
+                    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                    try:
+                        conn.backup(copy, pages=self.pages_per_step, progress=on_step)
+                    finally:
+                        conn.execute("COMMIT")
+            finally:
+                copy.close()
+            with open(copy_path, 'rb') as source, gzip.open(partial_path, 'wb') as compressed:
+                shutil.copyfileobj(source, compressed)
+            os.replace(partial_path, target)
+        finally:
+            for leftover in (copy_path, partial_path):
+                if leftover.exists():
+                    leftover.unlink()
+        return target
+    
+    def _rotate(self, stem: str):
+        """Keep the newest `keep` backups of one database"""
+        pattern = re.compile(rf'^{re.escape(stem)}-\d{{8}}-\d{{6}}-\d{{6}}{re.escape(BACKUP_SUFFIX)}$')
+        backups = sorted(path for path in self.backup_dir.iterdir() if pattern.match(path.name))
+        for path in backups[:-self.keep] if self.keep else []:
+            path.unlink()
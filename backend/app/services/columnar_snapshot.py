@@ -0,0 +1,335 @@
+"""
+Columnar analytics snapshots
+Writes sessions and answers to memory-mappable NumPy column files so heavy
+analytics read mapped pages instead of competing with the answer write path
+for the live database
+"""
+
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+SQLITE_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Rows committed just before a build may carry timestamps older than the
+# watermark; re-reading a short overlap is harmless because merges are keyed
+SNAPSHOT_OVERLAP = timedelta(minutes=1)
+NULL_TIMESTAMP = -1
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+
+
+# ==========================================
+# STRING COLUMNS: int64 offsets + UTF-8 buffer
+# ==========================================
+def encode_strings(values: List[str]):
+    """Encode strings as (offsets, data); value i is data[offsets[i]:offsets[i+1]]"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def decode_strings(offsets: np.ndarray, data: np.ndarray) -> List[str]:
+    """Decode a whole string column"""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def filter_strings(offsets: np.ndarray, data: np.ndarray, mask: np.ndarray):
+    """Keep the strings selected by a boolean mask, without decoding them"""
+    lengths = np.diff(offsets)
+    kept = np.zeros(int(mask.sum()) + 1, dtype=np.int64)
+    np.cumsum(lengths[mask], out=kept[1:])
+    return kept, data[np.repeat(mask, lengths)]
+
+
+def concat_strings(first, second):
+    """Append one (offsets, data) string column to another"""
+    offsets = np.concatenate([first[0], second[0][1:] + first[0][-1]])
+    return offsets, np.concatenate([first[1], second[1]])
+
+
+class SnapshotView:
+    """Read-only, memory-mapped view of one snapshot generation"""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / MANIFEST_FILE, 'r') as f:
+            self.manifest = json.load(f)
+        self._columns: Dict[str, np.ndarray] = {}
+    
+    def column(self, name: str) -> np.ndarray:
+        """Zero-copy (mmap) access to a column file"""
+        if name not in self._columns:
+            self._columns[name] = np.load(self.path / f'{name}.npy', mmap_mode='r')
+        return self._columns[name]
+    
+    def strings(self, name: str) -> List[str]:
+        """Decode a string column"""
+        return decode_strings(self.column(f'{name}.offsets'), self.column(f'{name}.data'))
+    
+    def scale(self, question_id: str) -> np.ndarray:
+        """Ratings of a scale question, shape (responses, fields)"""
+        return self.column(f'scale.{question_id}.values')
+    
+    def answer_counts(self) -> Dict[str, int]:
+        """Answers per question, counted over the dictionary codes"""
+        question_ids = self.manifest['question_ids']
+        counts = np.bincount(self.column('answers.question'), minlength=len(question_ids))
+        return {qid: int(count) for qid, count in zip(question_ids, counts)}
+    
+    def status_counts(self) -> Dict[str, int]:
+        """Sessions per status, counted over the dictionary codes"""
+        statuses = self.manifest['statuses']
+        counts = np.bincount(self.column('sessions.status'), minlength=len(statuses))
+        return {status: int(count) for status, count in zip(statuses, counts)}
+
+
+class ColumnarSnapshot:
+    def __init__(self, snapshot_dir, flow_config: dict, analytics_model):
+        self.snapshot_dir = Path(snapshot_dir)
+        self.analytics_model = analytics_model
+        self.scale_fields = {
+            node['id']: [field['name'] for field in node.get('fields', [])]
+            for node in flow_config['nodes'] if node.get('input_type') == 'scale'
+        }
+        self._lock = threading.Lock()
+        self._view: Optional[SnapshotView] = None
+    
+    def current(self) -> Optional[SnapshotView]:
+        """The latest published generation, or None before the first build"""
+        try:
+            name = (self.snapshot_dir / CURRENT_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+        if self._view is None or self._view.path.name != name:
+            self._view = SnapshotView(self.snapshot_dir / name)
+        return self._view
+    
+    def build(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Write a new generation. Incremental builds start from the previous
+        generation and read only sessions/answers changed since its watermark;
+        full builds (or the first one) read everything.
+        
+        Returns:
+            The new generation's manifest
+        """
+        with self._lock:
+            previous = None if full else self.current()
+            watermark = self.analytics_model.now()
+            since = None
+            if previous is not None:
+                since = (datetime.strptime(previous.manifest['watermark'], SQLITE_TIMESTAMP_FORMAT)
+                         - SNAPSHOT_OVERLAP).strftime(SQLITE_TIMESTAMP_FORMAT)
+            
+            columns, manifest = self._merge(previous, since)
+            manifest.update({
+                'generation': (previous.manifest['generation'] + 1) if previous else 1,
+                'watermark': watermark,
+                'incremental': previous is not None
+            })
+            self._publish(columns, manifest)
+            return manifest
+    
+    def _merge(self, previous: Optional[SnapshotView], since: Optional[str]):
+        """Merge the previous generation's columns with rows changed since the watermark"""
+        # ---- dictionaries (append-only, so old codes stay valid) ----
+        statuses = list(previous.manifest['statuses']) if previous else []
+        question_ids = list(previous.manifest['question_ids']) if previous else []
+        status_codes = {status: code for code, status in enumerate(statuses)}
+        question_codes = {qid: code for code, qid in enumerate(question_ids)}
+        
+        def code_of(codes, values, value):
+            if value not in codes:
+                codes[value] = len(values)
+                values.append(value)
+            return codes[value]
+        
+        # ---- sessions ----
+        if previous:
+            session_ids = previous.strings('sessions.id')
+            status = np.array(previous.column('sessions.status'))
+            created_at = np.array(previous.column('sessions.created_at'))
+            completed_at = np.array(previous.column('sessions.completed_at'))
+        else:
+            session_ids = []
+            status = np.zeros(0, dtype=np.int8)
+            created_at = np.zeros(0, dtype=np.int64)
+            completed_at = np.zeros(0, dtype=np.int64)
+        index = {session_id: i for i, session_id in enumerate(session_ids)}
+        
+        changed = set()
+        new_ids, new_status, new_created, new_completed = [], [], [], []
+        for rows in self.analytics_model.iter_sessions_since(since):
+            for session_id, session_status, created, completed in rows:
+                code = code_of(status_codes, statuses, session_status)
+                completed = NULL_TIMESTAMP if completed is None else completed
+                changed.add(session_id)
+                if session_id in index:
+                    i = index[session_id]
+                    status[i], completed_at[i] = code, completed
+                else:
+                    index[session_id] = len(session_ids) + len(new_ids)
+                    new_ids.append(session_id)
+                    new_status.append(code)
+                    new_created.append(created or NULL_TIMESTAMP)
+                    new_completed.append(completed)
+        
+        # Deletes tombstone first, so sessions deleted since the watermark are
+        # dropped here; the scheduled full build catches any purged before this
+        # build saw their tombstone. Cleanup removes in-progress sessions
+        # outright, so check the unchanged ones still exist.
+        keep_old = np.ones(len(session_ids), dtype=bool)
+        if previous:
+            for session_id in self.analytics_model.deleted_session_ids_since(since):
+                i = index.get(session_id)
+                if i is not None and i < len(session_ids):
+                    keep_old[i] = False
+        if previous and 'in_progress' in status_codes:
+            in_progress = np.flatnonzero(status == status_codes['in_progress'])
+            candidates = [session_ids[i] for i in in_progress if session_ids[i] not in changed]
+            existing = self.analytics_model.existing_session_ids(candidates)
+            for i in in_progress:
+                if session_ids[i] not in changed and session_ids[i] not in existing:
+                    keep_old[i] = False
+        
+        keep = np.concatenate([keep_old, np.ones(len(new_ids), dtype=bool)])
+        remap = np.cumsum(keep) - 1
+        all_ids = session_ids + new_ids
+        index = {session_id: int(remap[i]) for session_id, i in index.items() if keep[i]}
+        
+        sessions = {
+            'status': np.concatenate([status, np.array(new_status, dtype=np.int8)])[keep],
+            'created_at': np.concatenate([created_at, np.array(new_created, dtype=np.int64)])[keep],
+            'completed_at': np.concatenate([completed_at, np.array(new_completed, dtype=np.int64)])[keep],
+        }
+        sessions['id.offsets'], sessions['id.data'] = encode_strings(
+            [session_id for i, session_id in enumerate(all_ids) if keep[i]])
+        
+        # ---- answers changed since the watermark ----
+        delta_session, delta_question, delta_text, delta_created = [], [], [], []
+        delta_scale: Dict[str, Dict[int, List[float]]] = {qid: {} for qid in self.scale_fields}
+        for rows in self.analytics_model.iter_answers_since(since):
+            for session_id, question_id, answer_text, created in rows:
+                if session_id not in index:
+                    continue  # Orphaned answer of a deleted session
+                session_index = index[session_id]
+                delta_session.append(session_index)
+                delta_question.append(code_of(question_codes, question_ids, question_id))
+                delta_text.append(answer_text)
+                delta_created.append(created or NULL_TIMESTAMP)
+                if question_id in self.scale_fields:
+                    delta_scale[question_id][session_index] = _scale_row(
+                        answer_text, self.scale_fields[question_id])
+        
+        delta_session = np.array(delta_session, dtype=np.int32)
+        delta_question = np.array(delta_question, dtype=np.int16)
+        delta_keys = _answer_keys(delta_session, delta_question)
+        
+        if previous:
+            old_session = previous.column('answers.session')
+            old_question = previous.column('answers.question')
+            old_keep = keep_old[old_session]
+            remapped = remap[old_session].astype(np.int32)
+            mask = old_keep & ~np.isin(_answer_keys(remapped, old_question), delta_keys)
+            old_text = filter_strings(previous.column('answers.text.offsets'),
+                                      previous.column('answers.text.data'), mask)
+            answer_session = np.concatenate([remapped[mask], delta_session])
+            answer_question = np.concatenate([old_question[mask], delta_question])
+            answer_created = np.concatenate([previous.column('answers.created_at')[mask],
+                                             np.array(delta_created, dtype=np.int64)])
+        else:
+            old_text = (np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.uint8))
+            answer_session, answer_question = delta_session, delta_question
+            answer_created = np.array(delta_created, dtype=np.int64)
+        
+        answers = {
+            'session': answer_session,
+            'question': answer_question,
+            'created_at': answer_created,
+        }
+        answers['text.offsets'], answers['text.data'] = concat_strings(old_text, encode_strings(delta_text))
+        
+        # ---- scale ratings, one 2-D float64 block per scale question ----
+        scale = {}
+        for question_id, fields in self.scale_fields.items():
+            rows = delta_scale[question_id]
+            new_session = np.array(list(rows), dtype=np.int32)
+            new_values = np.array(list(rows.values()), dtype=np.float64).reshape(-1, len(fields))
+            if previous and question_id in previous.manifest['scale']:
+                old_session = previous.column(f'scale.{question_id}.session')
+                remapped = remap[old_session].astype(np.int32)
+                mask = keep_old[old_session] & ~np.isin(remapped, new_session)
+                new_session = np.concatenate([remapped[mask], new_session])
+                new_values = np.concatenate([previous.scale(question_id)[mask], new_values])
+            scale[f'{question_id}.session'] = new_session
+            scale[f'{question_id}.values'] = new_values
+        
+        columns = {}
+        columns.update({f'sessions.{name}': array for name, array in sessions.items()})
+        columns.update({f'answers.{name}': array for name, array in answers.items()})
+        columns.update({f'scale.{name}': array for name, array in scale.items()})
+        manifest = {
+            'built_at': datetime.utcnow().strftime(SQLITE_TIMESTAMP_FORMAT),
+            'statuses': statuses,
+            'question_ids': question_ids,
+            'scale': self.scale_fields,
+            'counts': {
+                'sessions': int(keep.sum()),
+                'answers': int(len(answer_session))
+            }
+        }
+        return columns, manifest
+    
+    def _publish(self, columns: Dict[str, np.ndarray], manifest: Dict[str, Any]):
+        """Write a generation directory, then atomically repoint CURRENT at it"""
+        name = f"gen-{manifest['generation']:06d}"
+        target = self.snapshot_dir / name
+        staging = self.snapshot_dir / f'{name}.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        
+        for column, array in columns.items():
+            np.save(staging / f'{column}.npy', np.ascontiguousarray(array))
+        with open(staging / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f)
+        
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        pointer = self.snapshot_dir / f'{CURRENT_FILE}.tmp'
+        pointer.write_text(name)
+        os.replace(pointer, self.snapshot_dir / CURRENT_FILE)
+        
+        # Readers keep old mappings valid after unlink, so old generations can go
+        for path in self.snapshot_dir.glob('gen-*'):
+            if path.name != name:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def _answer_keys(sessions: np.ndarray, questions: np.ndarray) -> np.ndarray:
+    """One int64 key per (session, question) pair"""
+    return (sessions.astype(np.int64) << 16) | questions.astype(np.int64)
+
+
+def _scale_row(answer_text: str, fields: List[str]) -> List[float]:
+    """Parse one scale answer into a row of floats (NaN when missing)"""
+    try:
+        ratings = json.loads(answer_text)
+    except (json.JSONDecodeError, TypeError):
+        ratings = {}
+    if not isinstance(ratings, dict):
+        ratings = {}
+    row = []
+    for field in fields:
+        value = ratings.get(field)
+        row.append(float(value) if isinstance(value, (int, float)) else np.nan)
+    return row
@@ -0,0 +1,163 @@
+"""
+Idempotency-Key response cache for answer submissions
+A bounded in-memory LRU in front of the idempotency_keys table: a retry
+within the TTL is answered from either without touching the write path.
+A key is reserved with a pending row (status_code 0) before the request
+runs, so a retry racing the original is refused instead of re-running it.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+MAX_KEY_LENGTH = 255
+# status_code of a reserved key whose request is still running
+PENDING = 0
+# A reservation older than this is taken to belong to a request that died
+PENDING_TIMEOUT_SECONDS = 60
+
+
+class IdempotencyConflict(ValueError):
+    """Raised when a key is reused with a different request body"""
+
+
+class IdempotencyInProgress(RuntimeError):
+    """Raised when a key is reused while its first request is still running"""
+
+
+class IdempotencyCache:
+    def __init__(self, db, max_entries: int = 10000, ttl_seconds: int = 3600):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (expires_at, fingerprint, status_code, response JSON)
+        self._entries: 'OrderedDict[str, Tuple[float, str, int, str]]' = OrderedDict()
+        self.counters = {'stored': 0, 'replayed_memory': 0, 'replayed_db': 0, 'conflicts': 0, 'in_progress': 0}
+    
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        """Stable hash of a request body"""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    def lookup(self, key: str, fingerprint: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        The stored (status code, response) of a key seen within the TTL
+        
+        Raises:
+            IdempotencyConflict: the key was first used with another body
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                source = 'replayed_memory'
+        if not entry:
+            with self.db.get_connection() as conn:
+                row = conn.execute(
+                    """SELECT fingerprint, status_code, response,
+                              (julianday('now') - julianday(created_at)) * 86400 AS age
+                       FROM idempotency_keys
+                       WHERE key = ? AND status_code != ? AND created_at >= datetime('now', '-' || ? || ' seconds')""",
+                    (key, PENDING, self.ttl_seconds)
+                ).fetchone()
+            if not row:
+                return None
+            entry = (now + self.ttl_seconds - row['age'], row['fingerprint'], row['status_code'], row['response'])
+            self._remember(key, entry)
+            source = 'replayed_db'
+        
+        _, stored_fingerprint, status_code, response = entry
+        with self._lock:
+            if stored_fingerprint != fingerprint:
+                self.counters['conflicts'] += 1
+                raise IdempotencyConflict('Idempotency-Key was already used with a different request')
+            self.counters[source] += 1
+        return status_code, json.loads(response)
+    
+    def begin(self, key: str, fingerprint: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        The stored response of a key (see lookup), or None once the key is
+        reserved for this request; follow with store() or release()
+        
+        Raises:
+            IdempotencyConflict: the key was first used with another body
+            IdempotencyInProgress: another request holds the key right now
+        """
+        replay = self.lookup(key, fingerprint)
+        if replay:
+            return replay
+        with self.db.get_connection() as conn:
+            # Free the slot of an expired response or an abandoned reservation
+            conn.execute(
+                """DELETE FROM idempotency_keys
+                   WHERE key = ? AND (created_at < datetime('now', '-' || ? || ' seconds')
+                       OR (status_code = ? AND created_at < datetime('now', '-' || ? || ' seconds')))""",
+                (key, self.ttl_seconds, PENDING, PENDING_TIMEOUT_SECONDS)
+            )
+            reserved = conn.execute(
+                """INSERT OR IGNORE INTO idempotency_keys (key, fingerprint, status_code, response)
+                   VALUES (?, ?, ?, '')""",
+                (key, fingerprint, PENDING)
+            ).rowcount
+            if not reserved:
+                row = conn.execute("SELECT fingerprint, status_code FROM idempotency_keys WHERE key = ?",
+                                   (key,)).fetchone()
+        if reserved:
+            return None
+        if row['status_code'] != PENDING:
+            # Stored between the lookup and the insert
+            return self.lookup(key, fingerprint)
+        with self._lock:
+            if row['fingerprint'] != fingerprint:
+                self.counters['conflicts'] += 1
+                raise IdempotencyConflict('Idempotency-Key was already used with a different request')
+            self.counters['in_progress'] += 1
+        raise IdempotencyInProgress('A request with this Idempotency-Key is still being processed')
+    
+    def release(self, key: str):
+        """Drop a reservation whose request failed, so a retry runs it again"""
+        with self.db.get_connection() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND status_code = ?", (key, PENDING))
+    
+    def store(self, key: str, fingerprint: str, status_code: int, response: Dict[str, Any]):
+        """Remember a response in memory and in the database"""
+        body = json.dumps(response)
+        self._remember(key, (time.monotonic() + self.ttl_seconds, fingerprint, status_code, body))
+        with self.db.get_connection() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, status_code, response)
+                   VALUES (?, ?, ?, ?)""",
+                (key, fingerprint, status_code, body)
+            )
+        with self._lock:
+            self.counters['stored'] += 1
+    
+    def purge_expired(self) -> int:
+        """Delete database entries older than the TTL"""
+        with self.db.get_connection() as conn:
+            return conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < datetime('now', '-' || ? || ' seconds')",
+                (self.ttl_seconds,)
+            ).rowcount
+    
+    def stats(self) -> Dict[str, Any]:
+        """Replay counters (how much retry load the cache absorbed) and memory usage"""
+        with self._lock:
+            replayed = self.counters['replayed_memory'] + self.counters['replayed_db']
+            return {**self.counters, 'replayed': replayed, 'entries': len(self._entries),
+                    'max_entries': self.max_entries, 'ttl_seconds': self.ttl_seconds}
+    
+    def _remember(self, key: str, entry: Tuple[float, str, int, str]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,159 @@
+"""
+Database maintenance jobs: WAL checkpoints and incremental vacuum
+Run on the app's scheduler for every durable store (shards and a file-backed
+hot store); their last outcomes are reported by /health
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+
+CHECKPOINT_JOB = 'wal_checkpoint'
+VACUUM_JOB = 'incremental_vacuum'
+# PRAGMA auto_vacuum value for INCREMENTAL mode
+INCREMENTAL = 2
+
+
+class DatabaseMaintenance:
+    def __init__(self, db, wal_threshold_bytes: int = 4 * 1024 * 1024,
+                 vacuum_pages: int = 256, vacuum_max_batches: int = 40,
+                 quiet_minutes: int = 2):
+        self.db = db
+        self.wal_threshold_bytes = wal_threshold_bytes
+        self.vacuum_pages = vacuum_pages
+        self.vacuum_max_batches = vacuum_max_batches
+        self.quiet_minutes = quiet_minutes
+        # job name -> last run (finished_at, duration_ms, result)
+        self.last_runs: Dict[str, Dict[str, Any]] = {}
+    
+    def stores(self) -> List[Any]:
+        """Durable stores (in-memory hot stores have no WAL or free pages to reclaim)"""
+        return [store for store in self.db.partitions() if not store.uri]
+    
+    @staticmethod
+    def wal_bytes(store) -> int:
+        """Current size of a store's -wal file"""
+        try:
+            return os.path.getsize(f"{store.db_path}-wal")
+        except OSError:
+            return 0
+    
+    def checkpoint(self) -> List[Dict[str, Any]]:
+        """
+        Checkpoint every store whose WAL is past the threshold: PASSIVE first
+        (never waits on readers or writers); if that copied every frame back
+        into the database, TRUNCATE resets the WAL file to zero bytes
+        """
+        results = []
+        with self._timed(CHECKPOINT_JOB) as run:
+            for store in self.stores():
+                before = self.wal_bytes(store)
+                if before < self.wal_threshold_bytes:
+                    continue
+                with store.get_connection() as conn:
+                    busy, frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                    mode = 'passive'
+                    if not busy and frames == checkpointed:
+                        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                        mode = 'truncate'
+                results.append({'database': str(store.db_path), 'mode': mode,
+                                'wal_bytes_before': before, 'wal_bytes_after': self.wal_bytes(store)})
+            run['result'] = results
+        return results
+    
+    def is_quiet(self, store) -> bool:
+        """No participant activity in the last quiet_minutes"""
+        with store.get_connection() as conn:
+            row = conn.execute(
+                """SELECT 1 FROM sessions
+                   WHERE last_activity >= datetime('now', '-' || ? || ' minutes') LIMIT 1""",
+                (self.quiet_minutes,)
+            ).fetchone()
+        return row is None
+    
+    def incremental_vacuum(self, force: bool = False) -> int:
+        """
+        Release free pages of quiet stores, vacuum_pages per transaction and
+        at most vacuum_max_batches transactions per store and run
+        
+        Returns:
+            Number of pages released
+        """
+        released = 0
+        with self._timed(VACUUM_JOB) as run:
+            skipped = []
+            for store in self.stores():
+                if not force and not self.is_quiet(store):
+                    skipped.append(str(store.db_path))
+                    continue
+                for _ in range(self.vacuum_max_batches):
+                    with store.get_connection() as conn:
+                        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                        if not before:
+                            break
+                        # executescript steps the pragma to completion; execute()
+                        # stops after its first page
+                        conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+                        released += before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            run['result'] = {'pages_released': released, 'skipped_busy': skipped}
+        return released
+    
+    def enable_incremental_vacuum(self) -> List[str]:
+        """
+        Switch stores (archives included) still at auto_vacuum=NONE to
+        INCREMENTAL; the mode only changes through a full VACUUM, which
+        rewrites the file and blocks its writers while it runs
+        
+        Returns:
+            Paths of the converted databases
+        """
+        converted = []
+        for store in self.stores() + list(self.db.archives()):
+            with store.get_connection() as conn:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == INCREMENTAL:
+                    continue
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            converted.append(str(store.db_path))
+        return converted
+    
+    def stats(self) -> Dict[str, Any]:
+        """Free pages, file and WAL sizes per store, plus the last job runs"""
+        databases = []
+        for store in self.stores():
+            with store.get_connection() as conn:
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                databases.append({
+                    'database': str(store.db_path),
+                    'pages': conn.execute("PRAGMA page_count").fetchone()[0],
+                    'free_pages': conn.execute("PRAGMA freelist_count").fetchone()[0],
+                    'page_size': page_size,
+                    'auto_vacuum': conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+                    'wal_bytes': self.wal_bytes(store)
+                })
+        return {'databases': databases, 'jobs': self.last_runs}
+    
+    def _timed(self, job: str):
+        return _TimedRun(self.last_runs, job)
+
+
+class _TimedRun:
+    """Record a job's finish time, duration and result (or error) in last_runs"""
+    
+    def __init__(self, last_runs: Dict[str, Dict[str, Any]], job: str):
+        self.last_runs = last_runs
+        self.job = job
+        self.run: Dict[str, Any] = {}
+    
+    def __enter__(self) -> Dict[str, Any]:
+        self.started = time.perf_counter()
+        return self.run
+    
+    def __exit__(self, exc_type, exc, traceback):
+        self.run['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.run['duration_ms'] = round((time.perf_counter() - self.started) * 1000, 1)
+        if exc is not None:
+            self.run['error'] = str(exc)
+        self.last_runs[self.job] = self.run
+        return False
@@ -0,0 +1,129 @@
+"""
+Per-IP admission control
+Token buckets for answer submissions and sliding-window counters for
+session starts, kept in memory. Each check is O(1): keys live in an
+OrderedDict ordered by last use, so idle ones are evicted from the front
+by a periodic sweep (or when max_keys is reached)
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List
+
+
+class _KeyedLimiter:
+    """Per-key state ordered by last use, with idle eviction and counters"""
+    
+    def __init__(self, idle_seconds: float, max_keys: int = 100000, clock=time.monotonic):
+        self.idle_seconds = idle_seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> mutable state list; the last element is always last-seen time
+        self._state: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+    
+    def hit(self, key: str) -> float:
+        """
+        Count one request for key
+        
+        Returns:
+            0 when it is admitted, else the seconds to wait before retrying
+        """
+        now = self.clock()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = self._new_state(now)
+                if len(self._state) > self.max_keys:
+                    self._state.popitem(last=False)
+            else:
+                self._state.move_to_end(key)
+            retry_after = self._admit(state, now)
+            state[-1] = now
+            if retry_after:
+                self.rejected += 1
+            else:
+                self.allowed += 1
+            return retry_after
+    
+    def evict_idle(self) -> int:
+        """Drop keys unused for idle_seconds (their state has fully recovered by then)"""
+        cutoff = self.clock() - self.idle_seconds
+        evicted = 0
+        with self._lock:
+            while self._state:
+                key, state = next(iter(self._state.items()))
+                if state[-1] > cutoff:
+                    break
+                del self._state[key]
+                evicted += 1
+        return evicted
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'keys': len(self._state), 'allowed': self.allowed, 'rejected': self.rejected}
+    
+    def _new_state(self, now: float) -> List[float]:
+        raise NotImplementedError
+    
+    def _admit(self, state: List[float], now: float) -> float:
+        raise NotImplementedError
+
+
+class TokenBucketLimiter(_KeyedLimiter):
+    """Refills `rate` tokens per second up to `burst`; each request takes one"""
+    
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000, clock=time.monotonic):
+        super().__init__(idle_seconds=burst / rate, max_keys=max_keys, clock=clock)
+        self.rate = rate
+        self.burst = burst
+    
+    def _new_state(self, now: float) -> List[float]:
+        return [float(self.burst), now]  # tokens, last seen
+    
+    def _admit(self, state: List[float], now: float) -> float:
+        tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        if tokens >= 1:
+            state[0] = tokens - 1
+            return 0
+        state[0] = tokens
+        return (1 - tokens) / self.rate
+
+
+class SlidingWindowLimiter(_KeyedLimiter):
+    """
+    At most `limit` requests per `window` seconds, estimated from the current
+    and previous fixed windows (the previous one weighted by its overlap)
+    """
+    
+    def __init__(self, limit: int, window: float, max_keys: int = 100000, clock=time.monotonic):
+        super().__init__(idle_seconds=2 * window, max_keys=max_keys, clock=clock)
+        self.limit = limit
+        self.window = window
+    
+    def _new_state(self, now: float) -> List[float]:
+        return [self._window_start(now), 0, 0, now]  # window start, previous, current, last seen
+    
+    def _window_start(self, now: float) -> float:
+        return math.floor(now / self.window) * self.window
+    
+    def _admit(self, state: List[float], now: float) -> float:
+        start = self._window_start(now)
+        if start != state[0]:
+            state[1] = state[2] if start - state[0] == self.window else 0
+            state[2] = 0
+            state[0] = start
+        elapsed = (now - start) / self.window
+        if state[1] * (1 - elapsed) + state[2] + 1 <= self.limit:
+            state[2] += 1
+            return 0
+        if state[2] + 1 > self.limit:
+            # Full even without the previous window: wait for the next one
+            return start + self.window - now
+        # Wait until enough of the previous window has slid out
+        admit_at = start + self.window * (1 - (self.limit - 1 - state[2]) / state[1])
+        return max(admit_at - now, 0.001)
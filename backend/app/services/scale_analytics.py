@@ -0,0 +1,136 @@
+"""
+Vectorized analytics over `scale` answers
+Loads ratings into NumPy arrays (one column per scale field) and computes
+summary statistics, histograms and correlations without per-row Python work
+"""
+
+import threading
+import warnings
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+class ScaleAnalytics:
+    def __init__(self, flow_config: dict, analytics_model, snapshot=None):
+        self.analytics_model = analytics_model
+        # Optional ColumnarSnapshot; when one has been built, ratings are read
+        # zero-copy from its memory-mapped files instead of the live database
+        self.snapshot = snapshot
+        self.scale_nodes = {
+            node['id']: node for node in flow_config['nodes']
+            if node.get('input_type') == 'scale'
+        }
+        # question_id -> (stamp, ratings array); refreshed when the stamp changes
+        self._cache: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def load(self, question_id: str) -> np.ndarray:
+        """
+        Ratings for a scale question as a float64 array of shape
+        (responses, fields); NaN marks a missing rating
+        """
+        view = self._snapshot_view(question_id)
+        if view is not None:
+            # The snapshot has taken over; don't keep the live array around
+            self._cache.pop(question_id, None)
+            return view.scale(question_id)
+        
+        stamp = self.analytics_model.answer_stamp(question_id)
+        cached = self._cache.get(question_id)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        
+        with self._lock:
+            fields = [field['name'] for field in self.scale_nodes[question_id].get('fields', [])]
+            batches = [
+                np.array(rows, dtype=np.float64)
+                for rows in self.analytics_model.iter_scale_values(question_id, fields)
+            ]
+            ratings = np.concatenate(batches) if batches else np.empty((0, len(fields)))
+            self._cache[question_id] = (stamp, ratings)
+            return ratings
+    
+    def _snapshot_view(self, question_id: str):
+        """The current snapshot generation if it covers this question"""
+        view = self.snapshot.current() if self.snapshot else None
+        if view is not None and question_id in view.manifest.get('scale', {}):
+            return view
+        return None
+    
+    def get_statistics(self, question_id: Optional[str] = None) -> List[dict]:
+        """Summary statistics, histograms and correlations per scale question"""
+        question_ids = [question_id] if question_id else list(self.scale_nodes)
+        for qid in question_ids:
+            if qid not in self.scale_nodes:
+                raise ValueError(f"Not a scale question: {qid}")
+        return [self._question_statistics(qid) for qid in question_ids]
+    
+    def _question_statistics(self, question_id: str) -> dict:
+        """Compute all statistics for one question, vectorized over its columns"""
+        node = self.scale_nodes[question_id]
+        fields = node.get('fields', [])
+        ratings = self.load(question_id)
+        
+        counts = (~np.isnan(ratings)).sum(axis=0)
+        with warnings.catch_warnings():
+            # All-NaN columns (no ratings yet) legitimately produce NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            means = np.nanmean(ratings, axis=0)
+            stds = np.nanstd(ratings, axis=0)
+            minimums = np.nanmin(ratings, axis=0) if ratings.shape[0] else means
+            maximums = np.nanmax(ratings, axis=0) if ratings.shape[0] else means
+            percentiles = np.nanpercentile(ratings, PERCENTILES, axis=0) if ratings.shape[0] else None
+        
+        stats = []
+        for index, field in enumerate(fields):
+            low, high = int(field.get('min', 1)), int(field.get('max', 10))
+            column = ratings[:, index]
+            in_range = column[(column >= low) & (column <= high)]
+            histogram = np.bincount(np.rint(in_range - low).astype(np.int64), minlength=high - low + 1)
+            
+            stats.append({
+                'field': field['name'],
+                'label': field.get('label', field['name']),
+                'count': int(counts[index]),
+                'mean': _round(means[index]),
+                'std': _round(stds[index]),
+                'min': _round(minimums[index]),
+                'max': _round(maximums[index]),
+                'percentiles': {
+                    f'p{pct}': _round(percentiles[row, index]) if percentiles is not None else None
+                    for row, pct in enumerate(PERCENTILES)
+                },
+                'histogram': {str(low + offset): int(count) for offset, count in enumerate(histogram)}
+            })
+        
+        view = self._snapshot_view(question_id)
+        return {
+            'question_id': question_id,
+            'question_text': node.get('text', ''),
+            'source': 'snapshot' if view is not None else 'live',
+            'as_of': view.manifest['watermark'] if view is not None else None,
+            'responses': int(ratings.shape[0]),
+            'fields': stats,
+            'correlation': self._correlation(ratings, [field['name'] for field in fields])
+        }
+    
+    def _correlation(self, ratings: np.ndarray, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Pearson correlation between fields over responses that rated every field"""
+        complete = ratings[~np.isnan(ratings).any(axis=1)]
+        if complete.shape[0] < 2:
+            return {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix = np.corrcoef(complete, rowvar=False)
+        return {
+            name: {other: _round(matrix[i, j]) for j, other in enumerate(names)}
+            for i, name in enumerate(names)
+        }
+
+
+def _round(value, digits: int = 3):
+    """JSON-safe rounding (NaN becomes None)"""
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
@@ -6,12 +6,19 @@ Enhanced with activity tracking for auto-cleanup
 import json
 from datetime import datetime
 from typing import Optional, Dict, Any, List
+from ..models import parse_answer_text
+from ..storage import SessionStore, AnswerStore
 
 class SessionService:
-    def __init__(self, flow_config: dict, session_model, answer_model):
+    def __init__(self, flow_config: dict, session_model: SessionStore, answer_model: AnswerStore,
+                 read_session_model: Optional[SessionStore] = None,
+                 read_answer_model: Optional[AnswerStore] = None):
         self.flow_config = flow_config
         self.session_model = session_model
         self.answer_model = answer_model
+        # Summary reads go through the read-only connection pool when one is configured
+        self.read_session_model = read_session_model or session_model
+        self.read_answer_model = read_answer_model or answer_model
         self.nodes_dict = {node['id']: node for node in flow_config['nodes']}
     
     def start_session(self, client_info: dict) -> dict:
@@ -21,31 +28,68 @@ class SessionService:
         # Generate session ID
         session_id = str(uuid.uuid4())
         
-        # Create session with initial activity
+        # Get first question
+        first_node_id = self.flow_config['nodes'][0]['id']
+        first_question = self._get_question_node(first_node_id)
+        
+        # Create session with initial activity (the first question is "reached")
         session = self.session_model.create(
             session_id=session_id,
             ip_address=client_info.get('ip_address', 'unknown'),
-            user_agent=client_info.get('user_agent', 'unknown')
+            user_agent=client_info.get('user_agent', 'unknown'),
+            current_node=first_node_id
         )
         
-        # Get first question
-        first_node_id = self.flow_config['nodes'][0]['id']
-        first_question = self._get_question_node(first_node_id)
-        
         return {
             'session_id': session_id,
             'question': self._format_question(first_question),
             'progress': self._calculate_progress(session_id)
         }
     
+    def resume_session(self, session_id: str) -> Optional[dict]:
+        """
+        Continue an in-progress session instead of creating a new row: walk
+        the flow from the first node over the stored answers (evaluating
+        conditionals) to the first unanswered question
+        
+        Returns:
+            The start response for that question, or None when the session
+            does not exist or is no longer in progress
+        """
+        session = self.session_model.get(session_id)
+        if not session or session['status'] != 'in_progress':
+            return None
+        
+        answered = {answer['question_id'] for answer in self.answer_model.get_by_session(session_id)}
+        node = self._resolve_node(self.flow_config['nodes'][0]['id'], session_id)
+        # Bounded by the node count so a cyclic flow cannot loop forever
+        for _ in range(len(self.nodes_dict)):
+            if not node or node['type'] != 'question' or node['id'] not in answered:
+                break
+            node = self._resolve_node(self._get_next_node(node, None, session_id), session_id)
+        
+        if not node or node['type'] != 'question':
+            # Every question on the path is answered but completion never ran
+            return {
+                'session_id': session_id,
+                'resumed': True,
+                'completed': True,
+                'summary': self._complete_session(session_id)
+            }
+        
+        self.session_model.update_activity(session_id, current_node=node['id'])
+        return {
+            'session_id': session_id,
+            'resumed': True,
+            'question': self._format_question(node),
+            'progress': self._calculate_progress(session_id)
+        }
+    
     def submit_answer(self, session_id: str, question_id: str, answer: Any) -> dict:
         """
         Submit an answer and get next question
-        Updates activity timestamp on each call
+        Updates activity timestamp (and funnel position) on each call
         """
-        # Update activity timestamp FIRST
-        self.session_model.update_activity(session_id)
-        
         # Validate session
         session = self.session_model.get(session_id)
         if not session:
@@ -59,15 +103,18 @@ class SessionService:
         if not current_node or current_node['type'] != 'question':
             raise ValueError("Invalid question")
         
-        # Save answer WITH question text
-        answer_text = self._serialize_answer(answer, current_node.get('input_type'))
+        # Save answer WITH question text (display string + typed value)
+        input_type = current_node.get('input_type')
+        answer_text = self._serialize_answer(answer, input_type)
         question_text = current_node.get('text', '')
         
         self.answer_model.save(
             session_id=session_id,
             question_id=question_id,
             answer_text=answer_text,
-            question_text=question_text  # ✅ Store question text
+            question_text=question_text,  # ✅ Store question text
+            input_type=input_type,
+            answer_value=self._typed_answer(answer, input_type)
         )
         
         # Determine next node
@@ -75,10 +122,10 @@ class SessionService:
         
         # Check if we've reached the end
         if next_node_id == 'end':
-            self.session_model.update_status(session_id, 'completed')
             return {
                 'completed': True,
-                'message': self.nodes_dict.get('end', {}).get('message', 'Thank you!')
+                'message': self.nodes_dict.get('end', {}).get('message', 'Thank you!'),
+                'summary': self._complete_session(session_id)
             }
         
         # Get next question
@@ -91,12 +138,16 @@ class SessionService:
         
         if not next_node or next_node['type'] != 'question':
             # End of flow
-            self.session_model.update_status(session_id, 'completed')
             return {
                 'completed': True,
-                'message': 'Thank you for completing the questionnaire!'
+                'message': 'Thank you for completing the questionnaire!',
+                'summary': self._complete_session(session_id)
             }
         
+        # Update activity timestamp and advance the funnel to the next question
+        # (completed sessions are never touched, so their snapshot and ETag stay valid)
+        self.session_model.update_activity(session_id, current_node=next_node['id'])
+        
         return {
             'question': self._format_question(next_node),
             'progress': self._calculate_progress(session_id),
@@ -121,25 +172,17 @@ class SessionService:
         condition = conditional_node.get('condition', {})
         check_type = condition.get('check_type')
         
-        # Handle different condition types
+        # Handle different condition types (answers are read as typed values)
         if check_type == 'has_answer':
             question_id = condition.get('question_id')
             answer = self._get_answer(session_id, question_id)
-            result = answer is not None and answer != ''
+            result = answer not in (None, '', [], {})
         
         elif check_type == 'first_rank':
             question_id = condition.get('question_id')
             value = condition.get('value')
             answer = self._get_answer(session_id, question_id)
-            
-            if answer:
-                try:
-                    first_item = answer.split(',')[0].split('. ', 1)[1] if '. ' in answer else answer
-                    result = value in first_item
-                except:
-                    result = False
-            else:
-                result = False
+            result = isinstance(answer, list) and bool(answer) and value in answer[0]
         
         elif check_type == 'shopify_connected':
             result = False
@@ -148,19 +191,37 @@ class SessionService:
             question_id = condition.get('question_id')
             value = condition.get('value')
             answer = self._get_answer(session_id, question_id)
-            result = value in str(answer) if answer else False
+            if isinstance(answer, list):
+                result = any(value in str(item) for item in answer)
+            else:
+                result = value in str(answer) if answer else False
         
         else:
             result = False
         
         return conditional_node['if_true'] if result else conditional_node['if_false']
     
-    def _get_answer(self, session_id: str, question_id: str) -> Optional[str]:
-        """Get a previously submitted answer"""
-        answers = self.answer_model.get_by_session(session_id)
-        for ans in answers:
-            if ans['question_id'] == question_id:
-                return ans['answer_text']
+    def _resolve_node(self, node_id: str, session_id: str) -> Optional[dict]:
+        """The node at node_id with any chain of conditionals evaluated (None for 'end')"""
+        node = self.nodes_dict.get(node_id)
+        while node and node['type'] == 'conditional':
+            node = self.nodes_dict.get(self._evaluate_conditional(node, session_id))
+        return node
+    
+    def _get_answer(self, session_id: str, question_id: str) -> Any:
+        """Get the typed value of a previously submitted answer"""
+        node = self.nodes_dict.get(question_id, {})
+        return self.answer_model.get_value(session_id, question_id, node.get('input_type'))
+    
+    def _typed_answer(self, answer: Any, input_type: str) -> Any:
+        """
+        Typed value stored as canonical JSON: lists for choices/rankings, dicts
+        for fields. None lets the model derive it from the display text.
+        """
+        if input_type in ('multi_choice', 'ranking') and isinstance(answer, list):
+            return [str(item) for item in answer]
+        if input_type in ('multi_field', 'scale') and isinstance(answer, dict):
+            return answer
         return None
     
     def _serialize_answer(self, answer: Any, input_type: str) -> str:
@@ -216,14 +277,101 @@ class SessionService:
             'percentage': percentage
         }
     
-    def get_summary(self, session_id: str) -> dict:
-        """Get session summary with all Q&A"""
+    def get_version(self, session_id: str) -> Optional[dict]:
+        """Get the cheap version info (status, last_updated, answer count) used for ETags"""
+        return self.read_session_model.get_version(session_id)
+    
+    def _complete_session(self, session_id: str) -> dict:
+        """
+        Mark a session completed and materialize its snapshot.
+        A completed session never changes again, so its summary and admin
+        detail are built once here instead of on every read.
+        """
+        self.session_model.update_activity(session_id, current_node='end')
+        self.session_model.update_status(session_id, 'completed')
+        
         session = self.session_model.get(session_id)
+        answers = self.answer_model.get_by_session(session_id)
+        snapshot = self._build_snapshot(session, answers)
+        self.session_model.save_snapshot(session_id, snapshot)
+        self.session_model.promote(session_id)
+        return snapshot['summary']
+    
+    def _build_snapshot(self, session: dict, answers: List[dict]) -> dict:
+        """Build the stored snapshot: the summary plus the admin detail payload"""
+        return {
+            'summary': self._format_summary(session, answers),
+            'detail': {
+                'session': session,
+                'answers': answers
+            }
+        }
+    
+    def backfill_snapshots(self, batch_size: int = 500) -> int:
+        """
+        Materialize snapshots for historical completed sessions in batches.
+        Each batch costs two reads and one write transaction.
+        
+        Returns:
+            Number of sessions materialized
+        """
+        total = 0
+        while True:
+            session_ids = self.session_model.list_pending_snapshots(limit=batch_size)
+            if not session_ids:
+                return total
+            
+            sessions = self.session_model.get_many(session_ids)
+            answers_by_session = self.answer_model.get_by_sessions(session_ids)
+            snapshots = {
+                session['id']: self._build_snapshot(session, answers_by_session[session['id']])
+                for session in sessions
+            }
+            self.session_model.save_snapshots(snapshots)
+            total += len(snapshots)
+            
+            if len(session_ids) < batch_size:
+                return total
+    
+    def backfill_answer_json(self, batch_size: int = 500) -> int:
+        """
+        Store canonical JSON for answers written before answer_json existed,
+        parsing their display text with the question's input type.
+        
+        Returns:
+            Number of answers converted
+        """
+        total = 0
+        while True:
+            rows = self.answer_model.list_missing_json(limit=batch_size)
+            if not rows:
+                return total
+            
+            values = {}
+            for row in rows:
+                input_type = self.nodes_dict.get(row['question_id'], {}).get('input_type')
+                values[row['id']] = parse_answer_text(input_type, row['answer_text'])
+            self.answer_model.save_json(values)
+            total += len(values)
+            
+            if len(rows) < batch_size:
+                return total
+    
+    def get_summary(self, session_id: str) -> dict:
+        """Get session summary with all Q&A (served from the snapshot once completed)"""
+        snapshot = self.read_session_model.get_snapshot(session_id)
+        if snapshot:
+            return snapshot['summary']
+        
+        session = self.read_session_model.get(session_id)
         if not session:
             raise ValueError("Session not found")
         
-        answers = self.answer_model.get_by_session(session_id)
-        
+        answers = self.read_answer_model.get_by_session(session_id)
+        return self._format_summary(session, answers)
+    
+    def _format_summary(self, session: dict, answers: List[dict]) -> dict:
+        """Format a session and its answer rows as a summary"""
         # Format answers with questions
         formatted_answers = []
         for answer in answers:
@@ -236,7 +384,7 @@ class SessionService:
             })
         
         return {
-            'session_id': session_id,
+            'session_id': session['id'],
             'status': session['status'],
             'created_at': session['created_at'],
             'last_activity': session.get('last_activity'),
@@ -0,0 +1,463 @@
+"""
+Storage backends for sessions and answers
+
+SessionStore and AnswerStore describe everything the services and routes
+use. models.Session / models.Answer are the SQLite implementation;
+MemorySession / MemoryAnswer keep the same data in dict indexes with no
+disk I/O, for benchmarking the flow logic and for tests. Select one with
+Config.STORAGE_BACKEND ('sqlite' or 'memory').
+
+The analytics tables (funnel, distributions, rollups, columnar snapshots)
+and full-text search indexes are maintained by the SQLite backend only.
+"""
+import copy
+import threading
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Optional, List, Dict, Any, Tuple, Protocol
+
+from .models import (
+    Database, Session, Answer, session_key, session_id_from_key, format_session_row,
+    format_timestamp_iso, encode_answer_value, parse_answer_text, decode_answer_value
+)
+
+STORAGE_BACKENDS = ('sqlite', 'memory')
+
+
+class SessionStore(Protocol):
+    """Session storage used by SessionService and the admin routes"""
+    
+    def create(self, session_id: str, ip_address: str, user_agent: str,
+               current_node: Optional[str] = None) -> Dict[str, Any]: ...
+    def register_input_types(self, input_types: Dict[str, str]): ...
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]: ...
+    def get_version(self, session_id: str) -> Optional[Dict[str, Any]]: ...
+    def get_many(self, session_ids: List[str]) -> List[Dict[str, Any]]: ...
+    def get_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]: ...
+    def save_snapshot(self, session_id: str, snapshot: Dict[str, Any]): ...
+    def save_snapshots(self, snapshots: Dict[str, Dict[str, Any]]): ...
+    def list_pending_snapshots(self, limit: int = 500) -> List[str]: ...
+    def promote(self, session_id: str) -> bool: ...
+    def update_status(self, session_id: str, status: str): ...
+    def update_activity(self, session_id: str, current_node: Optional[str] = None): ...
+    def delete(self, session_id: str) -> bool: ...
+    def delete_many(self, session_ids: List[str], chunk_size: int = 500) -> List[int]: ...
+    def delete_matching(self, filters: Dict[str, Any], chunk_size: int = 500) -> List[int]: ...
+    def abandon(self, session_id: str) -> bool: ...
+    def purge_deleted(self, batch_size: int = 500) -> int: ...
+    def cleanup_stale(self, minutes: int = 5) -> int: ...
+    def list_all(self, limit: int = 50, offset: int = 0, filters: Optional[Dict[str, Any]] = None,
+                 include_archived: bool = False) -> List[Dict[str, Any]]: ...
+    def count(self, filters: Optional[Dict[str, Any]] = None, include_archived: bool = False) -> int: ...
+    def status_counts(self) -> Tuple[Dict[str, int], int]: ...
+    def get_all_with_answers(self, filters: Optional[Dict[str, Any]] = None, batch_size: int = 500,
+                             include_archived: bool = False) -> List[Dict[str, Any]]: ...
+    def get_archived(self, session_id: str) -> Optional[Dict[str, Any]]: ...
+
+
+class AnswerStore(Protocol):
+    """Answer storage used by SessionService and the admin routes"""
+    
+    def register_questions(self, questions: Dict[str, str]): ...
+    def save(self, session_id: str, question_id: str, answer_text: str, question_text: str = "",
+             input_type: Optional[str] = None, answer_value: Any = None): ...
+    def get(self, session_id: str, question_id: str) -> Optional[str]: ...
+    def get_value(self, session_id: str, question_id: str, input_type: Optional[str] = None) -> Any: ...
+    def get_by_session(self, session_id: str) -> List[Dict[str, Any]]: ...
+    def get_by_sessions(self, session_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]: ...
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               snippets_per_session: int = 3) -> List[Dict[str, Any]]: ...
+    def list_missing_json(self, limit: int = 500) -> List[Dict[str, Any]]: ...
+    def save_json(self, values: Dict[Any, Any]): ...
+
+
+def create_storage(backend: str, db: Database,
+                   flow_version: Optional[str] = None) -> Tuple[SessionStore, AnswerStore]:
+    """Session and answer stores of a backend (db backs the 'sqlite' one)"""
+    if backend == 'sqlite':
+        return Session(db), Answer(db, flow_version=flow_version)
+    if backend == 'memory':
+        storage = MemoryStorage()
+        return MemorySession(storage), MemoryAnswer(storage)
+    raise ValueError(f"Unknown storage backend: {backend} (expected one of {', '.join(STORAGE_BACKENDS)})")
+
+
+# ==========================================
+# IN-MEMORY BACKEND
+# ==========================================
+def _now() -> str:
+    """Current UTC time formatted like SQLite's CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _filter_value(value: Any) -> Any:
+    """Filter values are compared as SQLite would: datetimes as timestamp strings"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+# Same filter names as models.SESSION_FILTERS, as Python predicates
+MEMORY_FILTERS = {
+    'status': lambda session, value: session['status'] == value,
+    'ip_address': lambda session, value: session['ip_address'] == value,
+    'created_after': lambda session, value: session['created_at'] >= value,
+    'created_before': lambda session, value: session['created_at'] < value,
+    'active_after': lambda session, value: session['last_activity'] >= value,
+    'active_before': lambda session, value: session['last_activity'] < value,
+}
+
+
+class MemoryStorage:
+    """
+    Shared state of the in-memory backend: sessions by key, answers by
+    session key then question id, and a status index. One lock guards
+    every operation, like SQLite's single writer.
+    """
+    
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.sessions: Dict[Any, Dict[str, Any]] = {}
+        self.answers: Dict[Any, Dict[str, Dict[str, Any]]] = {}
+        self.by_status: Dict[str, set] = {}
+        self.snapshots: Dict[Any, Dict[str, Any]] = {}
+        self.answer_ids = count(1)
+    
+    def set_status(self, key: Any, status: str):
+        """Move a session between status index buckets"""
+        session = self.sessions[key]
+        self.by_status.get(session['status'], set()).discard(key)
+        self.by_status.setdefault(status, set()).add(key)
+        session['status'] = status
+    
+    def remove(self, key: Any) -> Optional[Dict[str, Any]]:
+        """Drop a session with its answers and snapshot"""
+        session = self.sessions.pop(key, None)
+        if session:
+            self.by_status.get(session['status'], set()).discard(key)
+            self.answers.pop(key, None)
+            self.snapshots.pop(key, None)
+        return session
+    
+    def filtered(self, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sessions matching admin filters, newest first"""
+        predicates = []
+        for name, value in (filters or {}).items():
+            if value is None:
+                continue
+            if name not in MEMORY_FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            predicates.append((MEMORY_FILTERS[name], _filter_value(value)))
+        candidates = self.sessions.values()
+        if filters and filters.get('status') is not None:
+            candidates = [self.sessions[key] for key in self.by_status.get(filters['status'], ())]
+        matches = [session for session in candidates
+                   if all(predicate(session, value) for predicate, value in predicates)]
+        return sorted(matches, key=lambda session: session['created_at'], reverse=True)
+    
+    def ordered_answers(self, key: Any) -> List[Dict[str, Any]]:
+        """Answers of a session in answer order"""
+        return sorted(self.answers.get(key, {}).values(),
+                      key=lambda answer: (answer['created_at'], answer['id']))
+
+
+class MemorySession:
+    """SessionStore over MemoryStorage"""
+    
+    LIST_COLUMNS = ('id', 'status', 'ip_address', 'created_at', 'last_updated', 'last_activity')
+    EXPORT_COLUMNS = ('id', 'status', 'ip_address', 'user_agent', 'created_at',
+                      'last_updated', 'last_activity', 'completed_at')
+    
+    def __init__(self, storage: MemoryStorage):
+        self.storage = storage
+    
+    def register_input_types(self, input_types: Dict[str, str]):
+        """No analytics counters to keep in step with deletes in memory"""
+    
+    def create(self, session_id: str, ip_address: str, user_agent: str,
+               current_node: Optional[str] = None) -> Dict[str, Any]:
+        """Create a new in-progress session"""
+        key, now = session_key(session_id), _now()
+        with self.storage.lock:
+            if key in self.storage.sessions:
+                raise ValueError(f"Session already exists: {session_id}")
+            self.storage.sessions[key] = {
+                'id': key, 'ip_address': ip_address, 'user_agent': user_agent,
+                'status': 'in_progress', 'created_at': now, 'last_updated': now,
+                'last_activity': now, 'completed_at': None, 'current_node': current_node,
+                'version': 0
+            }
+            self.storage.by_status.setdefault('in_progress', set()).add(key)
+        return self.get(session_id)
+    
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get session by ID with formatted timestamps"""
+        with self.storage.lock:
+            session = self.storage.sessions.get(session_key(session_id))
+            return format_session_row(session) if session else None
+    
+    def get_version(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Status, last_updated, version and answer count (the ETag inputs)"""
+        key = session_key(session_id)
+        with self.storage.lock:
+            session = self.storage.sessions.get(key)
+            if not session:
+                return None
+            return {'status': session['status'], 'last_updated': session['last_updated'],
+                    'version': session['version'], 'answers_count': len(self.storage.answers.get(key, {}))}
+    
+    def get_many(self, session_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several sessions (unknown ids are skipped)"""
+        return [session for session in map(self.get, session_ids) if session]
+    
+    def get_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the materialized snapshot of a completed session, if any"""
+        with self.storage.lock:
+            snapshot = self.storage.snapshots.get(session_key(session_id))
+            return copy.deepcopy(snapshot) if snapshot is not None else None
+    
+    def save_snapshot(self, session_id: str, snapshot: Dict[str, Any]):
+        """Materialize the snapshot of one completed session"""
+        key = session_key(session_id)
+        with self.storage.lock:
+            session = self.storage.sessions.get(key)
+            if session and session['status'] == 'completed':
+                self.storage.snapshots[key] = copy.deepcopy(snapshot)
+    
+    def save_snapshots(self, snapshots: Dict[str, Dict[str, Any]]):
+        """Materialize snapshots for completed sessions"""
+        with self.storage.lock:
+            for session_id, snapshot in snapshots.items():
+                self.save_snapshot(session_id, snapshot)
+    
+    def list_pending_snapshots(self, limit: int = 500) -> List[str]:
+        """IDs of completed sessions that have no snapshot yet"""
+        with self.storage.lock:
+            pending = [key for key in self.storage.by_status.get('completed', ())
+                       if key not in self.storage.snapshots]
+        return [session_id_from_key(key) for key in pending[:limit]]
+    
+    def promote(self, session_id: str) -> bool:
+        """No hot/cold split in memory"""
+        return False
+    
+    def update_status(self, session_id: str, status: str):
+        """Update session status (stamping completed_at on completion)"""
+        key = session_key(session_id)
+        with self.storage.lock:
+            session = self.storage.sessions.get(key)
+            if not session:
+                return
+            self.storage.set_status(key, status)
+            session['last_updated'] = _now()
+            session['version'] += 1
+            if status == 'completed':
+                session['completed_at'] = session['last_updated']
+    
+    def update_activity(self, session_id: str, current_node: Optional[str] = None):
+        """Stamp activity and, when given, move the session to current_node"""
+        with self.storage.lock:
+            session = self.storage.sessions.get(session_key(session_id))
+            if not session:
+                return
+            if current_node:
+                session['current_node'] = current_node
+            session['last_activity'] = session['last_updated'] = _now()
+    
+    def touch(self, session_id: str):
+        """Alias for update_activity"""
+        self.update_activity(session_id)
+    
+    def delete(self, session_id: str) -> bool:
+        """Delete a session and its answers (removal is immediate, nothing to purge)"""
+        with self.storage.lock:
+            return self.storage.remove(session_key(session_id)) is not None
+    
+    def abandon(self, session_id: str) -> bool:
+        """Delete an in-progress session the participant walked away from"""
+        key = session_key(session_id)
+        with self.storage.lock:
+            session = self.storage.sessions.get(key)
+            if not session or session['status'] != 'in_progress':
+                return False
+            self.storage.remove(key)
+            return True
+    
+    def delete_many(self, session_ids: List[str], chunk_size: int = 500) -> List[int]:
+        """Delete several sessions, counted per chunk of ids"""
+        keys = [session_key(session_id) for session_id in dict.fromkeys(session_ids)]
+        chunks = []
+        with self.storage.lock:
+            for start in range(0, len(keys), chunk_size):
+                chunks.append(sum(self.storage.remove(key) is not None for key in keys[start:start + chunk_size]))
+        return chunks
+    
+    def delete_matching(self, filters: Dict[str, Any], chunk_size: int = 500) -> List[int]:
+        """Delete every session matching admin filters, counted per chunk"""
+        with self.storage.lock:
+            keys = [session['id'] for session in self.storage.filtered(filters)]
+            for key in keys:
+                self.storage.remove(key)
+        return [min(chunk_size, len(keys) - start) for start in range(0, len(keys), chunk_size)]
+    
+    def purge_deleted(self, batch_size: int = 500) -> int:
+        """Deletes are immediate in memory"""
+        return 0
+    
+    def cleanup_stale(self, minutes: int = 5) -> int:
+        """Delete in-progress sessions inactive for X minutes"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+        with self.storage.lock:
+            stale = [key for key in self.storage.by_status.get('in_progress', ())
+                     if self.storage.sessions[key]['last_activity'] < cutoff]
+            for key in stale:
+                self.storage.remove(key)
+        return len(stale)
+    
+    def cleanup_abandoned(self, minutes: int = 30) -> int:
+        """Legacy method - now calls cleanup_stale"""
+        return self.cleanup_stale(minutes)
+    
+    def list_all(self, limit: int = 50, offset: int = 0, filters: Optional[Dict[str, Any]] = None,
+                 include_archived: bool = False) -> List[Dict[str, Any]]:
+        """List sessions newest-first with formatted timestamps, optionally filtered (nothing is archived)"""
+        with self.storage.lock:
+            rows = []
+            for session in self.storage.filtered(filters)[offset:offset + limit]:
+                row = {column: session[column] for column in self.LIST_COLUMNS}
+                row['answers_count'] = len(self.storage.answers.get(session['id'], {}))
+                rows.append(row)
+        return [format_session_row(row) for row in rows]
+    
+    def count(self, filters: Optional[Dict[str, Any]] = None, include_archived: bool = False) -> int:
+        """Count sessions, optionally filtered"""
+        with self.storage.lock:
+            if not filters:
+                return len(self.storage.sessions)
+            return len(self.storage.filtered(filters))
+    
+    def status_counts(self) -> Tuple[Dict[str, int], int]:
+        """({status: session count}, total answers)"""
+        with self.storage.lock:
+            statuses = {status: len(keys) for status, keys in self.storage.by_status.items() if keys}
+            return statuses, sum(len(answers) for answers in self.storage.answers.values())
+    
+    def get_all_with_answers(self, filters: Optional[Dict[str, Any]] = None, batch_size: int = 500,
+                             include_archived: bool = False) -> List[Dict[str, Any]]:
+        """Sessions (newest-first, optionally filtered) each with its answers"""
+        sessions = []
+        with self.storage.lock:
+            for session in self.storage.filtered(filters):
+                data = format_session_row({column: session[column] for column in self.EXPORT_COLUMNS})
+                data['answers'] = [{
+                    'question_id': answer['question_id'],
+                    'question_text': answer['question_text'],
+                    'answer_text': answer['answer_text'],
+                    'created_at': format_timestamp_iso(answer['created_at'])
+                } for answer in self.storage.ordered_answers(session['id'])]
+                sessions.append(data)
+        return sessions
+    
+    def get_archived(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Sessions are never archived in memory"""
+        return None
+
+
+class MemoryAnswer:
+    """AnswerStore over MemoryStorage (question text is kept inline)"""
+    
+    def __init__(self, storage: MemoryStorage):
+        self.storage = storage
+    
+    def register_questions(self, questions: Dict[str, str]):
+        """Nothing to normalize in memory"""
+    
+    def save(self, session_id: str, question_id: str, answer_text: str, question_text: str = "",
+             input_type: Optional[str] = None, answer_value: Any = None):
+        """Save or update an answer with its question text and typed value"""
+        if answer_value is None:
+            answer_value = parse_answer_text(input_type, answer_text)
+        key = session_key(session_id)
+        with self.storage.lock:
+            answers = self.storage.answers.setdefault(key, {})
+            previous = answers.get(question_id)
+            answers[question_id] = {
+                'id': previous['id'] if previous else next(self.storage.answer_ids),
+                'question_id': question_id,
+                'question_text': question_text,
+                'answer_text': answer_text,
+                'answer_json': encode_answer_value(answer_value),
+                'created_at': _now()
+            }
+            session = self.storage.sessions.get(key)
+            if session:
+                session['version'] += 1
+    
+    def get(self, session_id: str, question_id: str) -> Optional[str]:
+        """Get specific answer"""
+        with self.storage.lock:
+            answer = self.storage.answers.get(session_key(session_id), {}).get(question_id)
+            return answer['answer_text'] if answer else None
+    
+    def get_value(self, session_id: str, question_id: str, input_type: Optional[str] = None) -> Any:
+        """Get the typed value of an answer (None when unanswered)"""
+        with self.storage.lock:
+            answer = self.storage.answers.get(session_key(session_id), {}).get(question_id)
+        if answer is None:
+            return None
+        return decode_answer_value(answer['answer_json'], input_type, answer['answer_text'])
+    
+    def get_by_session(self, session_id: str) -> List[Dict[str, Any]]:
+        """Get all answers for a session with question text and formatted timestamp"""
+        with self.storage.lock:
+            answers = self.storage.ordered_answers(session_key(session_id))
+        return [{
+            'id': answer['id'],
+            'question_id': answer['question_id'],
+            'question_text': answer['question_text'],
+            'answer_text': answer['answer_text'],
+            'created_at': format_timestamp_iso(answer['created_at'])
+        } for answer in answers]
+    
+    def get_by_sessions(self, session_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Get answers for several sessions, grouped by session ID"""
+        return {session_id: self.get_by_session(session_id) for session_id in session_ids}
+    
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               snippets_per_session: int = 3) -> List[Dict[str, Any]]:
+        """
+        Case-insensitive substring search over answer and question text; a
+        session ranks by how many of its answers contain every term
+        """
+        terms = [term.rstrip('*').lower() for term in query.split() if term.rstrip('*')]
+        if not terms:
+            return []
+        results = []
+        with self.storage.lock:
+            for key, answers in self.storage.answers.items():
+                hits = [answer for answer in answers.values()
+                        if all(term in f"{answer['answer_text']} {answer['question_text']}".lower()
+                               for term in terms)]
+                session = self.storage.sessions.get(key)
+                if hits and session:
+                    results.append({
+                        'session_id': session_id_from_key(key),
+                        'status': session['status'],
+                        'created_at': format_timestamp_iso(session['created_at']),
+                        'score': -float(len(hits)),
+                        'matches': len(hits),
+                        'snippets': [{
+                            'question_id': answer['question_id'],
+                            'question_text': answer['question_text'],
+                            'snippet': answer['answer_text']
+                        } for answer in hits[:snippets_per_session]]
+                    })
+        results.sort(key=lambda result: (result['score'], result['session_id']))
+        return results[offset:offset + limit]
+    
+    def list_missing_json(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """Every in-memory answer has its typed value"""
+        return []
+    
+    def save_json(self, values: Dict[Any, Any]):
+        """Nothing to backfill in memory"""
@@ -8,7 +8,10 @@ from .helpers import (
     generate_session_id,
     parse_json_safe,
     validate_session_id_format,
-    get_client_ip
+    get_client_ip,
+    parse_utc,
+    build_etag,
+    apply_cache_headers
 )
 
 __all__ = [
@@ -17,5 +20,8 @@ __all__ = [
     'generate_session_id',
     'parse_json_safe',
     'validate_session_id_format',
-    'get_client_ip'
+    'get_client_ip',
+    'parse_utc',
+    'build_etag',
+    'apply_cache_headers'
 ]
@@ -4,9 +4,12 @@ Helper utility functions
 import re
 import json
 import uuid
-from datetime import datetime
-from typing import Any, Optional
-from flask import Request
+import hashlib
+import ipaddress
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Optional, Sequence, Tuple
+from flask import Request, Response
 
 def sanitize_input(text: str, max_length: int = 10000) -> str:
     """
@@ -75,6 +78,13 @@ def parse_json_safe(text: str) -> Any:
         return text
 
 
+# Compiled once at import; checked by routes before any database access
+SESSION_ID_PATTERN = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$',
+    re.IGNORECASE
+)
+
+
 def validate_session_id_format(session_id: str) -> bool:
     """
     Validate session ID format (UUID4)
@@ -85,38 +95,122 @@ def validate_session_id_format(session_id: str) -> bool:
     Returns:
         True if valid UUID4 format
     """
-    uuid_pattern = re.compile(
-        r'^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$',
-        re.IGNORECASE
-    )
-    return bool(uuid_pattern.match(session_id))
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.match(session_id) is not None
 
 
-def get_client_ip(request: Request) -> str:
+def get_client_ip(request: Request, trusted_proxies: Sequence[str] = ()) -> str:
     """
     Get client IP address from request
-    Handles proxy forwarding headers
+    Proxy headers are honoured only when the direct peer is one of
+    trusted_proxies (addresses or CIDR networks); anyone else could put any
+    address in them. From a trusted proxy: X-Real-IP, else the last
+    X-Forwarded-For entry (the hop the proxy appended). Earlier entries are
+    whatever the client sent, so keying anything on them lets a client pick
+    its own IP.
     
     Args:
         request: Flask request object
+        trusted_proxies: Peers whose X-Real-IP / X-Forwarded-For are believed
         
     Returns:
         Client IP address
     """
-    # Check for proxy headers first
-    forwarded_for = request.headers.get('X-Forwarded-For')
-    if forwarded_for:
-        # X-Forwarded-For can contain multiple IPs, take the first one
-        return forwarded_for.split(',')[0].strip()
+    if not _is_trusted_proxy(request.remote_addr, tuple(trusted_proxies)):
+        return request.remote_addr or 'unknown'
     
     real_ip = request.headers.get('X-Real-IP')
     if real_ip:
-        return real_ip
+        return real_ip.strip()
+    
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if forwarded_for:
+        return forwarded_for.split(',')[-1].strip()
     
     # Fallback to direct connection IP
     return request.remote_addr or 'unknown'
 
 
+@lru_cache(maxsize=32)
+def _proxy_networks(trusted_proxies: Tuple[str, ...]) -> Tuple[Any, ...]:
+    """Parsed TRUSTED_PROXIES entries (a bare address is a one-address network)"""
+    return tuple(ipaddress.ip_network(entry, strict=False) for entry in trusted_proxies)
+
+
+def _is_trusted_proxy(remote_addr: Optional[str], trusted_proxies: Tuple[str, ...]) -> bool:
+    """Whether the direct peer is one of the trusted proxies"""
+    if not remote_addr or not trusted_proxies:
+        return False
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    return any(address in network for network in _proxy_networks(trusted_proxies))
+
+
+def parse_utc(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse an ISO 8601 query parameter into a naive UTC datetime
+    
+    Args:
+        value: ISO timestamp or date; UTC unless it carries an offset
+    
+    Returns:
+        Naive UTC datetime, or None when no value was given
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.strip().rstrip('Z'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.replace(tzinfo=None)
+
+
+def build_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag value from the parts that identify a resource version
+    
+    Args:
+        parts: Values that change whenever the representation changes
+    
+    Returns:
+        Hex digest usable as an (unquoted) ETag
+    """
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def apply_cache_headers(response: Response, etag: str, immutable: bool, max_age: int,
+                        private: bool = False) -> Response:
+    """
+    Attach ETag and Cache-Control headers to a response
+    
+    Completed sessions only change by being deleted, so they get a short
+    public max-age that browsers and the nginx proxy cache can honor, then
+    must revalidate (a delete shows up within max_age); everything else
+    must be revalidated on every use. Private responses (admin views
+    carrying participant IPs and user agents) are never stored by shared
+    caches and are always revalidated, so deletes take effect at once.
+    
+    Args:
+        response: Flask response to decorate
+        etag: Strong ETag value (unquoted)
+        immutable: Whether the resource can only change by being deleted
+        max_age: Cache lifetime in seconds for such resources
+        private: Whether the response is for a single (admin) client only
+    
+    Returns:
+        The same response object
+    """
+    response.set_etag(etag)
+    if private:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    elif immutable:
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, must-revalidate'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 def truncate_text(text: str, max_length: int = 100, suffix: str = '...') -> str:
     """
     Truncate text to maximum length
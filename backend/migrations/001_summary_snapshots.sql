@@ -0,0 +1,6 @@
+-- Materialized summary snapshot for completed sessions (zlib-compressed JSON)
+ALTER TABLE sessions ADD COLUMN summary_blob BLOB;
+
+-- Lets the backfill find completed sessions without a snapshot cheaply
+CREATE INDEX IF NOT EXISTS idx_sessions_pending_snapshot
+    ON sessions(id) WHERE status = 'completed' AND summary_blob IS NULL;
@@ -0,0 +1,10 @@
+-- Incrementally maintained option counts per question (see Answer.save).
+-- rank = 0 counts selections of a choice option, rank >= 1 counts how often an
+-- option was placed at that rank; option = '' holds the number of responses.
+CREATE TABLE IF NOT EXISTS answer_distribution (
+    question_id TEXT NOT NULL,
+    option TEXT NOT NULL,
+    rank INTEGER NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (question_id, option, rank)
+) WITHOUT ROWID;
@@ -0,0 +1,10 @@
+-- Last flow node served to each session, so abandonment can be attributed
+ALTER TABLE sessions ADD COLUMN current_node TEXT;
+
+-- Per-node funnel counters, maintained incrementally by the models
+CREATE TABLE IF NOT EXISTS funnel_stats (
+    node_id TEXT PRIMARY KEY,
+    reached INTEGER NOT NULL DEFAULT 0,
+    answered INTEGER NOT NULL DEFAULT 0,
+    abandoned INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
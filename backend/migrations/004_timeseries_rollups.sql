@@ -0,0 +1,38 @@
+-- Completion time, so time-to-complete does not depend on later updates
+ALTER TABLE sessions ADD COLUMN completed_at TIMESTAMP;
+UPDATE sessions SET completed_at = last_updated
+    WHERE status = 'completed' AND completed_at IS NULL;
+
+-- Range indexes used to find buckets touched since the last rollup run
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_completed_at ON sessions(completed_at);
+CREATE INDEX IF NOT EXISTS idx_answers_created_at ON answers(created_at);
+
+-- Sessions removed by cleanup/abandonment, per UTC hour. cleaned_up is keyed by
+-- the hour of the cleanup; reaped_started by the hour the session was created,
+-- so "sessions started" survives the deletion of the rows themselves.
+CREATE TABLE IF NOT EXISTS session_reaps (
+    bucket_start TEXT PRIMARY KEY,
+    cleaned_up INTEGER NOT NULL DEFAULT 0,
+    reaped_started INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+-- Hourly and daily rollups written by the scheduled rollup job
+CREATE TABLE IF NOT EXISTS timeseries_rollups (
+    granularity TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    sessions_started INTEGER NOT NULL DEFAULT 0,
+    sessions_completed INTEGER NOT NULL DEFAULT 0,
+    sessions_cleaned_up INTEGER NOT NULL DEFAULT 0,
+    ttc_median_seconds REAL,
+    ttc_p95_seconds REAL,
+    dwell_json TEXT,
+    PRIMARY KEY (granularity, bucket_start)
+) WITHOUT ROWID;
+
+-- Watermarks of incremental background jobs
+CREATE TABLE IF NOT EXISTS job_state (
+    name TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL
+);
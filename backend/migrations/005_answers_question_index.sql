@@ -0,0 +1,2 @@
+-- Per-question scans (scale analytics bulk loads and their cache stamp)
+CREATE INDEX IF NOT EXISTS idx_answers_question ON answers(question_id, created_at);
@@ -0,0 +1,2 @@
+-- Finds sessions changed since a columnar snapshot's watermark
+CREATE INDEX IF NOT EXISTS idx_sessions_last_updated ON sessions(last_updated);
@@ -0,0 +1,30 @@
+-- Full-text index over answers for admin search. External-content table:
+-- the text lives only in answers, the index stores tokens and rowids.
+CREATE VIRTUAL TABLE IF NOT EXISTS answers_fts USING fts5(
+    answer_text,
+    question_text,
+    content = 'answers',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- Keep the index in sync with every insert, upsert and delete
+CREATE TRIGGER IF NOT EXISTS answers_fts_insert AFTER INSERT ON answers BEGIN
+    INSERT INTO answers_fts (rowid, answer_text, question_text)
+    VALUES (new.id, new.answer_text, new.question_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS answers_fts_delete AFTER DELETE ON answers BEGIN
+    INSERT INTO answers_fts (answers_fts, rowid, answer_text, question_text)
+    VALUES ('delete', old.id, old.answer_text, old.question_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS answers_fts_update AFTER UPDATE OF answer_text, question_text ON answers BEGIN
+    INSERT INTO answers_fts (answers_fts, rowid, answer_text, question_text)
+    VALUES ('delete', old.id, old.answer_text, old.question_text);
+    INSERT INTO answers_fts (rowid, answer_text, question_text)
+    VALUES (new.id, new.answer_text, new.question_text);
+END;
+
+-- Index answers written before this migration
+INSERT INTO answers_fts (answers_fts) VALUES ('rebuild');
@@ -0,0 +1,6 @@
+-- Composite indexes behind the admin listing/export filters. Each filter
+-- combination is served by an index range search: equality columns first,
+-- then created_at so the newest-first ordering needs no sort.
+CREATE INDEX IF NOT EXISTS idx_sessions_status_created ON sessions(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_ip_created ON sessions(ip_address, created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_status_activity ON sessions(status, last_activity);
@@ -0,0 +1,16 @@
+-- Canonical JSON of each answer next to its display text: lists for
+-- multi_choice/ranking, objects for multi_field/scale, strings otherwise.
+-- Rows written before this migration keep NULL until `flask backfill-answer-json`;
+-- readers fall back to parsing answer_text for them.
+ALTER TABLE answers ADD COLUMN answer_json TEXT;
+
+-- Typed fields extracted by SQLite itself (virtual: computed on read, stored only in the indexes)
+-- first_item: the first-ranked item of a ranking (first selection of a multi_choice)
+ALTER TABLE answers ADD COLUMN first_item TEXT
+    GENERATED ALWAYS AS (CASE WHEN json_type(answer_json) = 'array' THEN json_extract(answer_json, '$[0]') END) VIRTUAL;
+-- text_value: the whole answer of free-text/single-choice questions, for exact lookups
+ALTER TABLE answers ADD COLUMN text_value TEXT
+    GENERATED ALWAYS AS (CASE WHEN json_type(answer_json) = 'text' THEN json_extract(answer_json, '$') END) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS idx_answers_first_item ON answers(question_id, first_item);
+CREATE INDEX IF NOT EXISTS idx_answers_text_value ON answers(question_id, text_value);
@@ -0,0 +1,57 @@
+-- Question text stored once per (flow_version, question_id) instead of in
+-- every answer row. answers.question_ref points here; answers.question_text
+-- is kept only for rows not yet deduplicated (`flask dedupe-question-text`
+-- moves them over in batches and blanks the column).
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    flow_version TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(flow_version, question_id)
+);
+
+ALTER TABLE answers ADD COLUMN question_ref INTEGER REFERENCES questions(id);
+
+-- Answers with their resolved question text (the FTS content source)
+CREATE VIEW IF NOT EXISTS answer_search AS
+SELECT a.id, a.answer_text, COALESCE(q.text, a.question_text) AS question_text
+FROM answers a
+LEFT JOIN questions q ON q.id = a.question_ref;
+
+-- Re-point the full-text index at the view so question text stays searchable
+DROP TRIGGER IF EXISTS answers_fts_insert;
+DROP TRIGGER IF EXISTS answers_fts_delete;
+DROP TRIGGER IF EXISTS answers_fts_update;
+DROP TABLE IF EXISTS answers_fts;
+
+CREATE VIRTUAL TABLE answers_fts USING fts5(
+    answer_text,
+    question_text,
+    content = 'answer_search',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER answers_fts_insert AFTER INSERT ON answers BEGIN
+    INSERT INTO answers_fts (rowid, answer_text, question_text)
+    VALUES (new.id, new.answer_text,
+            COALESCE((SELECT text FROM questions WHERE id = new.question_ref), new.question_text));
+END;
+
+CREATE TRIGGER answers_fts_delete AFTER DELETE ON answers BEGIN
+    INSERT INTO answers_fts (answers_fts, rowid, answer_text, question_text)
+    VALUES ('delete', old.id, old.answer_text,
+            COALESCE((SELECT text FROM questions WHERE id = old.question_ref), old.question_text));
+END;
+
+CREATE TRIGGER answers_fts_update AFTER UPDATE OF answer_text, question_text, question_ref ON answers BEGIN
+    INSERT INTO answers_fts (answers_fts, rowid, answer_text, question_text)
+    VALUES ('delete', old.id, old.answer_text,
+            COALESCE((SELECT text FROM questions WHERE id = old.question_ref), old.question_text));
+    INSERT INTO answers_fts (rowid, answer_text, question_text)
+    VALUES (new.id, new.answer_text,
+            COALESCE((SELECT text FROM questions WHERE id = new.question_ref), new.question_text));
+END;
+
+INSERT INTO answers_fts (answers_fts) VALUES ('rebuild');
@@ -0,0 +1,6 @@
+-- Let the maintenance job hand free pages back to the filesystem in small
+-- batches (PRAGMA incremental_vacuum) instead of the file only ever growing.
+-- New files get the mode before their first table is created; an existing
+-- database stays at auto_vacuum=NONE until `flask enable-incremental-vacuum`
+-- rewrites it once with a full VACUUM, so booting never pays for that.
+PRAGMA auto_vacuum = INCREMENTAL;
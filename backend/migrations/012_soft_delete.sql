@@ -0,0 +1,5 @@
+-- Soft delete: DELETE /session/<id> and the admin delete only stamp
+-- deleted_at; every read skips tombstoned sessions and the purge job
+-- removes them (with their answers) in batches
+ALTER TABLE sessions ADD COLUMN deleted_at TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_sessions_deleted ON sessions(deleted_at) WHERE deleted_at IS NOT NULL;
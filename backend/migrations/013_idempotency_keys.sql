@@ -0,0 +1,11 @@
+-- Responses of answer submissions sent with an Idempotency-Key header, so a
+-- client retry gets the stored response instead of re-running the write.
+-- key is "<session id>:<header value>"; fingerprint hashes the request body.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at);
@@ -0,0 +1,3 @@
+-- Bumped on every answer write and status change, in the same transaction:
+-- ETags use it because last_updated only has one-second resolution
+ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
@@ -4,15 +4,19 @@ Pytest configuration and shared fixtures
 import pytest
 import tempfile
 import os
+import shutil
 from pathlib import Path
 from app import create_app
 from app.config import Config
-from app.models import Database, Session, Answer
+from app.models import Database, Session, Answer, session_key
+from app.storage import STORAGE_BACKENDS
 
 class TestConfig(Config):
     """Test configuration"""
     TESTING = True
     SECRET_KEY = 'test-secret-key'
+    # Every test client shares 127.0.0.1; limiter tests turn this back on
+    RATE_LIMIT_ENABLED = False
     
     def __init__(self):
         super().__init__()
@@ -22,19 +26,41 @@ class TestConfig(Config):
         # Use the real flow_config.json
         self.FLOW_CONFIG_PATH = Path(__file__).parent.parent / 'app' / 'flow_config.json'
 
-@pytest.fixture(scope='function')
-def app():
-    """Create test application"""
+def backdate_session(session_model, session_id, **columns):
+    """Overwrite timestamp/status columns of a session on either backend (not part of the protocol)"""
+    key = session_key(session_id)
+    if hasattr(session_model, 'storage'):
+        with session_model.storage.lock:
+            if 'status' in columns:
+                session_model.storage.set_status(key, columns.pop('status'))
+            session_model.storage.sessions[key].update(columns)
+        return
+    assignments = ', '.join(f'{column} = ?' for column in columns)
+    with session_model.db.session_connection(session_id) as conn:
+        conn.execute(f"UPDATE sessions SET {assignments} WHERE id = ?", list(columns.values()) + [key])
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'sqlite_only: test reaches past the storage protocol into SQLite')
+
+@pytest.fixture(scope='function', params=STORAGE_BACKENDS)
+def app(request):
+    """Create test application, once per storage backend"""
+    if request.param != 'sqlite' and request.node.get_closest_marker('sqlite_only'):
+        pytest.skip('SQLite-only test')
     config = TestConfig()
+    config.STORAGE_BACKEND = request.param
     app = create_app(config)
     
     yield app
     
-    # Cleanup: remove temporary database
-    try:
-        os.unlink(config.DATABASE_PATH)
-    except:
-        pass
+    # Cleanup: remove temporary database (with its WAL files), analytics snapshot and backups
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.unlink(f"{config.DATABASE_PATH}{suffix}")
+        except:
+            pass
+    shutil.rmtree(f"{config.DATABASE_PATH}-columnar", ignore_errors=True)
+    shutil.rmtree(f"{config.DATABASE_PATH}-backups", ignore_errors=True)
 
 @pytest.fixture
 def client(app):
@@ -50,10 +76,11 @@ def db():
     yield database
     
     # Cleanup
-    try:
-        os.unlink(temp_db.name)
-    except:
-        pass
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.unlink(f"{temp_db.name}{suffix}")
+        except:
+            pass
 
 @pytest.fixture
 def session_model(db):
@@ -64,3 +91,44 @@ def session_model(db):
 def answer_model(db):
     """Create answer model"""
     return Answer(db)
+
+@pytest.fixture
+def flow_answers():
+    """Answers for every question on the main path of flow_config.json"""
+    return [
+        ('q1', {
+            'age_group': '25-35', 'gender': 'All', 'demographics': 'Urban professionals',
+            'income': '$50k-$100k', 'education': 'College', 'geo_location': 'United States',
+            'lifestyle_values': 'Sustainable'
+        }),
+        ('q2', ['Growing revenue', 'Increasing profitability', 'R&D',
+                'Expand Sales channels', 'Expand Product Lines']),
+        ('q2_1', 'Market leader in our category'),
+        ('q3_1', ['eCommerce', 'Amazon']),
+        ('q3_2', ['ROAS - Return on Ad Spend']),
+        ('q3_3', 'Mostly, ROAS is on target'),
+        ('q4', 'About $300 on eCommerce'),
+        ('q5', ['Awesome product', 'Great price']),
+        ('q6', ['During check-out']),
+        ('q8', ['Price', 'Trust']),
+        ('q10', ['Revenue growth', 'Loyalty/Retention', 'Engagement',
+                 'CSAT - Customer Satisfaction', 'Build Audience', 'Brand awareness']),
+        ('q11', 'Klaviyo'),
+        ('q12', {'analytics': 7, 'copywriting': 5, 'promo_campaigns': 8,
+                 'creative': 6, 'segmented_campaigns': 4}),
+    ]
+
+@pytest.fixture
+def complete_session(client, flow_answers):
+    """Factory that runs a session through the whole flow and returns its ID"""
+    def _complete():
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        for question_id, answer in flow_answers:
+            response = client.post(f'/session/{session_id}/answer', json={
+                'question_id': question_id,
+                'answer': answer
+            })
+            assert response.status_code == 200
+        assert response.get_json()['completed'] is True
+        return session_id
+    return _complete
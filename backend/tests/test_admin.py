@@ -0,0 +1,268 @@
+"""
+Test admin dashboard endpoints
+"""
+import csv
+import io
+import itertools
+import sqlite3
+import uuid
+from datetime import datetime
+import pytest
+from app.models import Session, Answer, ReadPoolExhausted, build_match_query
+from tests.conftest import backdate_session
+
+
+class TestSearch:
+    """Test FTS5 full-text search over answers"""
+    
+    def _seed(self, session_model, answer_model):
+        session_model.create('s0', '127.0.0.1', 'Mozilla')
+        session_model.create('s1', '127.0.0.1', 'Mozilla')
+        answer_model.save('s0', 'q1', 'Sunrise Bakery', 'What is your business name?')
+        answer_model.save('s0', 'q2', 'We sell bread from our bakery, bakery cakes too', 'Describe it')
+        answer_model.save('s1', 'q1', 'Moonlight Café', 'What is your business name?')
+    
+    def test_build_match_query(self):
+        """Test that user input becomes quoted FTS5 terms"""
+        assert build_match_query('sunrise bakery') == '"sunrise" "bakery"'
+        assert build_match_query('bak*') == '"bak"*'
+        assert build_match_query('say "hi" OR') == '"say" """hi""" "OR"'
+        assert build_match_query('  * ') == ''
+    
+    def test_search_ranks_sessions(self, session_model, answer_model):
+        """Test ranked, per-session results with snippets"""
+        self._seed(session_model, answer_model)
+        session_model.create('s2', '127.0.0.1', 'Mozilla')
+        answer_model.save('s2', 'q1', 'Bakery', 'What is your business name?')
+        
+        results = answer_model.search('bakery')
+        assert {result['session_id'] for result in results} == {'s0', 's2'}
+        s0 = next(result for result in results if result['session_id'] == 's0')
+        assert s0['matches'] == 2
+        assert '[bakery]' in s0['snippets'][0]['snippet'].lower()
+        assert answer_model.search('cafe')[0]['session_id'] == 's1'  # Diacritics folded
+        assert answer_model.search('bak*', limit=1)[0]['session_id'] in ('s0', 's2')
+        assert answer_model.search('business name')[0]['matches'] == 1
+    
+    def test_index_follows_updates_and_deletes(self, session_model, answer_model, db):
+        """Test that triggers keep the index in sync with answers"""
+        self._seed(session_model, answer_model)
+        answer_model.save('s1', 'q1', 'Starlight Diner', 'What is your business name?')
+        assert answer_model.search('moonlight') == []
+        assert answer_model.search('starlight')[0]['session_id'] == 's1'
+        
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM answers WHERE session_id = 's1'")
+            conn.execute("INSERT INTO answers_fts (answers_fts) VALUES ('integrity-check')")
+        assert answer_model.search('starlight') == []
+    
+    def test_search_uses_index(self, db):
+        """Test that matching is answered by the FTS index, not a table scan"""
+        with db.get_connection() as conn:
+            plan = ' '.join(row['detail'] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT rowid FROM answers_fts WHERE answers_fts MATCH ?",
+                ('"bakery"',)
+            ))
+        assert 'VIRTUAL TABLE INDEX' in plan
+    
+    def test_search_endpoint(self, client, app):
+        """Test the /admin/search endpoint"""
+        self._seed(app.config['SESSION_MODEL'], app.config['ANSWER_MODEL'])
+        assert client.get('/admin/search').status_code == 400
+        
+        response = client.get('/admin/search?q=sunrise')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [result['session_id'] for result in data['results']] == ['s0']
+        assert data['results'][0]['snippets'][0]['question_id'] == 'q1'
+
+
+class TestFilters:
+    """Test server-side filtering of the admin listing and export"""
+    
+    FILTER_VALUES = {
+        'status': 'completed',
+        'ip_address': '10.0.0.1',
+        'created_after': datetime(2026, 1, 1),
+        'created_before': datetime(2026, 2, 1),
+        'active_after': datetime(2026, 1, 1),
+        'active_before': datetime(2026, 2, 1),
+    }
+    
+    def _seed(self, session_model, answer_model):
+        rows = [
+            ('old', '10.0.0.1', 'completed', '2025-12-31 10:00:00', '2025-12-31 10:30:00'),
+            ('jan', '10.0.0.1', 'completed', '2026-01-13 09:00:00', '2026-01-13 09:20:00'),
+            ('jan-open', '10.0.0.2', 'in_progress', '2026-01-14 09:00:00', '2026-02-02 08:00:00'),
+            ('feb', '10.0.0.2', 'completed', '2026-02-03 09:00:00', '2026-02-03 09:10:00'),
+        ]
+        for session_id, ip, status, created, active in rows:
+            session_model.create(session_id, ip, 'Mozilla')
+            answer_model.save(session_id, 'q1', f'Answer from {session_id}', 'Name?')
+            backdate_session(session_model, session_id, status=status, created_at=created, last_activity=active)
+    
+    def test_model_filters(self, session_model, answer_model, db):
+        """Test each filter and a combination against the model"""
+        self._seed(session_model, answer_model)
+        
+        def ids(**filters):
+            return [session['id'] for session in session_model.list_all(filters=filters)]
+        
+        assert ids() == ['feb', 'jan-open', 'jan', 'old']
+        assert ids(status='completed') == ['feb', 'jan', 'old']
+        assert ids(ip_address='10.0.0.2') == ['feb', 'jan-open']
+        assert ids(created_after=datetime(2026, 1, 1), created_before=datetime(2026, 2, 1)) == ['jan-open', 'jan']
+        assert ids(active_after=datetime(2026, 2, 1)) == ['feb', 'jan-open']
+        assert ids(status='completed', created_after=datetime(2026, 1, 1), ip_address='10.0.0.1') == ['jan']
+        assert session_model.count({'status': 'in_progress'}) == 1
+        assert session_model.list_all(filters={'status': 'completed'})[0]['answers_count'] == 1
+        
+        export = session_model.get_all_with_answers({'ip_address': '10.0.0.1'})
+        assert [session['id'] for session in export] == ['jan', 'old']
+        assert export[0]['answers'][0]['answer_text'] == 'Answer from jan'
+    
+    def test_no_filter_combination_scans(self, db):
+        """Test that every filter combination is served by an index search"""
+        with db.get_connection() as conn:
+            for size in range(1, len(self.FILTER_VALUES) + 1):
+                for names in itertools.combinations(self.FILTER_VALUES, size):
+                    filters = {name: self.FILTER_VALUES[name] for name in names}
+                    for sql, params in (Session.list_query(filters, 20, 0), Session.count_query(filters)):
+                        plan = [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+                        assert not any(step.startswith('SCAN') for step in plan), (names, plan)
+    
+    def test_listing_endpoint(self, app, client):
+        """Test filters on /admin/responses"""
+        self._seed(app.config['SESSION_MODEL'], app.config['ANSWER_MODEL'])
+        
+        response = client.get('/admin/responses?status=completed&created_after=2026-01-01')
+        data = response.get_json()
+        assert response.status_code == 200
+        assert [session['id'] for session in data['sessions']] == ['feb', 'jan']
+        assert data['pagination']['total'] == 2
+        assert data['filters'] == {'status': 'completed', 'created_after': '2026-01-01'}
+        
+        # Offsets are converted to UTC: 14:00 IST is 08:30 UTC on 2 Feb
+        response = client.get('/admin/responses?active_after=2026-02-02T14:00:00%2B05:30')
+        assert [session['id'] for session in response.get_json()['sessions']] == ['feb']
+        assert client.get('/admin/responses?created_after=yesterday').status_code == 400
+    
+    def test_export_endpoint(self, app, client):
+        """Test that the CSV export honours the same filters"""
+        self._seed(app.config['SESSION_MODEL'], app.config['ANSWER_MODEL'])
+        
+        response = client.get('/admin/export?ip_address=10.0.0.2')
+        assert response.status_code == 200
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        assert [row[0] for row in rows[1:]] == ['feb', 'jan-open']
+        assert rows[1][9] == 'Answer from feb'
+
+
+class TestReadPool:
+    """Test the read-only connection pool behind admin and summary reads"""
+    
+    def test_read_connections_reject_writes(self, db):
+        """Test that pooled connections are read-only"""
+        reader = db.read_only(pool_size=1)
+        with pytest.raises(sqlite3.OperationalError):
+            with reader.get_connection() as conn:
+                conn.execute("DELETE FROM sessions")
+        with reader.get_connection() as conn:
+            assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+    
+    def test_statement_timeout_interrupts(self, db):
+        """Test that a runaway admin query is interrupted"""
+        reader = db.read_only(pool_size=1, statement_timeout_ms=50)
+        with pytest.raises(sqlite3.OperationalError, match='interrupted'):
+            with reader.get_connection() as conn:
+                conn.execute(
+                    """WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n)
+                       SELECT COUNT(*) FROM n"""
+                ).fetchone()
+        with reader.get_connection() as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+    
+    def test_exhausted_pool_fails_fast(self, db):
+        """Test that waiting for a free connection is bounded"""
+        reader = db.read_only(pool_size=1, acquire_timeout=0.05)
+        with reader.get_connection():
+            with pytest.raises(ReadPoolExhausted):
+                with reader.get_connection():
+                    pass
+    
+    def test_reads_and_writes_do_not_block(self, db, session_model, answer_model):
+        """Test that an open admin read neither blocks nor is blocked by participant writes"""
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        reader = db.read_only()
+        with reader.get_connection() as conn:
+            cursor = conn.execute("SELECT id FROM sessions")
+            cursor.fetchone()
+            answer_model.save(session_id, 'q1', 'Ada')
+        with db.get_connection() as writer:
+            writer.execute("UPDATE sessions SET status = 'completed'")
+            assert Session(reader).get(session_id)['status'] == 'in_progress'
+        assert Answer(reader).get(session_id, 'q1') == 'Ada'
+    
+    @pytest.mark.sqlite_only
+    def test_admin_routes_use_pool(self, app, client, complete_session, monkeypatch):
+        """Test that admin listings and analytics go through the pool and back off when it is busy"""
+        session_id = complete_session()
+        pool = app.config['SESSION_SERVICE'].read_session_model.db.read_pool
+        assert client.get('/admin/responses').get_json()['sessions'][0]['id'] == session_id
+        assert client.get(f'/session/summary/{session_id}').status_code == 200
+        assert app.config['ANALYTICS_SERVICE'].read_analytics_model.db.read_pool is pool
+        
+        monkeypatch.setattr(pool, 'acquire_timeout', 0.01)
+        for _ in range(pool.size):
+            pool._slots.acquire()
+        try:
+            for path in ('/admin/responses', '/admin/analytics/questions', '/admin/analytics/funnel',
+                         '/admin/analytics/scale', '/admin/analytics/timeseries'):
+                response = client.get(path)
+                assert response.status_code == 503
+                assert response.headers['Retry-After'] == '1'
+        finally:
+            for _ in range(pool.size):
+                pool._slots.release()
+
+
+class TestBulkDelete:
+    """Test POST /admin/responses/delete"""
+    
+    def _start(self, client, count):
+        return [client.post('/session/start', json={}).get_json()['session_id'] for _ in range(count)]
+    
+    def test_delete_by_ids_in_chunks(self, client):
+        """Test that listed ids are deleted chunk by chunk with an exact count"""
+        ids = self._start(client, 5)
+        response = client.post('/admin/responses/delete', json={
+            'ids': ids[:3] + [ids[0], str(uuid.uuid4())], 'chunk_size': 2
+        })
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['deleted_count'] == 3
+        assert [chunk['deleted_so_far'] for chunk in data['chunks']] == [2, 3]
+        remaining = client.get('/admin/responses').get_json()['sessions']
+        assert {session['id'] for session in remaining} == set(ids[3:])
+    
+    def test_delete_by_filters(self, client, complete_session):
+        """Test deleting everything matching a status and date range"""
+        completed = complete_session()
+        self._start(client, 3)
+        response = client.post('/admin/responses/delete', json={
+            'filters': {'status': 'in_progress', 'created_after': '2000-01-01'}, 'chunk_size': 2
+        })
+        data = response.get_json()
+        assert data['deleted_count'] == 3
+        assert [chunk['deleted'] for chunk in data['chunks']] == [2, 1]
+        remaining = client.get('/admin/responses').get_json()['sessions']
+        assert [session['id'] for session in remaining] == [completed]
+    
+    def test_rejects_bad_requests(self, client):
+        """Test that a delete needs valid ids or at least one known filter"""
+        assert client.post('/admin/responses/delete', json={}).status_code == 400
+        assert client.post('/admin/responses/delete', json={'filters': {}}).status_code == 400
+        assert client.post('/admin/responses/delete', json={'filters': {'bogus': 1}}).status_code == 400
+        response = client.post('/admin/responses/delete', json={'ids': ['not-an-id']})
+        assert response.get_json()['invalid_ids'] == ['not-an-id']
@@ -0,0 +1,373 @@
+"""
+Test admin analytics aggregations
+"""
+import pytest
+import numpy as np
+from datetime import datetime
+from app.models import Analytics, distribution_keys
+
+
+class TestAnswerDistribution:
+    """Test the incrementally maintained answer_distribution table"""
+    
+    def _counts(self, db, question_id):
+        rows = Analytics(db).get_answer_distribution(question_id)
+        return {(row['option'], row['rank']): row['count'] for row in rows}
+    
+    def test_distribution_keys(self):
+        """Test parsing stored answers into distribution keys"""
+        assert distribution_keys('text', 'anything') == []
+        assert distribution_keys('multi_choice', 'A, Other: custom') == [('', 0), ('A', 0), ('Other', 0)]
+        assert distribution_keys('ranking', '1. B, 2. A') == [('', 0), ('B', 1), ('A', 2)]
+    
+    def test_counts_on_save(self, db, session_model, answer_model):
+        """Test that saving choice answers increments option counts"""
+        for i in range(3):
+            session_model.create(f's{i}', '127.0.0.1', 'Mozilla')
+        answer_model.save('s0', 'q5', 'A, B', input_type='multi_choice')
+        answer_model.save('s1', 'q5', 'B', input_type='multi_choice')
+        answer_model.save('s2', 'q5', 'free text')
+        
+        counts = self._counts(db, 'q5')
+        assert counts == {('', 0): 2, ('A', 0): 1, ('B', 0): 2}
+    
+    def test_overwrite_decrements_previous(self, db, session_model, answer_model):
+        """Test decrement-then-increment when an answer is overwritten"""
+        session_model.create('s0', '127.0.0.1', 'Mozilla')
+        answer_model.save('s0', 'q2', '1. A, 2. B', input_type='ranking')
+        answer_model.save('s0', 'q2', '1. B, 2. A', input_type='ranking')
+        
+        counts = self._counts(db, 'q2')
+        assert counts == {('', 0): 1, ('B', 1): 1, ('A', 2): 1}
+
+
+@pytest.mark.sqlite_only
+class TestAnalyticsAPI:
+    """Test analytics endpoints"""
+    
+    def test_question_distributions(self, client, complete_session):
+        """Test the per-question distribution endpoint"""
+        complete_session()
+        complete_session()
+        
+        response = client.get('/admin/analytics/questions')
+        assert response.status_code == 200
+        questions = {q['question_id']: q for q in response.get_json()['questions']}
+        
+        q5 = questions['q5']
+        assert q5['responses'] == 2
+        options = {o['option']: o for o in q5['options']}
+        assert options['Awesome product']['count'] == 2
+        assert options['Awesome product']['percentage'] == 100
+        assert options['Our community']['count'] == 0
+        
+        q2 = {o['option']: o for o in questions['q2']['options']}
+        assert q2['Growing revenue']['ranks'] == {'1': 2}
+        assert q2['Growing revenue']['average_rank'] == 1
+        assert 'q1' not in questions
+    
+    def test_delete_retracts_counters(self, client, complete_session):
+        """Test that a deleted session drops out of the distributions and the funnel"""
+        complete_session()
+        deleted = complete_session()
+        assert client.delete(f'/admin/response/{deleted}').status_code == 200
+        
+        questions = {q['question_id']: q for q in client.get('/admin/analytics/questions').get_json()['questions']}
+        assert questions['q5']['responses'] == 1
+        assert {o['option']: o for o in questions['q5']['options']}['Awesome product']['count'] == 1
+        assert {o['option']: o for o in questions['q2']['options']}['Growing revenue']['ranks'] == {'1': 1}
+        
+        funnel = client.get('/admin/analytics/funnel').get_json()
+        nodes = {node['node_id']: node for node in funnel['nodes']}
+        assert funnel['started'] == 1 and funnel['completed'] == 1
+        assert nodes['q1']['answered'] == 1 and nodes['q2']['reached'] == 1
+
+
+@pytest.mark.sqlite_only
+class TestFunnel:
+    """Test funnel / drop-off counters"""
+    
+    def test_funnel_counts(self, client, complete_session, flow_answers):
+        """Test reached, answered and abandoned counts along the flow"""
+        complete_session()
+        
+        # A second participant stops after q1 and leaves the page
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        client.post(f'/session/{session_id}/answer', json={
+            'question_id': 'q1', 'answer': flow_answers[0][1]
+        })
+        client.delete(f'/session/{session_id}')
+        
+        response = client.get('/admin/analytics/funnel')
+        assert response.status_code == 200
+        funnel = response.get_json()
+        nodes = {node['node_id']: node for node in funnel['nodes']}
+        
+        assert funnel['started'] == 2
+        assert funnel['completed'] == 1
+        assert funnel['completion_rate'] == 50
+        assert nodes['q1']['answered'] == 2
+        assert nodes['q2']['reached'] == 2
+        assert nodes['q2']['abandoned'] == 1
+        assert nodes['q2_1']['branch'] == {'conditional': 'q2_conditional', 'when': True}
+        assert nodes['q2_1']['reached'] == 1
+        assert nodes['q13']['reached'] == 0
+        assert nodes['q1']['branch'] is None
+    
+    def test_cleanup_records_abandonment(self, db, session_model):
+        """Test that reaping stale sessions records where they stopped"""
+        session_model.create('stale-1', '127.0.0.1', 'Mozilla', current_node='q1')
+        session_model.create('stale-2', '127.0.0.1', 'Mozilla', current_node='q1')
+        session_model.update_activity('stale-2', current_node='q2')
+        session_model.create('fresh', '127.0.0.1', 'Mozilla', current_node='q1')
+        with db.get_connection() as conn:
+            conn.execute(
+                """UPDATE sessions SET last_activity = datetime('now', '-10 minutes')
+                   WHERE id LIKE 'stale-%'"""
+            )
+        
+        assert session_model.cleanup_stale(minutes=5) == 2
+        funnel = Analytics(db).get_funnel()
+        assert funnel['q1'] == {'node_id': 'q1', 'reached': 3, 'answered': 0, 'abandoned': 1}
+        assert funnel['q2']['abandoned'] == 1
+        assert session_model.get('fresh') is not None
+
+
+class TestTimeseriesRollups:
+    """Test scheduled time-series rollups"""
+    
+    @pytest.fixture
+    def analytics_service(self, app, db):
+        from app.services.analytics_service import AnalyticsService
+        return AnalyticsService(app.config['ANALYTICS_SERVICE'].flow_config, Analytics(db))
+    
+    def _backdate(self, db, session_id, created, completed=None):
+        with db.get_connection() as conn:
+            conn.execute(
+                "UPDATE sessions SET created_at = ?, last_activity = ?, completed_at = ? WHERE id = ?",
+                (created, created, completed, session_id)
+            )
+            conn.execute("UPDATE answers SET created_at = ? WHERE session_id = ?", (created, session_id))
+    
+    def test_rollup_buckets(self, db, session_model, answer_model, analytics_service):
+        """Test counts and time-to-complete per hour and day bucket"""
+        for i, minutes in enumerate([10, 30]):
+            session_model.create(f'done-{i}', '127.0.0.1', 'Mozilla')
+            answer_model.save(f'done-{i}', 'q1', 'answer')
+            session_model.update_status(f'done-{i}', 'completed')
+            self._backdate(db, f'done-{i}', '2026-01-05 10:00:00', f'2026-01-05 10:{minutes}:00')
+        session_model.create('stale', '127.0.0.1', 'Mozilla')
+        self._backdate(db, 'stale', '2026-01-05 11:15:00')
+        session_model.cleanup_stale(minutes=5)
+        
+        assert analytics_service.rollup_timeseries() > 0
+        
+        result = analytics_service.get_timeseries(
+            'hour', since=datetime(2026, 1, 5), until=datetime(2026, 1, 6))
+        buckets = {b['bucket_start']: b for b in result['buckets']}
+        ten = buckets['2026-01-05T10:00:00Z']
+        assert ten['sessions_started'] == 2
+        assert ten['sessions_completed'] == 2
+        assert ten['ttc_median_seconds'] == 1200
+        assert ten['ttc_p95_seconds'] == 1740
+        assert ten['dwell']['q1']['count'] == 2
+        assert buckets['2026-01-05T11:00:00Z']['sessions_started'] == 1
+        
+        days = analytics_service.get_timeseries(
+            'day', since=datetime(2026, 1, 5), until=datetime(2026, 1, 6))['buckets']
+        assert days[0]['sessions_started'] == 3
+        assert sum(b['sessions_cleaned_up'] for b in result['buckets']) == 0
+    
+    def test_rollup_is_incremental(self, db, session_model, analytics_service):
+        """Test that only buckets touched since the watermark are recomputed"""
+        session_model.create('old', '127.0.0.1', 'Mozilla')
+        self._backdate(db, 'old', '2026-01-01 08:00:00')
+        analytics_service.rollup_timeseries()
+        
+        session_model.create('new', '127.0.0.1', 'Mozilla')
+        hours = Analytics(db).touched_hour_buckets(Analytics(db).get_watermark('timeseries_rollup'))
+        assert '2026-01-01 08:00:00' not in hours
+        assert len(hours) == 1
+    
+    def test_delete_touches_buckets(self, db, session_model, analytics_service):
+        """Test that a tombstone gets the deleted session's hours recomputed"""
+        session_model.create('old', '127.0.0.1', 'Mozilla')
+        self._backdate(db, 'old', '2026-01-01 08:00:00')
+        analytics_service.rollup_timeseries()
+        
+        session_model.delete('old')
+        hours = Analytics(db).touched_hour_buckets(Analytics(db).get_watermark('timeseries_rollup'))
+        assert '2026-01-01 08:00:00' in hours
+        analytics_service.rollup_timeseries()
+        result = analytics_service.get_timeseries(
+            'hour', since=datetime(2026, 1, 1), until=datetime(2026, 1, 2))
+        assert sum(b['sessions_started'] for b in result['buckets']) == 0
+    
+    def test_timeseries_endpoint(self, client):
+        """Test the endpoint reads rollups and validates granularity"""
+        response = client.get('/admin/analytics/timeseries?granularity=day')
+        assert response.status_code == 200
+        assert response.get_json()['buckets'] == []
+        assert client.get('/admin/analytics/timeseries?granularity=week').status_code == 400
+
+
+class TestScaleAnalytics:
+    """Test vectorized statistics over scale answers"""
+    
+    @pytest.fixture
+    def scale_analytics(self, app, db):
+        from app.services.scale_analytics import ScaleAnalytics
+        return ScaleAnalytics(app.config['ANALYTICS_SERVICE'].flow_config, Analytics(db))
+    
+    def _rate(self, session_model, answer_model, session_id, ratings):
+        import json
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        answer_model.save(session_id, 'q12', json.dumps(ratings))
+    
+    def test_statistics(self, session_model, answer_model, scale_analytics):
+        """Test per-field statistics, histogram and correlation"""
+        fields = ['analytics', 'copywriting', 'promo_campaigns', 'creative', 'segmented_campaigns']
+        for i, value in enumerate([2, 4, 6, 8]):
+            self._rate(session_model, answer_model, f's{i}', {name: value for name in fields})
+        
+        result = scale_analytics.get_statistics('q12')[0]
+        assert result['responses'] == 4
+        analytics = result['fields'][0]
+        assert analytics['field'] == 'analytics'
+        assert analytics['count'] == 4
+        assert analytics['mean'] == 5
+        assert analytics['min'] == 2 and analytics['max'] == 8
+        assert analytics['percentiles']['p50'] == 5
+        assert analytics['histogram']['2'] == 1
+        assert analytics['histogram']['3'] == 0
+        assert result['correlation']['analytics']['creative'] == 1
+    
+    def test_cache_invalidated_by_new_answers(self, session_model, answer_model, scale_analytics):
+        """Test that cached arrays are reloaded after a new answer"""
+        self._rate(session_model, answer_model, 's0', {'analytics': 3})
+        first = scale_analytics.load('q12')
+        assert scale_analytics.load('q12') is first
+        
+        self._rate(session_model, answer_model, 's1', {'analytics': 9})
+        ratings = scale_analytics.load('q12')
+        assert ratings.shape == (2, 5)
+        assert sorted(ratings[:, 0]) == [3, 9]
+    
+    @pytest.mark.sqlite_only
+    def test_scale_endpoint(self, client, complete_session):
+        """Test the scale statistics endpoint"""
+        complete_session()
+        response = client.get('/admin/analytics/scale')
+        assert response.status_code == 200
+        q12 = response.get_json()['questions'][0]
+        assert q12['fields'][0]['mean'] == 7
+        assert client.get('/admin/analytics/scale?question_id=q1').status_code == 400
+
+
+class TestColumnarSnapshot:
+    """Test memory-mapped columnar analytics snapshots"""
+    
+    @pytest.fixture
+    def snapshot(self, app, db, tmp_path):
+        from app.services.columnar_snapshot import ColumnarSnapshot
+        return ColumnarSnapshot(tmp_path / 'columnar', app.config['ANALYTICS_SERVICE'].flow_config, Analytics(db))
+    
+    def _answers(self, view):
+        ids = view.strings('sessions.id')
+        question_ids = view.manifest['question_ids']
+        return {
+            (ids[session], question_ids[question]): text
+            for session, question, text in zip(view.column('answers.session'),
+                                               view.column('answers.question'),
+                                               view.strings('answers.text'))
+        }
+    
+    def test_full_build(self, session_model, answer_model, snapshot):
+        """Test that a first build captures every session and answer"""
+        assert snapshot.current() is None
+        session_model.create('s0', '127.0.0.1', 'Mozilla')
+        session_model.create('s1', '127.0.0.1', 'Mozilla')
+        answer_model.save('s0', 'q1', 'Ada')
+        answer_model.save('s1', 'q1', 'Grace')
+        answer_model.save('s1', 'q12', '{"analytics": 4, "creative": 2}')
+        session_model.update_status('s1', 'completed')
+        
+        manifest = snapshot.build()
+        view = snapshot.current()
+        assert manifest['generation'] == 1 and not manifest['incremental']
+        assert isinstance(view.column('answers.session'), np.memmap)
+        assert self._answers(view) == {
+            ('s0', 'q1'): 'Ada', ('s1', 'q1'): 'Grace',
+            ('s1', 'q12'): '{"analytics": 4, "creative": 2}'
+        }
+        assert view.status_counts() == {'in_progress': 1, 'completed': 1}
+        assert view.answer_counts() == {'q1': 2, 'q12': 1}
+        assert view.scale('q12')[0, 0] == 4
+        assert np.isnan(view.scale('q12')[0, 1])
+    
+    def test_incremental_build(self, session_model, answer_model, snapshot):
+        """Test merging overwritten answers, new sessions and deletions"""
+        session_model.create('s0', '127.0.0.1', 'Mozilla')
+        session_model.create('gone', '127.0.0.1', 'Mozilla')
+        answer_model.save('s0', 'q1', 'Ada')
+        answer_model.save('gone', 'q1', 'Temp')
+        snapshot.build()
+        
+        answer_model.save('s0', 'q1', 'Ada Lovelace')
+        session_model.create('s1', '127.0.0.1', 'Mozilla')
+        answer_model.save('s1', 'q2', 'Yes')
+        session_model.delete('gone')
+        
+        manifest = snapshot.build()
+        view = snapshot.current()
+        assert manifest['generation'] == 2 and manifest['incremental']
+        assert view.strings('sessions.id') == ['s0', 's1']
+        assert self._answers(view) == {('s0', 'q1'): 'Ada Lovelace', ('s1', 'q2'): 'Yes'}
+        assert len(list(snapshot.snapshot_dir.glob('gen-*'))) == 1
+    
+    def test_incremental_build_drops_deleted_completed(self, session_model, answer_model, snapshot):
+        """Test that a completed session deleted after a build leaves the next incremental one"""
+        for session_id in ('s0', 's1'):
+            session_model.create(session_id, '127.0.0.1', 'Mozilla')
+            answer_model.save(session_id, 'q12', '{"analytics": 5}')
+            session_model.update_status(session_id, 'completed')
+        snapshot.build()
+        
+        session_model.delete('s1')
+        manifest = snapshot.build()
+        view = snapshot.current()
+        assert manifest['incremental']
+        assert view.strings('sessions.id') == ['s0']
+        assert self._answers(view) == {('s0', 'q12'): '{"analytics": 5}'}
+        assert len(view.scale('q12')) == 1
+        
+        session_model.purge_deleted()
+        assert snapshot.build()['counts'] == {'sessions': 1, 'answers': 1}
+    
+    def test_scale_statistics_read_snapshot(self, app, session_model, answer_model, snapshot):
+        """Test that scale statistics prefer the snapshot once one exists"""
+        from app.services.scale_analytics import ScaleAnalytics
+        scale = ScaleAnalytics(app.config['ANALYTICS_SERVICE'].flow_config, snapshot.analytics_model,
+                               snapshot=snapshot)
+        session_model.create('s0', '127.0.0.1', 'Mozilla')
+        answer_model.save('s0', 'q12', '{"analytics": 6}')
+        assert scale.get_statistics('q12')[0]['source'] == 'live'
+        
+        snapshot.build()
+        result = scale.get_statistics('q12')[0]
+        assert result['source'] == 'snapshot'
+        assert 'q12' not in scale._cache
+        assert result['fields'][0]['mean'] == 6
+    
+    @pytest.mark.sqlite_only
+    def test_snapshot_endpoint(self, client, complete_session):
+        """Test building and reading the snapshot over the API"""
+        assert client.get('/admin/analytics/snapshot').status_code == 404
+        complete_session()
+        response = client.post('/admin/analytics/snapshot')
+        assert response.status_code == 201
+        assert response.get_json()['manifest']['generation'] == 1
+        
+        data = client.get('/admin/analytics/snapshot').get_json()
+        assert data['sessions_per_status'] == {'completed': 1}
+        assert data['answers_per_question']['q12'] == 1
@@ -0,0 +1,304 @@
+"""
+Tests for database maintenance: WAL checkpoints, incremental vacuum, backups and archival
+"""
+import os
+import uuid
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import pytest
+from app.models import Analytics, session_key
+from app.services.maintenance import DatabaseMaintenance
+from app.services.backup import BackupService, BackupInProgress
+
+def fill_and_delete(db, session_model, answer_model, count=40):
+    """Create sessions with bulky answers, then delete them to leave free pages"""
+    for _ in range(count):
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        answer_model.save(session_id, 'q1', os.urandom(2000).hex(), 'Name?')
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM answers")
+        conn.execute("DELETE FROM sessions")
+
+class TestMaintenance:
+    """Test the WAL checkpoint and incremental vacuum jobs"""
+    
+    def test_migration_enables_incremental_vacuum(self, db):
+        """Test that the database is switched to auto_vacuum=INCREMENTAL"""
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    
+    def test_enable_incremental_vacuum_converts_existing_files(self, db):
+        """Test that a database created before migration 011 is converted once, outside of boot"""
+        with db.get_connection() as conn:
+            conn.execute("PRAGMA auto_vacuum = NONE")
+            conn.execute("VACUUM")
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        maintenance = DatabaseMaintenance(db)
+        
+        assert maintenance.enable_incremental_vacuum() == [str(db.db_path)]
+        assert maintenance.stats()['databases'][0]['auto_vacuum'] == 2
+        assert maintenance.enable_incremental_vacuum() == []
+    
+    def test_checkpoint_truncates_large_wal(self, db, session_model, answer_model):
+        """Test that a WAL past the threshold is checkpointed and truncated"""
+        # An open connection (like the read pool's) keeps the WAL from being
+        # checkpointed away when the last writer closes
+        reader = sqlite3.connect(db.db_path)
+        reader.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        fill_and_delete(db, session_model, answer_model, count=5)
+        assert os.path.getsize(f"{db.db_path}-wal") > 0
+        
+        assert DatabaseMaintenance(db, wal_threshold_bytes=10 ** 9).checkpoint() == []
+        results = DatabaseMaintenance(db, wal_threshold_bytes=1).checkpoint()
+        assert results[0]['mode'] == 'truncate'
+        assert results[0]['wal_bytes_after'] == 0
+        reader.close()
+    
+    def test_incremental_vacuum_releases_free_pages(self, db, session_model, answer_model):
+        """Test that free pages are released in batches"""
+        fill_and_delete(db, session_model, answer_model)
+        maintenance = DatabaseMaintenance(db, vacuum_pages=4, vacuum_max_batches=2)
+        free_before = maintenance.stats()['databases'][0]['free_pages']
+        assert free_before > 8
+        
+        assert maintenance.incremental_vacuum(force=True) == 8
+        assert maintenance.stats()['databases'][0]['free_pages'] == free_before - 8
+        maintenance.vacuum_max_batches = 1000
+        maintenance.incremental_vacuum(force=True)
+        assert maintenance.stats()['databases'][0]['free_pages'] == 0
+    
+    def test_vacuum_waits_for_quiet_period(self, db, session_model, answer_model):
+        """Test that recent participant activity postpones the vacuum"""
+        fill_and_delete(db, session_model, answer_model, count=5)
+        session_model.create(str(uuid.uuid4()), '127.0.0.1', 'Mozilla')
+        maintenance = DatabaseMaintenance(db, quiet_minutes=5)
+        
+        assert maintenance.incremental_vacuum() == 0
+        assert maintenance.last_runs['incremental_vacuum']['result']['skipped_busy'] == [str(db.db_path)]
+    
+    def test_health_reports_storage(self, client, app):
+        """Test that /health reports free pages, WAL size and job timings"""
+        app.config['MAINTENANCE'].checkpoint()
+        storage = client.get('/health').get_json()['storage']
+        assert {'free_pages', 'wal_bytes', 'pages'} <= set(storage['databases'][0])
+        assert 'duration_ms' in storage['jobs']['wal_checkpoint']
+
+@pytest.fixture
+def backup_dir():
+    """Temporary backup directory"""
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+class TestBackups:
+    """Test online backups through the SQLite backup API"""
+    
+    def test_backup_is_a_restorable_copy(self, db, session_model, answer_model, backup_dir):
+        """Test that the gzipped backup opens as a database with the same rows"""
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        answer_model.save(session_id, 'q1', 'Ada', 'Name?')
+        
+        progress = BackupService(db, backup_dir, pages_per_step=2, step_sleep_ms=0).run()
+        assert progress['state'] == 'done' and progress['pages_remaining'] == 0
+        assert progress['pages_total'] > 2
+        
+        restored = os.path.join(backup_dir, 'restored.db')
+        with gzip.open(os.path.join(backup_dir, progress['files'][0]), 'rb') as source, \
+                open(restored, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        conn = sqlite3.connect(restored)
+        assert conn.execute("SELECT answer_text FROM answers").fetchall() == [('Ada',)]
+        conn.close()
+    
+    def test_backup_finishes_under_steady_writes(self, db, session_model, answer_model, backup_dir):
+        """Test that commits from other connections do not restart the copy forever"""
+        for _ in range(20):
+            session_id = str(uuid.uuid4())
+            session_model.create(session_id, '127.0.0.1', 'Mozilla')
+            answer_model.save(session_id, 'q1', os.urandom(1000).hex(), 'Name?')
+        stop = threading.Event()
+        
+        def write():
+            while not stop.is_set():
+                session_model.create(str(uuid.uuid4()), '127.0.0.1', 'Mozilla')
+                time.sleep(0.001)
+        
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            service = BackupService(db, backup_dir, pages_per_step=1, step_sleep_ms=2)
+            backup = threading.Thread(target=service.run, daemon=True)
+            backup.start()
+            backup.join(timeout=20)
+            assert not backup.is_alive()
+        finally:
+            stop.set()
+            writer.join()
+        assert service.progress['state'] == 'done'
+    
+    def test_rotation_keeps_newest(self, db, backup_dir):
+        """Test that only the newest `keep` backups survive"""
+        service = BackupService(db, backup_dir, keep=2, step_sleep_ms=0)
+        written = [service.run()['files'][0] for _ in range(3)]
+        assert [backup['name'] for backup in service.list_backups()] == written[:0:-1]
+    
+    def test_concurrent_backup_is_refused(self, db, backup_dir):
+        """Test that a second backup does not start while one is running"""
+        service = BackupService(db, backup_dir)
+        service._lock.acquire()
+        try:
+            with pytest.raises(BackupInProgress):
+                service.run()
+            assert service.start() is False
+        finally:
+            service._lock.release()
+    
+    def test_start_claims_the_lock(self, db, backup_dir, monkeypatch):
+        """Test that a second start() is refused before the first thread has begun copying"""
+        service = BackupService(db, backup_dir, step_sleep_ms=0)
+        release = threading.Event()
+        monkeypatch.setattr(service, 'stores', lambda: release.wait() and [])
+        assert service.start() is True
+        assert service.start() is False
+        with pytest.raises(BackupInProgress):
+            service.run()
+        release.set()
+        assert service._lock.acquire(timeout=5)  # the thread released it when done
+        service._lock.release()
+        assert service.progress['state'] == 'done'
+    
+    def test_backup_endpoint(self, client, app):
+        """Test triggering a backup over HTTP and polling its progress"""
+        response = client.post('/admin/backup')
+        assert response.status_code == 202
+        for _ in range(100):
+            status = client.get('/admin/backup').get_json()
+            if status['progress']['state'] == 'done':
+                break
+            time.sleep(0.05)
+        assert status['progress']['state'] == 'done'
+        assert len(status['backups']) == 1
+        
+        response = client.post('/admin/backup?wait=1')
+        assert response.status_code == 201
+        assert len(response.get_json()['backups']) == 2
+
+def backdate(db, session_id, completed_at):
+    """Pretend a completed session finished (and started) long ago"""
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE sessions SET status = 'completed', created_at = ?, completed_at = ? WHERE id = ?",
+            (completed_at, completed_at, session_key(session_id))
+        )
+
+@pytest.fixture
+def remove_archives():
+    """Delete the archive files written next to a database"""
+    databases = []
+    yield databases.append
+    for db in databases:
+        for archive in db.archives():
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(f"{archive.db_path}{suffix}"):
+                    os.unlink(f"{archive.db_path}{suffix}")
+
+@pytest.mark.sqlite_only
+class TestArchival:
+    """Test moving old completed sessions into monthly archive files"""
+    
+    def test_archive_moves_old_completed_sessions(self, db, session_model, answer_model, remove_archives):
+        """Test that only old completed sessions move, and archives can be read back"""
+        remove_archives(db)
+        old, recent, open_ = (str(uuid.uuid4()) for _ in range(3))
+        for session_id in (old, recent, open_):
+            session_model.create(session_id, '127.0.0.1', 'Mozilla')
+            answer_model.save(session_id, 'q1', 'Ada', 'Name?')
+        backdate(db, old, '2024-01-15 10:00:00')
+        session_model.update_status(recent, 'completed')
+        
+        assert db.archive_completed(30, batch_size=1) == 1
+        assert db.archive_completed(30) == 0
+        assert [archive.db_path for archive in db.archives()] == [db.archive_path('2024-01')]
+        
+        assert session_model.count() == 2
+        assert session_model.count(include_archived=True) == 3
+        listed = session_model.list_all(include_archived=True, filters={'status': 'completed'})
+        assert {row['id'] for row in listed} == {old, recent}
+        assert session_model.get(old) is None
+        archived = session_model.get_archived(old)
+        assert archived['session']['id'] == old
+        assert [answer['question_text'] for answer in archived['answers']] == ['Name?']
+        
+        # Raw analytics inputs still see archived answers
+        answers = [row for rows in Analytics(db).iter_answers_since(None) for row in rows]
+        assert old in {row[0] for row in answers}
+    
+    def test_admin_reads_union_archives(self, client, app, complete_session, remove_archives):
+        """Test that historical ranges and include_archived read through to the archives"""
+        db = app.config['SESSION_MODEL'].db
+        remove_archives(db)
+        old, recent = complete_session(), complete_session()
+        backdate(db, old, '2024-01-15 10:00:00')
+        assert db.archive_completed(30) == 1
+        
+        assert client.get('/admin/responses').get_json()['pagination']['total'] == 1
+        listing = client.get('/admin/responses?include_archived=1').get_json()
+        assert listing['pagination']['total'] == 2
+        historical = client.get('/admin/responses?created_before=2024-02-01').get_json()
+        assert [session['id'] for session in historical['sessions']] == [old]
+        
+        detail = client.get(f'/admin/response/{old}')
+        assert detail.status_code == 200
+        assert client.get(f'/admin/response/{old}', headers={'If-None-Match': detail.headers['ETag']}).status_code == 304
+        
+        export = client.get('/admin/export?include_archived=1').get_data(as_text=True)
+        assert old in export and recent in export
+    
+    def test_stats_count_archived_sessions(self, client, app, complete_session, remove_archives):
+        """Test that archiving does not change the /admin/stats totals or completion rate"""
+        db = app.config['SESSION_MODEL'].db
+        remove_archives(db)
+        old = complete_session()
+        complete_session()
+        backdate(db, old, '2024-01-15 10:00:00')
+        before = client.get('/admin/stats').get_json()
+        assert db.archive_completed(30) == 1
+        
+        stats = client.get('/admin/stats').get_json()
+        assert stats == before
+        assert stats['completed_sessions'] == 2 and stats['completion_rate'] == 100
+    
+    def test_delete_archived_sessions(self, client, app, complete_session, remove_archives):
+        """Test that single and bulk deletes tombstone archived sessions and purge removes them"""
+        session_model = app.config['SESSION_MODEL']
+        db = session_model.db
+        remove_archives(db)
+        single, by_id, by_filter = complete_session(), complete_session(), complete_session()
+        backdate(db, single, '2024-01-15 10:00:00')
+        backdate(db, by_id, '2024-01-16 10:00:00')
+        backdate(db, by_filter, '2024-03-01 10:00:00')
+        assert db.archive_completed(30) == 3
+        
+        assert client.delete(f'/admin/response/{single}').status_code == 200
+        assert client.get(f'/admin/response/{single}').status_code == 404
+        assert client.delete(f'/admin/response/{single}').status_code == 404
+        
+        response = client.post('/admin/responses/delete', json={'ids': [by_id]})
+        assert response.get_json()['deleted_count'] == 1
+        response = client.post('/admin/responses/delete', json={'filters': {'created_before': '2024-04-01'}})
+        assert response.get_json()['deleted_count'] == 1
+        assert client.get('/admin/responses?include_archived=1').get_json()['pagination']['total'] == 0
+        funnel = client.get('/admin/analytics/funnel').get_json()
+        assert funnel['started'] == 0 and funnel['completed'] == 0
+        
+        assert session_model.purge_deleted() == 3
+        for archive in db.archives():
+            with archive.get_connection() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+                assert conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 0
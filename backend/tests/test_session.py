@@ -3,6 +3,14 @@ Test session management functionality
 """
 import pytest
 import json
+import os
+import tempfile
+import threading
+import uuid
+from app.services.session_service import SessionService
+from app import create_app
+from app.models import Database, Session, Answer, session_key
+from tests.conftest import TestConfig as BaseTestConfig
 
 class TestSessionAPI:
     """Test session API endpoints"""
@@ -247,3 +255,854 @@ class TestCompleteFlow:
         summary = data['summary']
         assert len(summary['answers']) == 12
         assert summary['status'] == 'completed'
+
+
+class TestConditionalRequests:
+    """Test ETag / If-None-Match handling on summary and admin detail"""
+    
+    def _start(self, client):
+        response = client.post('/session/start', json={})
+        return response.get_json()['session_id']
+    
+    def test_summary_etag_and_304(self, client):
+        """Test that an unchanged summary revalidates with 304"""
+        session_id = self._start(client)
+        
+        response = client.get(f'/session/summary/{session_id}')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert response.headers['Cache-Control'] == 'no-cache'
+        
+        response = client.get(f'/session/summary/{session_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+    
+    def test_summary_etag_changes_with_answers(self, client):
+        """Test that submitting an answer invalidates the ETag"""
+        session_id = self._start(client)
+        etag = client.get(f'/session/summary/{session_id}').headers['ETag']
+        
+        client.post(f'/session/{session_id}/answer', json={
+            'question_id': 'q2_1',
+            'answer': 'Market leader'
+        })
+        
+        response = client.get(f'/session/summary/{session_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    
+    def test_admin_detail_etag(self, client):
+        """Test conditional GET on the admin detail route"""
+        session_id = self._start(client)
+        
+        response = client.get(f'/admin/response/{session_id}')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert etag != client.get(f'/session/summary/{session_id}').headers['ETag']
+        
+        response = client.get(f'/admin/response/{session_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    
+    def test_completed_session_is_cacheable(self, app, client):
+        """Test that completed sessions get long-lived cache headers"""
+        session_id = self._start(client)
+        app.config['SESSION_MODEL'].update_status(session_id, 'completed')
+        
+        response = client.get(f'/session/summary/{session_id}')
+        cache_control = response.headers['Cache-Control']
+        assert 'public' in cache_control and 'must-revalidate' in cache_control
+        assert 'immutable' not in cache_control
+        assert f"max-age={app.config['COMPLETED_CACHE_MAX_AGE']}" in cache_control
+    
+    def test_etag_changes_on_overwrite_within_a_second(self, app, client):
+        """Test that overwriting an answer changes the ETag even when the timestamps do not"""
+        session_id = self._start(client)
+        answer_model = app.config['ANSWER_MODEL']
+        etags = []
+        for text in ('Market leader', 'Challenger', 'Market leader'):
+            answer_model.save(session_id, 'q2_1', text)
+            etags.append(client.get(f'/session/summary/{session_id}').headers['ETag'])
+        assert len(set(etags)) == 3
+        assert client.get(f'/session/summary/{session_id}',
+                          headers={'If-None-Match': etags[1]}).status_code == 200
+    
+    def test_admin_detail_is_private(self, app, client):
+        """Test that admin detail is never publicly cacheable, even once completed"""
+        session_id = self._start(client)
+        app.config['SESSION_MODEL'].update_status(session_id, 'completed')
+        
+        response = client.get(f'/admin/response/{session_id}')
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+        assert client.get(f'/admin/response/{session_id}',
+                          headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        
+        client.delete(f'/admin/response/{session_id}')
+        assert client.get(f'/admin/response/{session_id}',
+                          headers={'If-None-Match': response.headers['ETag']}).status_code == 404
+    
+    def test_unknown_session_404(self, client):
+        """Test that unknown sessions are not found"""
+        response = client.get('/session/summary/does-not-exist')
+        assert response.status_code == 404
+
+
+class TestSummarySnapshots:
+    """Test materialized summaries for completed sessions"""
+    
+    def test_snapshot_materialized_on_completion(self, app, client, complete_session):
+        """Test that completing a session stores its summary snapshot"""
+        session_id = complete_session()
+        session_model = app.config['SESSION_MODEL']
+        
+        snapshot = session_model.get_snapshot(session_id)
+        assert snapshot is not None
+        assert snapshot['summary']['status'] == 'completed'
+        assert len(snapshot['summary']['answers']) == 13
+        
+        summary = client.get(f'/session/summary/{session_id}').get_json()
+        assert summary == snapshot['summary']
+        
+        detail = client.get(f'/admin/response/{session_id}').get_json()
+        assert detail == snapshot['detail']
+        assert 'summary_blob' not in detail['session']
+    
+    def test_snapshot_matches_live_summary(self, app, complete_session):
+        """Test that the snapshot is identical to a freshly built summary"""
+        session_id = complete_session()
+        service = app.config['SESSION_SERVICE']
+        session = app.config['SESSION_MODEL'].get(session_id)
+        answers = app.config['ANSWER_MODEL'].get_by_session(session_id)
+        
+        assert service.get_summary(session_id) == service._format_summary(session, answers)
+    
+    def test_backfill_snapshots(self, app):
+        """Test batched backfill of historical completed sessions"""
+        service = app.config['SESSION_SERVICE']
+        session_model = app.config['SESSION_MODEL']
+        answer_model = app.config['ANSWER_MODEL']
+        for i in range(5):
+            session_model.create(f'legacy-{i}', '127.0.0.1', 'Mozilla')
+            answer_model.save(f'legacy-{i}', 'q2_1', f'answer {i}')
+            session_model.update_status(f'legacy-{i}', 'completed')
+        session_model.create('open-session', '127.0.0.1', 'Mozilla')
+        
+        assert service.backfill_snapshots(batch_size=2) == 5
+        assert session_model.list_pending_snapshots() == []
+        assert session_model.get_snapshot('open-session') is None
+        assert session_model.get_snapshot('legacy-3')['summary']['answers'][0]['answer'] == 'answer 3'
+
+
+class TestStructuredAnswers:
+    """Test canonical JSON answer storage and its generated columns"""
+    
+    def _row(self, db, session_id, question_id):
+        with db.get_connection() as conn:
+            return conn.execute(
+                """SELECT answer_text, answer_json, first_item, text_value FROM answers
+                   WHERE session_id = ? AND question_id = ?""",
+                (session_key(session_id), question_id)
+            ).fetchone()
+    
+    @pytest.mark.sqlite_only
+    def test_typed_values_stored(self, app, client, complete_session):
+        """Test that submitted answers keep their display text and typed JSON"""
+        session_id = complete_session()
+        db = app.config['SESSION_MODEL'].db
+        
+        q2 = self._row(db, session_id, 'q2')
+        assert q2['answer_text'].startswith('1. Growing revenue, 2. Increasing profitability')
+        assert json.loads(q2['answer_json'])[:2] == ['Growing revenue', 'Increasing profitability']
+        assert q2['first_item'] == 'Growing revenue'
+        
+        q12 = self._row(db, session_id, 'q12')
+        assert json.loads(q12['answer_json'])['promo_campaigns'] == 8
+        assert self._row(db, session_id, 'q11')['text_value'] == 'Klaviyo'
+    
+    def test_generated_columns_indexed(self, db):
+        """Test that lookups on generated columns use their indexes"""
+        with db.get_connection() as conn:
+            for column in ('first_item', 'text_value'):
+                plan = ' '.join(row['detail'] for row in conn.execute(
+                    f"EXPLAIN QUERY PLAN SELECT session_id FROM answers WHERE question_id = ? AND {column} = ?",
+                    ('q2', 'x')
+                ))
+                assert f'idx_answers_{column}' in plan
+    
+    def test_first_rank_conditional_reads_typed_value(self, app, client):
+        """Test branching on the typed first-ranked item"""
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        client.post(f'/session/{session_id}/answer', json={
+            'question_id': 'q1', 'answer': {'age_group': '25-35'}
+        })
+        response = client.post(f'/session/{session_id}/answer', json={
+            'question_id': 'q2',
+            'answer': ['Growing revenue, fast', 'R&D']
+        })
+        assert response.get_json()['question']['id'] == 'q2_1'
+    
+    def test_legacy_rows_and_backfill(self, app, session_model, answer_model, db):
+        """Test that rows without answer_json are parsed, then backfilled"""
+        session_model.create('legacy', '127.0.0.1', 'Mozilla')
+        answer_model.save('legacy', 'q2', '1. B, 2. A')
+        answer_model.save('legacy', 'q3_1', 'eCommerce, Other: TV')
+        with db.get_connection() as conn:
+            conn.execute("UPDATE answers SET answer_json = NULL")
+        
+        assert answer_model.get_value('legacy', 'q2', 'ranking') == ['B', 'A']
+        assert answer_model.get_value('legacy', 'missing') is None
+        
+        service = SessionService(app.config['SESSION_SERVICE'].flow_config, session_model, answer_model)
+        assert service.backfill_answer_json(batch_size=1) == 2
+        assert self._row(db, 'legacy', 'q2')['first_item'] == 'B'
+        assert json.loads(self._row(db, 'legacy', 'q3_1')['answer_json']) == ['eCommerce', 'Other: TV']
+
+
+@pytest.mark.sqlite_only
+class TestQuestionNormalization:
+    """Test question text stored once in the questions table"""
+    
+    def test_answers_reference_questions(self, app, client, complete_session):
+        """Test that new answers point at a questions row instead of copying text"""
+        session_id = complete_session()
+        db = app.config['SESSION_MODEL'].db
+        with db.get_connection() as conn:
+            inline = conn.execute(
+                "SELECT COUNT(*) FROM answers WHERE question_text != '' OR question_ref IS NULL"
+            ).fetchone()[0]
+            versions = {row[0] for row in conn.execute("SELECT DISTINCT flow_version FROM questions")}
+        assert inline == 0
+        assert versions == {'marketing_questionnaire_v1@1.0'}
+        
+        summary = client.get(f'/session/summary/{session_id}').get_json()
+        nodes = app.config['SESSION_SERVICE'].nodes_dict
+        assert all(answer['question_text'] == nodes[answer['question_id']]['text']
+                   for answer in summary['answers'])
+    
+    def test_dedupe_keeps_output_identical(self, app, client):
+        """Test that deduplicating inline text changes neither summary nor export bytes"""
+        session_model = app.config['SESSION_MODEL']
+        answer_model = app.config['ANSWER_MODEL']
+        legacy_model = Answer(session_model.db)  # No flow version: text stored inline
+        nodes = app.config['SESSION_SERVICE'].nodes_dict
+        
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        legacy_model.save(session_id, 'q2_1', 'Category leader', nodes['q2_1']['text'])
+        legacy_model.save(session_id, 'q4', '$300', 'An older wording of q4')
+        
+        before = (client.get(f'/session/summary/{session_id}').data, client.get('/admin/export').data)
+        assert answer_model.dedupe_question_text(batch_size=1) == 2
+        after = (client.get(f'/session/summary/{session_id}').data, client.get('/admin/export').data)
+        assert before == after
+        
+        with session_model.db.get_connection() as conn:
+            rows = conn.execute(
+                """SELECT a.question_text, q.flow_version FROM answers a
+                   JOIN questions q ON q.id = a.question_ref ORDER BY a.question_id"""
+            ).fetchall()
+        assert [row['question_text'] for row in rows] == ['', '']
+        assert rows[0]['flow_version'] == 'marketing_questionnaire_v1@1.0'
+        assert rows[1]['flow_version'].startswith('legacy-')
+        assert answer_model.search('older wording')[0]['session_id'] == session_id
+
+
+@pytest.mark.sqlite_only
+class TestSessionKeys:
+    """Test 16-byte session keys and route-level id pre-validation"""
+    
+    def test_uuid_ids_stored_as_blobs(self, app, client, complete_session):
+        """Test that UUID ids are stored as 16 bytes and returned as strings"""
+        session_id = complete_session()
+        db = app.config['SESSION_MODEL'].db
+        with db.get_connection() as conn:
+            session_row = conn.execute("SELECT typeof(id) AS kind, length(id) AS size FROM sessions").fetchone()
+            answer_kinds = {row[0] for row in conn.execute("SELECT DISTINCT typeof(session_id) FROM answers")}
+        assert (session_row['kind'], session_row['size']) == ('blob', 16)
+        assert answer_kinds == {'blob'}
+        
+        assert client.get(f'/session/summary/{session_id}').get_json()['session_id'] == session_id
+        assert client.get(f'/session/summary/{session_id.upper()}').status_code == 200
+        listing = client.get('/admin/responses').get_json()
+        assert listing['sessions'][0]['id'] == session_id
+    
+    def test_compact_legacy_text_ids(self, session_model, answer_model, db):
+        """Test converting UUIDs stored as text before binary keys existed"""
+        session_id = str(uuid.uuid4())
+        with db.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, ip_address, user_agent) VALUES (?, '127.0.0.1', 'Mozilla')",
+                (session_id,)
+            )
+            conn.execute(
+                """INSERT INTO answers (session_id, question_id, question_text, answer_text)
+                   VALUES (?, 'q1', 'Name?', 'Ada')""",
+                (session_id,)
+            )
+        session_model.create('not-a-uuid', '127.0.0.1', 'Mozilla')
+        
+        assert session_model.compact_keys(batch_size=1) == 1
+        assert session_model.get(session_id)['id'] == session_id
+        assert answer_model.get(session_id, 'q1') == 'Ada'
+        assert session_model.get('not-a-uuid') is not None
+    
+    def test_malformed_ids_rejected_before_db(self, app, client, monkeypatch):
+        """Test that malformed ids never reach the service or models"""
+        def fail(*args, **kwargs):
+            raise AssertionError('database accessed')
+        monkeypatch.setattr(app.config['SESSION_SERVICE'], 'get_version', fail)
+        monkeypatch.setattr(app.config['SESSION_SERVICE'], 'submit_answer', fail)
+        monkeypatch.setattr(app.config['SESSION_MODEL'], 'get_version', fail)
+        
+        assert client.get('/session/summary/nope').status_code == 404
+        assert client.post('/session/nope/answer', json={'question_id': 'q1', 'answer': 'x'}).status_code == 404
+        assert client.get("/admin/response/1' OR '1'='1").status_code == 404
+
+
+class HotTestConfig(BaseTestConfig):
+    """Test configuration with in-progress sessions kept in memory"""
+    HOT_STORAGE = 'memory'
+
+class TestHotColdStorage:
+    """Test keeping in-progress sessions in a separate hot store"""
+    
+    @pytest.fixture
+    def hot_app(self):
+        config = HotTestConfig()
+        app = create_app(config)
+        yield app
+        os.unlink(config.DATABASE_PATH)
+    
+    @staticmethod
+    def _durable_version(db):
+        with db.get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0], \
+                   conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+    
+    def test_answers_stay_out_of_durable_file(self, hot_app, flow_answers):
+        """Test that answering never touches the durable file until completion"""
+        client = hot_app.test_client()
+        db = hot_app.config['SESSION_MODEL'].db
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        mtime = os.stat(db.db_path).st_mtime_ns
+        for question_id, answer in flow_answers[:-1]:
+            assert client.post(f'/session/{session_id}/answer', json={
+                'question_id': question_id, 'answer': answer
+            }).status_code == 200
+        
+        assert os.stat(db.db_path).st_mtime_ns == mtime
+        assert self._durable_version(db) == (0, 0)
+        assert client.get(f'/session/summary/{session_id}').status_code == 200
+        assert client.get('/admin/responses').get_json()['sessions'][0]['id'] == session_id
+    
+    def test_completion_promotes_session(self, hot_app, flow_answers):
+        """Test that completing moves the session, answers, snapshot and counters"""
+        client = hot_app.test_client()
+        db = hot_app.config['SESSION_MODEL'].db
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        for question_id, answer in flow_answers:
+            response = client.post(f'/session/{session_id}/answer', json={
+                'question_id': question_id, 'answer': answer
+            })
+        assert response.get_json()['completed'] is True
+        
+        assert self._durable_version(db) == (1, len(flow_answers))
+        with db.hot.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM funnel_stats").fetchone()[0] == 0
+        with db.get_connection() as conn:
+            row = conn.execute("SELECT status, summary_blob FROM sessions").fetchone()
+            answered = conn.execute("SELECT answered FROM funnel_stats WHERE node_id = 'q1'").fetchone()[0]
+        assert row['status'] == 'completed' and row['summary_blob'] is not None
+        assert answered == 1
+        
+        summary = client.get(f'/session/summary/{session_id}').get_json()
+        assert summary['answers'][0]['question_text']
+        results = client.get('/admin/search?q=Klaviyo').get_json()['results']
+        assert [result['session_id'] for result in results] == [session_id]
+    
+    def test_cleanup_reaps_hot_sessions(self, hot_app):
+        """Test that stale hot sessions are reaped and their abandonment flushed"""
+        session_model = hot_app.config['SESSION_MODEL']
+        db = session_model.db
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        with db.hot.get_connection() as conn:
+            conn.execute("UPDATE sessions SET last_activity = datetime('now', '-1 hour')")
+        
+        assert session_model.count() == 1
+        assert session_model.cleanup_stale(5) == 1
+        assert session_model.count() == 0
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT SUM(cleaned_up) FROM session_reaps").fetchone()[0] == 1
+    
+    @pytest.mark.parametrize('recovery, survivors', [('resume', 1), ('discard', 0)])
+    def test_file_hot_store_recovery(self, recovery, survivors):
+        """Test reopening a file-backed hot store after a restart"""
+        path = tempfile.NamedTemporaryFile(delete=False, suffix='.db').name
+        hot_path = f"{path}-hot"
+        try:
+            db = Database(path, hot_storage=hot_path)
+            Session(db).create(str(uuid.uuid4()), '127.0.0.1', 'Mozilla')
+            Answer(db).save(Session(db).list_all()[0]['id'], 'q1', 'Ada')
+            
+            reopened = Session(Database(path, hot_storage=hot_path, hot_recovery=recovery))
+            assert reopened.count() == survivors
+            with reopened.db.get_connection() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM funnel_stats").fetchone()[0] == 1
+        finally:
+            for name in (path, hot_path):
+                if os.path.exists(name):
+                    os.unlink(name)
+
+class ShardedTestConfig(BaseTestConfig):
+    """Test configuration with sessions spread over several files"""
+    SHARD_COUNT = 4
+
+class TestShardedStorage:
+    """Test hash-sharding sessions over several database files"""
+    
+    @pytest.fixture
+    def sharded_app(self):
+        config = ShardedTestConfig()
+        app = create_app(config)
+        yield app
+        for db in app.config['SESSION_MODEL'].db.shards:
+            os.unlink(db.db_path)
+    
+    def test_sessions_spread_and_merged(self, sharded_app, flow_answers):
+        """Test that sessions land in their hashed shard and reads merge every shard"""
+        client = sharded_app.test_client()
+        db = sharded_app.config['SESSION_MODEL'].db
+        session_ids = []
+        for _ in range(12):
+            session_id = client.post('/session/start', json={}).get_json()['session_id']
+            for question_id, answer in flow_answers:
+                client.post(f'/session/{session_id}/answer', json={
+                    'question_id': question_id, 'answer': answer
+                })
+            session_ids.append(session_id)
+        
+        per_shard = []
+        for shard in db.shards:
+            with shard.get_connection() as conn:
+                per_shard.append(conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0])
+        assert sum(per_shard) == 12 and max(per_shard) < 12
+        assert all(db.shard_for(session_id) is db.shard_for(session_id.upper()) for session_id in session_ids)
+        
+        listing = client.get('/admin/responses?page=2&per_page=5').get_json()
+        assert listing['pagination']['total'] == 12 and len(listing['sessions']) == 5
+        everything = client.get('/admin/responses?per_page=12').get_json()['sessions']
+        assert {session['id'] for session in everything} == set(session_ids)
+        stats = client.get('/admin/stats').get_json()
+        assert stats['completed_sessions'] == 12
+        assert stats['total_answers'] == 12 * len(flow_answers)
+        export = client.get('/admin/export').get_data(as_text=True)
+        assert all(session_id in export for session_id in session_ids)
+        funnel = client.get('/admin/analytics/funnel').get_json()
+        assert (funnel['started'], funnel['completed']) == (12, 12)
+        summary = client.get(f'/session/summary/{session_ids[0]}').get_json()
+        assert summary['answers'][0]['question_text']
+    
+    def test_rebalance_after_resharding(self, session_model, answer_model, db):
+        """Test moving sessions written unsharded to their shard"""
+        session_ids = [str(uuid.uuid4()) for _ in range(10)]
+        for session_id in session_ids:
+            session_model.create(session_id, '127.0.0.1', 'Mozilla')
+            answer_model.save(session_id, 'q1', 'Ada')
+        
+        sharded = Database(db.db_path, shard_count=3)
+        try:
+            moved = sharded.rebalance_shards(batch_size=3)
+            assert moved == sum(sharded.shard_for(session_id) is not sharded for session_id in session_ids)
+            assert sharded.rebalance_shards() == 0
+            assert Session(sharded).count() == 10
+            for session_id in session_ids:
+                assert Answer(sharded).get(session_id, 'q1') == 'Ada'
+        finally:
+            for shard in sharded.shards[1:]:
+                os.unlink(shard.db_path)
+
+class TestGroupCommit:
+    """Test coalescing concurrent writes through the group-commit writer"""
+    
+    def test_concurrent_saves_share_transactions(self, db, session_model, answer_model):
+        """Test that concurrent answer saves all land and are batched together"""
+        import threading
+        session_ids = [str(uuid.uuid4()) for _ in range(20)]
+        for session_id in session_ids:
+            session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        db.start_group_commit(max_batch=64, window_ms=50)
+        try:
+            start = threading.Barrier(len(session_ids))
+            
+            def answer(session_id):
+                start.wait()
+                answer_model.save(session_id, 'q1', 'Ada')
+                session_model.update_status(session_id, 'completed')
+            
+            threads = [threading.Thread(target=answer, args=(session_id,)) for session_id in session_ids]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            writer = db.writer
+        finally:
+            db.stop_group_commit()
+        
+        assert writer.items == 40
+        assert writer.batches < writer.items
+        for session_id in session_ids:
+            assert answer_model.get(session_id, 'q1') == 'Ada'
+            assert session_model.get(session_id)['status'] == 'completed'
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT answered FROM funnel_stats WHERE node_id = 'q1'").fetchone()[0] == 20
+    
+    def test_failed_operation_does_not_fail_batch(self, db, session_model, answer_model):
+        """Test that an operation's error reaches only its caller"""
+        import threading
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla')
+        db.start_group_commit(window_ms=100)
+        try:
+            saver = threading.Thread(target=answer_model.save, args=(session_id, 'q1', 'Ada'))
+            saver.start()
+            with pytest.raises(Exception):
+                db.write(session_id, lambda conn: conn.execute("INSERT INTO nowhere VALUES (1)"))
+            saver.join()
+            writer = db.writer
+        finally:
+            db.stop_group_commit()
+        assert writer.batches == 1
+        assert answer_model.get(session_id, 'q1') == 'Ada'
+
+class TestSoftDelete:
+    """Test tombstoned deletes and the background purge"""
+    
+    def test_delete_tombstones_until_purged(self, db, session_model, answer_model):
+        """Test that a deleted session vanishes from reads at once and from disk on purge"""
+        deleted, kept = str(uuid.uuid4()), str(uuid.uuid4())
+        for session_id in (deleted, kept):
+            session_model.create(session_id, '127.0.0.1', 'Mozilla')
+            answer_model.save(session_id, 'q1', 'Ada', 'Name?')
+        
+        assert session_model.delete(deleted) is True
+        assert session_model.delete(deleted) is False
+        assert session_model.get(deleted) is None
+        assert session_model.get_version(deleted) is None
+        assert [row['id'] for row in session_model.list_all()] == [kept]
+        assert session_model.count() == 1
+        assert session_model.status_counts() == ({'in_progress': 1}, 1)
+        assert [result['session_id'] for result in answer_model.search('ada')] == [kept]
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 2
+        
+        assert session_model.purge_deleted(batch_size=1) == 1
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+            assert conn.execute("SELECT COUNT(*) FROM answers WHERE session_id = ?",
+                                (session_key(deleted),)).fetchone()[0] == 0
+        assert session_model.purge_deleted() == 0
+    
+    def test_abandoned_session_is_not_reaped_again(self, db, session_model):
+        """Test that stale cleanup skips tombstoned sessions, so reaps are counted once"""
+        session_id = str(uuid.uuid4())
+        session_model.create(session_id, '127.0.0.1', 'Mozilla', current_node='q1')
+        assert session_model.abandon(session_id) is True
+        assert session_model.abandon(session_id) is False
+        with db.get_connection() as conn:
+            conn.execute("UPDATE sessions SET last_activity = datetime('now', '-1 hour')")
+        
+        assert session_model.cleanup_stale(minutes=5) == 0
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT SUM(reaped_started) FROM session_reaps").fetchone()[0] == 1
+            assert conn.execute("SELECT abandoned FROM funnel_stats WHERE node_id = 'q1'").fetchone()[0] == 1
+    
+    # Memory deletes are immediate; this checks the SQLite tombstones
+    @pytest.mark.sqlite_only
+    def test_delete_routes(self, client, app):
+        """Test the beacon delete and the admin delete go through tombstones"""
+        abandoned = client.post('/session/start', json={}).get_json()['session_id']
+        removed = client.post('/session/start', json={}).get_json()['session_id']
+        
+        assert client.delete(f'/session/{abandoned}').get_json()['message'] == 'Session deleted successfully'
+        assert client.delete(f'/session/{abandoned}').get_json()['message'] == 'Session not found or already deleted'
+        assert client.delete(f'/admin/response/{removed}').status_code == 200
+        assert client.delete(f'/admin/response/{removed}').status_code == 404
+        assert client.get('/admin/responses').get_json()['pagination']['total'] == 0
+        
+        assert app.config['SESSION_MODEL'].purge_deleted() == 2
+
+class TestResumeSession:
+    """Test resuming an in-progress session from /session/start"""
+    
+    def test_resume_returns_first_unanswered_question(self, client, flow_answers):
+        """Test that a reload continues the same session where it stopped"""
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        for question_id, answer in flow_answers[:3]:
+            client.post(f'/session/{session_id}/answer', json={'question_id': question_id, 'answer': answer})
+        
+        resumed = client.post('/session/start', json={'resume_session_id': session_id}).get_json()
+        assert resumed['session_id'] == session_id and resumed['resumed'] is True
+        assert resumed['question']['id'] == flow_answers[3][0]
+        assert resumed['progress']['current'] == 3
+        assert client.get('/admin/responses').get_json()['pagination']['total'] == 1
+    
+    def test_unusable_session_starts_fresh(self, client, complete_session):
+        """Test that completed, unknown or malformed ids get a new session"""
+        completed = complete_session()
+        for previous in (completed, str(uuid.uuid4()), 'not-an-id', 42):
+            started = client.post('/session/start', json={'resume_session_id': previous}).get_json()
+            assert started['session_id'] != previous
+            assert 'resumed' not in started
+            assert started['question']['id'] == 'q1'
+    
+    def test_fully_answered_session_completes(self, app, flow_answers):
+        """Test that a session whose every answer is stored is completed on resume"""
+        service = app.config['SESSION_SERVICE']
+        session_id = service.start_session({})['session_id']
+        for question_id, answer in flow_answers:
+            node = service.nodes_dict[question_id]
+            app.config['ANSWER_MODEL'].save(session_id, question_id,
+                                            service._serialize_answer(answer, node.get('input_type')),
+                                            answer_value=service._typed_answer(answer, node.get('input_type')),
+                                            input_type=node.get('input_type'))
+        
+        resumed = service.resume_session(session_id)
+        assert resumed['completed'] is True
+        assert app.config['SESSION_MODEL'].get(session_id)['status'] == 'completed'
+
+class TestIdempotentAnswers:
+    """Test replaying answer submissions sent with an Idempotency-Key"""
+    
+    def test_retry_is_replayed(self, client, app, flow_answers):
+        """Test that a retry returns the stored response without re-running the write"""
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        question_id, answer = flow_answers[0]
+        body = {'question_id': question_id, 'answer': answer}
+        headers = {'Idempotency-Key': 'retry-1'}
+        
+        first = client.post(f'/session/{session_id}/answer', json=body, headers=headers)
+        cache = app.config['IDEMPOTENCY_CACHE']
+        cache._entries.clear()  # the database copy must answer too
+        second = client.post(f'/session/{session_id}/answer', json=body, headers=headers)
+        third = client.post(f'/session/{session_id}/answer', json=body, headers=headers)
+        assert first.status_code == second.status_code == third.status_code == 200
+        assert second.get_json() == third.get_json() == first.get_json()
+        assert 'Idempotent-Replayed' not in first.headers
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        stats = client.get('/health').get_json()['idempotency']
+        assert (stats['stored'], stats['replayed_db'], stats['replayed_memory']) == (1, 1, 1)
+        
+        other = dict(body, answer={'age_group': 'other'})
+        assert client.post(f'/session/{session_id}/answer', json=other, headers=headers).status_code == 422
+    
+    def test_completing_answer_retry(self, client, flow_answers):
+        """Test that retrying the final answer replays the completion instead of failing"""
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        for question_id, answer in flow_answers:
+            response = client.post(f'/session/{session_id}/answer', headers={'Idempotency-Key': question_id},
+                                   json={'question_id': question_id, 'answer': answer})
+        assert response.get_json()['completed'] is True
+        
+        question_id, answer = flow_answers[-1]
+        retry = client.post(f'/session/{session_id}/answer', headers={'Idempotency-Key': question_id},
+                            json={'question_id': question_id, 'answer': answer})
+        assert retry.status_code == 200 and retry.get_json() == response.get_json()
+        plain = client.post(f'/session/{session_id}/answer', json={'question_id': question_id, 'answer': answer})
+        assert plain.status_code == 400
+    
+    def test_concurrent_retry_is_refused(self, app, client, flow_answers, monkeypatch):
+        """Test that a retry racing the original gets 409 and the answer is written once"""
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        question_id, answer = flow_answers[0]
+        body = {'question_id': question_id, 'answer': answer}
+        headers = {'Idempotency-Key': 'race-1'}
+        
+        service = app.config['SESSION_SERVICE']
+        submit, entered, release, calls = service.submit_answer, threading.Event(), threading.Event(), []
+        def slow_submit(*args):
+            calls.append(args)
+            entered.set()
+            release.wait(5)
+            return submit(*args)
+        monkeypatch.setattr(service, 'submit_answer', slow_submit)
+        
+        responses = []
+        original = threading.Thread(target=lambda: responses.append(
+            app.test_client().post(f'/session/{session_id}/answer', json=body, headers=headers)))
+        original.start()
+        assert entered.wait(5)
+        retry = client.post(f'/session/{session_id}/answer', json=body, headers=headers)
+        assert retry.status_code == 409 and retry.headers['Retry-After'] == '1'
+        release.set()
+        original.join(5)
+        
+        assert responses[0].status_code == 200
+        replay = client.post(f'/session/{session_id}/answer', json=body, headers=headers)
+        assert replay.status_code == 200 and replay.headers['Idempotent-Replayed'] == 'true'
+        assert len(calls) == 1
+        assert client.get('/health').get_json()['idempotency']['in_progress'] == 1
+    
+    def test_failed_request_releases_key(self, client):
+        """Test that a key whose request failed can be retried"""
+        session_id = client.post('/session/start', json={}).get_json()['session_id']
+        headers = {'Idempotency-Key': 'bad-1'}
+        body = {'question_id': 'no_such_question', 'answer': 'x'}
+        assert client.post(f'/session/{session_id}/answer', json=body, headers=headers).status_code == 400
+        assert client.post(f'/session/{session_id}/answer', json=body, headers=headers).status_code == 400
+    
+    def test_memory_is_bounded(self, db):
+        """Test that the in-memory side evicts least recently used keys"""
+        from app.services.idempotency import IdempotencyCache
+        cache = IdempotencyCache(db, max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.store(key, 'fp', 200, {'key': key})
+        assert list(cache._entries) == ['b', 'c']
+        assert cache.lookup('a', 'fp') == (200, {'key': 'a'})
+        assert list(cache._entries) == ['c', 'a']
+        assert cache.lookup('missing', 'fp') is None
+
+
+class LimitedTestConfig(BaseTestConfig):
+    """Test configuration with per-IP admission control on and small budgets"""
+    RATE_LIMIT_ENABLED = True
+    MAX_SESSIONS_PER_IP = 2
+    ANSWER_RATE_PER_SECOND = 0.5
+    ANSWER_BURST = 3
+    # The test client connects from 127.0.0.1, standing in for nginx
+    TRUSTED_PROXIES = ['127.0.0.1']
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+class TestAdmissionControl:
+    """Test per-IP rate limits on session starts and answer submissions"""
+    
+    @pytest.fixture
+    def limited_client(self):
+        config = LimitedTestConfig()
+        yield create_app(config).test_client()
+        os.unlink(config.DATABASE_PATH)
+    
+    def test_session_starts_limited_per_ip(self, limited_client):
+        """Test that new sessions over MAX_SESSIONS_PER_IP get 429, resumes and other IPs do not"""
+        first = limited_client.post('/session/start', json={}).get_json()['session_id']
+        assert limited_client.post('/session/start', json={}).status_code == 200
+        
+        denied = limited_client.post('/session/start', json={})
+        assert denied.status_code == 429
+        assert int(denied.headers['Retry-After']) >= 1
+        assert denied.get_json()['retry_after'] == int(denied.headers['Retry-After'])
+        
+        resumed = limited_client.post('/session/start', json={'resume_session_id': first})
+        assert resumed.status_code == 200 and resumed.get_json()['session_id'] == first
+        other_ip = limited_client.post('/session/start', json={}, headers={'X-Real-IP': '10.0.0.9'})
+        assert other_ip.status_code == 200
+        
+        stats = limited_client.get('/health').get_json()['rate_limits']['session_start']
+        assert stats == {'keys': 2, 'allowed': 3, 'rejected': 1}
+    
+    def test_spoofed_forwarded_for_keeps_bucket(self, limited_client):
+        """Test that a client-chosen X-Forwarded-For entry does not get a fresh bucket"""
+        for fake in ('1.1.1.1', '2.2.2.2'):
+            # What nginx forwards when the client sent its own X-Forwarded-For
+            appended = {'X-Forwarded-For': f'{fake}, 203.0.113.7'}
+            assert limited_client.post('/session/start', json={}, headers=appended).status_code == 200
+        for headers in ({'X-Forwarded-For': '3.3.3.3, 203.0.113.7'},
+                        {'X-Forwarded-For': '4.4.4.4', 'X-Real-IP': '203.0.113.7'}):
+            assert limited_client.post('/session/start', json={}, headers=headers).status_code == 429
+    
+    def test_untrusted_peer_headers_ignored(self, limited_client):
+        """Test that proxy headers from a peer outside TRUSTED_PROXIES do not pick the bucket"""
+        direct = {'REMOTE_ADDR': '198.51.100.4'}
+        for fake in ('1.1.1.1', '2.2.2.2'):
+            headers = {'X-Real-IP': fake, 'X-Forwarded-For': fake}
+            assert limited_client.post('/session/start', json={}, headers=headers,
+                                       environ_base=direct).status_code == 200
+        spoofed = limited_client.post('/session/start', json={}, headers={'X-Real-IP': '3.3.3.3'},
+                                      environ_base=direct)
+        assert spoofed.status_code == 429
+    
+    def test_replays_do_not_spend_tokens(self, limited_client, flow_answers):
+        """Test that Idempotency-Key retries are answered even when the bucket is empty"""
+        session_id = limited_client.post('/session/start', json={}).get_json()['session_id']
+        question_id, answer = flow_answers[0]
+        body = {'question_id': question_id, 'answer': answer}
+        first = limited_client.post(f'/session/{session_id}/answer', json=body, headers={'Idempotency-Key': 'k1'})
+        for question_id, answer in flow_answers[1:3]:
+            assert limited_client.post(f'/session/{session_id}/answer', json={
+                'question_id': question_id, 'answer': answer
+            }).status_code == 200
+        
+        for _ in range(3):
+            retry = limited_client.post(f'/session/{session_id}/answer', json=body, headers={'Idempotency-Key': 'k1'})
+            assert retry.status_code == 200 and retry.get_json() == first.get_json()
+        question_id, answer = flow_answers[3]
+        denied = limited_client.post(f'/session/{session_id}/answer', headers={'Idempotency-Key': 'k2'},
+                                     json={'question_id': question_id, 'answer': answer})
+        assert denied.status_code == 429
+        # The refused request left no reservation behind
+        assert limited_client.application.config['IDEMPOTENCY_CACHE'].begin(
+            f'{session_id}:k2', 'fp') is None
+    
+    def test_answers_limited_per_ip(self, limited_client, flow_answers):
+        """Test that answers beyond the burst are rejected before touching the session"""
+        session_id = limited_client.post('/session/start', json={}).get_json()['session_id']
+        for question_id, answer in flow_answers[:3]:
+            assert limited_client.post(f'/session/{session_id}/answer', json={
+                'question_id': question_id, 'answer': answer
+            }).status_code == 200
+        question_id, answer = flow_answers[3]
+        denied = limited_client.post(f'/session/{session_id}/answer', json={
+            'question_id': question_id, 'answer': answer
+        })
+        assert denied.status_code == 429
+        assert denied.headers['Retry-After'] == '2'
+        summary = limited_client.get(f'/session/summary/{session_id}').get_json()
+        assert len(summary['answers']) == 3
+    
+    def test_token_bucket_refills(self):
+        """Test that tokens come back at the configured rate up to the burst"""
+        from app.services.rate_limiter import TokenBucketLimiter
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=2, burst=2, clock=clock)
+        assert limiter.hit('a') == 0 and limiter.hit('a') == 0
+        assert limiter.hit('a') == pytest.approx(0.5)
+        clock.now += 0.5
+        assert limiter.hit('a') == 0
+        clock.now += 100
+        assert [limiter.hit('a') for _ in range(3)] == [0, 0, pytest.approx(0.5)]
+    
+    def test_sliding_window_weights_previous_window(self):
+        """Test that the previous window's count decays as it slides out"""
+        from app.services.rate_limiter import SlidingWindowLimiter
+        clock = FakeClock()  # 1000 is the start of a 100s window
+        limiter = SlidingWindowLimiter(limit=4, window=100, clock=clock)
+        assert [limiter.hit('a') for _ in range(4)] == [0, 0, 0, 0]
+        assert limiter.hit('a') == pytest.approx(100)
+        
+        clock.now = 1100  # previous window counts fully, nothing admitted yet
+        assert limiter.hit('a') == pytest.approx(25)
+        clock.now = 1125
+        assert limiter.hit('a') == 0
+        clock.now = 1300  # two windows later the history is gone
+        assert [limiter.hit('a') for _ in range(4)] == [0, 0, 0, 0]
+    
+    def test_idle_keys_evicted(self):
+        """Test that the sweep drops recovered keys and max_keys bounds memory"""
+        from app.services.rate_limiter import TokenBucketLimiter
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=1, burst=10, max_keys=3, clock=clock)
+        for key in ('a', 'b', 'c', 'd'):
+            limiter.hit(key)
+        assert limiter.stats()['keys'] == 3
+        clock.now += 5
+        limiter.hit('b')
+        clock.now += 6
+        assert limiter.evict_idle() == 2
+        assert limiter.stats()['keys'] == 1
+        assert limiter.evict_idle() == 0
@@ -0,0 +1,118 @@
+"""
+Storage backend contract tests, run against every backend
+"""
+import os
+import uuid
+import pytest
+from app import create_app
+from app.storage import STORAGE_BACKENDS, create_storage
+from tests.conftest import TestConfig as BaseTestConfig
+
+@pytest.fixture(params=STORAGE_BACKENDS)
+def stores(request, db):
+    """(session store, answer store) of each backend"""
+    return create_storage(request.param, db)
+
+@pytest.fixture(params=STORAGE_BACKENDS)
+def backend_client(request):
+    """Test client of an app using each backend"""
+    config = BaseTestConfig()
+    config.STORAGE_BACKEND = request.param
+    yield create_app(config).test_client()
+    os.unlink(config.DATABASE_PATH)
+
+class TestStorageContract:
+    """Test the behaviour every SessionStore / AnswerStore must share"""
+    
+    def test_session_crud(self, stores):
+        """Test create, read, status and activity updates, delete"""
+        sessions, answers = stores
+        session_id = str(uuid.uuid4())
+        created = sessions.create(session_id, '127.0.0.1', 'Mozilla', current_node='q1')
+        assert created['id'] == session_id and created['status'] == 'in_progress'
+        assert sessions.get(session_id.upper())['id'] == session_id
+        
+        sessions.update_activity(session_id, current_node='q2')
+        assert sessions.get(session_id)['current_node'] == 'q2'
+        sessions.update_status(session_id, 'completed')
+        session = sessions.get(session_id)
+        assert session['status'] == 'completed' and session['completed_at']
+        
+        sessions.save_snapshot(session_id, {'summary': {'ok': True}})
+        assert sessions.get_snapshot(session_id) == {'summary': {'ok': True}}
+        
+        sessions.delete(session_id)
+        assert sessions.get(session_id) is None
+        assert sessions.get_version(session_id) is None
+    
+    def test_answer_upsert_and_fetch(self, stores):
+        """Test that saving twice overwrites and typed values round-trip"""
+        sessions, answers = stores
+        session_id = str(uuid.uuid4())
+        sessions.create(session_id, '127.0.0.1', 'Mozilla')
+        answers.save(session_id, 'q1', 'Ada', 'Name?')
+        answers.save(session_id, 'q2', 'Red, Blue', 'Colours?', input_type='multi_choice',
+                     answer_value=['Red', 'Blue'])
+        answers.save(session_id, 'q1', 'Grace', 'Name?')
+        
+        assert answers.get(session_id, 'q1') == 'Grace'
+        assert answers.get_value(session_id, 'q2', 'multi_choice') == ['Red', 'Blue']
+        assert answers.get_value(session_id, 'q3') is None
+        fetched = answers.get_by_session(session_id)
+        assert sorted(answer['question_id'] for answer in fetched) == ['q1', 'q2']
+        assert {answer['question_text'] for answer in fetched} == {'Name?', 'Colours?'}
+        assert sessions.get_version(session_id)['answers_count'] == 2
+        assert answers.get_by_sessions([session_id])[session_id] == fetched
+        
+        results = answers.search('grace')
+        assert [result['session_id'] for result in results] == [session_id]
+    
+    def test_listing_counting_and_cleanup(self, stores):
+        """Test filtered listing, counts and stale cleanup"""
+        sessions, answers = stores
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        for index, session_id in enumerate(ids):
+            sessions.create(session_id, f'10.0.0.{index}', 'Mozilla')
+        sessions.update_status(ids[0], 'completed')
+        answers.save(ids[1], 'q1', 'Ada')
+        
+        assert sessions.count() == 3
+        assert sessions.count({'status': 'completed'}) == 1
+        assert [row['id'] for row in sessions.list_all(filters={'ip_address': '10.0.0.1'})] == [ids[1]]
+        assert {row['answers_count'] for row in sessions.list_all()} == {0, 1}
+        assert len(sessions.list_all(limit=2)) == 2
+        assert sessions.status_counts() == ({'completed': 1, 'in_progress': 2}, 1)
+        exported = sessions.get_all_with_answers({'status': 'in_progress'})
+        assert {session['id'] for session in exported} == set(ids[1:])
+        with pytest.raises(ValueError):
+            sessions.count({'bogus': 1})
+        
+        assert sessions.cleanup_stale(minutes=5) == 0
+        assert sessions.abandon(ids[2]) is True
+        assert sessions.abandon(ids[0]) is False
+        assert sessions.count() == 2
+
+class TestBackendFlow:
+    """Test the HTTP flow end to end on every backend"""
+    
+    def test_complete_flow(self, backend_client, flow_answers):
+        """Test answering every question, the summary and the admin listing"""
+        session_id = backend_client.post('/session/start', json={}).get_json()['session_id']
+        for question_id, answer in flow_answers:
+            response = backend_client.post(f'/session/{session_id}/answer', json={
+                'question_id': question_id,
+                'answer': answer
+            })
+            assert response.status_code == 200
+        assert response.get_json()['completed'] is True
+        
+        summary = backend_client.get(f'/session/summary/{session_id}').get_json()
+        assert len(summary['answers']) == len(flow_answers)
+        listing = backend_client.get('/admin/responses').get_json()
+        assert listing['sessions'][0]['id'] == session_id
+        assert backend_client.get('/admin/stats').get_json()['completed_sessions'] == 1
+    
+    def test_unknown_backend(self, db):
+        """Test that a typo in STORAGE_BACKEND fails loudly"""
+        with pytest.raises(ValueError):
+            create_storage('postgres', db)